@@ -1,4 +1,55 @@
-from .core import diff_hunks, diff_line, tokenize
+from .core import (
+    DiffCancelledError,
+    DiffSession,
+    DiffStats,
+    MemoryBudgetError,
+    PatchError,
+    SimilarityIndex,
+    apply,
+    apply_unified,
+    detect_renames,
+    diff_hunks,
+    diff_line,
+    diff_line_spans,
+    dump_json,
+    get_max_memory,
+    get_numpy_threshold,
+    merge3,
+    reset_trace_memory,
+    set_max_memory,
+    set_numpy_threshold,
+    similarity,
+    tokenize,
+    tokenize_spans,
+    trace_memory,
+)
 from .data_models import Diff, DiffLine, Hunk
 
-__all__ = ["diff_line", "diff_hunks", "tokenize", "Diff", "Hunk", "DiffLine"]
+__all__ = [
+    "diff_line",
+    "diff_line_spans",
+    "diff_hunks",
+    "dump_json",
+    "tokenize",
+    "tokenize_spans",
+    "DiffSession",
+    "apply",
+    "apply_unified",
+    "PatchError",
+    "merge3",
+    "SimilarityIndex",
+    "similarity",
+    "detect_renames",
+    "MemoryBudgetError",
+    "set_max_memory",
+    "get_max_memory",
+    "set_numpy_threshold",
+    "get_numpy_threshold",
+    "trace_memory",
+    "reset_trace_memory",
+    "DiffStats",
+    "DiffCancelledError",
+    "Diff",
+    "Hunk",
+    "DiffLine",
+]
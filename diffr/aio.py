@@ -0,0 +1,361 @@
+"""Asyncio API: coroutines that diff in a pool of workers, so large inputs do not block the event loop."""
+
+import asyncio
+import functools
+import multiprocessing
+import os
+import sys
+import threading
+from collections.abc import Callable
+from concurrent.futures import BrokenExecutor, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from .core import DiffCancelledError, DiffStats
+from .core import diff_hunks as _diff_hunks
+from .core import diff_line as _diff_line
+
+EXECUTOR_KINDS = ("auto", "thread", "process")
+
+# Inputs shorter than this, both texts together in characters, are diffed on the event loop: handing them to a worker
+# process costs about 200 µs, as much as diffing some 8,000 characters
+INLINE_BELOW = 8_192
+
+_COUNTERS = (
+    "recursions",
+    "anchors",
+    "unanchored",
+    "line_diffs",
+    "edit_distance",
+    "hard_replaces",
+    "trace_allocations",
+    "trace_bytes",
+)
+
+
+def _gil_enabled() -> bool:
+    # Free-threaded builds, from Python 3.13 on, run diffs in threads in parallel
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled is None or is_gil_enabled()
+
+
+def _add_stats(stats: DiffStats, other: DiffStats) -> None:
+    """Add the statistics a worker process collected to those of the caller."""
+    for phase, seconds in other.timings.items():
+        stats.add_time(phase, seconds)
+    for name in _COUNTERS:
+        setattr(stats, name, getattr(stats, name) + getattr(other, name))
+    stats.max_depth = max(stats.max_depth, other.max_depth)
+
+
+# ---------------------------------------------------------------------
+# Workers
+# ---------------------------------------------------------------------
+# Worker functions take the cancellation flag of their diff first. Threads get a ``threading.Event``;
+# processes get a ``_Flag``, which reads one byte of an array shared with the parent at startup.
+
+_flags = None
+
+
+def _init_process(flags) -> None:
+    global _flags
+    _flags = flags
+
+
+class _Flag:
+    """Cancellation flag of a slot of the shared array, with the ``is_set()`` of ``threading.Event``."""
+
+    __slots__ = ("slot",)
+
+    def __init__(self, slot: int):
+        self.slot = slot
+
+    def is_set(self) -> bool:
+        return bool(_flags[self.slot])
+
+
+def _run_hunks(cancel, original: str, updated: str, options: dict) -> dict:
+    return _diff_hunks(original, updated, cancel=cancel, **options)
+
+
+def _run_call(func: Callable, cancel, original: str, updated: str, options: dict):
+    return func(original, updated, cancel=cancel, **options)
+
+
+def _run_line(cancel, original: str, updated: str, options: dict) -> tuple:
+    # A single line has no checkpoint of its own, so a cancelled diff only stops before it starts
+    if cancel.is_set():
+        raise DiffCancelledError("The diff was cancelled")
+    # Out-parameters come back with the result, since a worker process fills copies
+    return _diff_line(original, updated, **options), options.get("degraded"), options.get("stats")
+
+
+# ---------------------------------------------------------------------
+# Executor
+# ---------------------------------------------------------------------
+
+
+class DiffExecutor:
+    """
+    A pool of workers running diffs for coroutines, with a bound on the diffs in flight.
+
+    ``kind`` is "thread" or "process", and "auto" picks threads only when the interpreter runs
+    without the GIL: the diff engine holds it throughout, so on other builds threads would take
+    turns with the event loop. Inputs below ``inline_below`` characters are diffed right on the
+    event loop, where they cost less than the round trip to a worker.
+
+    At most ``concurrency`` diffs are handed to the pool at once. Further callers wait for a turn
+    without holding anything, which is the backpressure a server needs: with ``max_waiting`` set,
+    callers beyond that many waiting ones get ``asyncio.QueueFull`` instead, to shed load early.
+    A cancelled coroutine gives up its turn at once, and its diff, when it already runs, raises
+    ``DiffCancelledError`` in the worker at the next checkpoint, so the worker is free again soon.
+
+    An executor serves one event loop at a time. The pool starts with the first diff that needs it.
+    When a worker process dies, for instance killed for memory, the diffs it took down fail and the
+    next diff starts a new pool.
+    """
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        concurrency: int | None = None,
+        kind: str = "auto",
+        inline_below: int = INLINE_BELOW,
+        max_waiting: int | None = None,
+    ):
+        """
+        Create an executor, whose pool starts with the first diff that needs it.
+
+        Args:
+            max_workers: Threads or processes of the pool, the number of CPUs by default
+            concurrency: Diffs handed to the pool at once, ``max_workers`` by default
+            kind: One of ``EXECUTOR_KINDS``
+            inline_below: Size of both texts together, in characters, under which diffs run inline
+            max_waiting: Callers allowed to wait for a turn, unbounded by default
+        """
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"Unknown executor kind {kind!r}, expected one of {', '.join(EXECUTOR_KINDS)}")
+        if kind == "auto":
+            kind = "process" if _gil_enabled() else "thread"
+        self.kind = kind
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.concurrency = concurrency or self.max_workers
+        self.inline_below = inline_below
+        self.max_waiting = max_waiting
+        self.waiting = 0
+        self._slots = list(range(self.concurrency))
+        self._flags = None
+        self._pool: Executor | None = None
+        self._loop = None
+        self._semaphore = None
+
+    @property
+    def running(self) -> int:
+        """Diffs handed to the pool and not finished yet, cancelled ones included."""
+        return self.concurrency - len(self._slots)
+
+    def _start(self) -> Executor:
+        if self._pool is None:
+            if self.kind == "process":
+                if self._flags is None:
+                    self._flags = multiprocessing.RawArray("b", self.concurrency)
+                self._pool = ProcessPoolExecutor(self.max_workers, initializer=_init_process, initargs=(self._flags,))
+            else:
+                self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix="diffr")
+        return self._pool
+
+    def _pool_submit(self, func: Callable, *args) -> Future:
+        """Submit to the pool, replacing it when a dead worker broke it."""
+        pool = self._start()
+        try:
+            return pool.submit(func, *args)
+        except BrokenExecutor:
+            if self._pool is pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+        return self._start().submit(func, *args)
+
+    def start(self) -> None:
+        """Start the pool now instead of with the first large diff, and have every worker run a first diff."""
+        for future in [self._pool_submit(_run_hunks, None, "a\n", "b\n", {}) for _ in range(self.max_workers)]:
+            future.result()
+
+    def _release(self, slot: int, semaphore: asyncio.Semaphore) -> None:
+        self._slots.append(slot)
+        semaphore.release()
+
+    async def _submit(self, func: Callable, original: str, updated: str, options: dict):
+        """Run ``func`` in the pool once a turn is free, and stop it when the calling task is cancelled."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        semaphore = self._semaphore
+        if self.max_waiting is not None and semaphore.locked() and self.waiting >= self.max_waiting:
+            raise asyncio.QueueFull(f"{self.waiting} diffs are already waiting for a worker")
+        self.waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        slot = self._slots.pop()
+        try:
+            if self.kind == "process":
+                self._start()
+                self._flags[slot] = 0
+                cancel = _Flag(slot)
+            else:
+                cancel = threading.Event()
+            future = self._pool_submit(func, cancel, original, updated, options)
+        except BaseException:
+            self._release(slot, semaphore)
+            raise
+
+        def done(_) -> None:
+            # The turn ends when the worker is done, which can be well after a cancelled caller returned
+            try:
+                loop.call_soon_threadsafe(self._release, slot, semaphore)
+            except RuntimeError:  # The event loop is closed, and the semaphore with it
+                pass
+
+        future.add_done_callback(done)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Diffs that did not start are dropped with the future; running ones stop at their next checkpoint
+            if not future.done():
+                if self.kind == "process":
+                    self._flags[slot] = 1
+                else:
+                    cancel.set()
+            raise
+
+    async def diff_hunks(self, original: str, updated: str, **options) -> dict:
+        """
+        Diff two texts like ``diffr.diff_hunks``, in a worker unless they are small.
+
+        Args:
+            original: Original text
+            updated: Updated text
+            **options: Options of ``diffr.diff_hunks``; a ``DiffStats`` passed as ``stats`` gets
+                the statistics of the worker added to it
+
+        Returns:
+            The result of ``diffr.diff_hunks``
+        """
+        if len(original) + len(updated) < self.inline_below:
+            return _diff_hunks(original, updated, **options)
+        stats = options.get("stats")
+        if self.kind != "process" or not isinstance(stats, DiffStats):
+            return await self._submit(_run_hunks, original, updated, options)
+        result = await self._submit(_run_hunks, original, updated, {**options, "stats": True})
+        _add_stats(stats, result["stats"])
+        result["stats"] = stats
+        return result
+
+    async def run(self, func: Callable, original: str, updated: str, **options):
+        """
+        Call ``func(original, updated, cancel=..., **options)`` within the limits of the diffs.
+
+        Work that belongs next to the diff, like serializing its result, then happens in the worker too.
+
+        Args:
+            func: Module-level function, so worker processes can import it, which checks ``cancel``
+                like ``diffr.diff_hunks``; it gets None when it runs inline
+            original: Original text
+            updated: Updated text
+            **options: Further keyword arguments of ``func``
+
+        Returns:
+            The result of ``func``
+        """
+        if len(original) + len(updated) < self.inline_below:
+            return func(original, updated, cancel=None, **options)
+        return await self._submit(functools.partial(_run_call, func), original, updated, options)
+
+    async def diff_line(self, original: str, updated: str, **options) -> list:
+        """
+        Diff two lines like ``diffr.diff_line``, in a worker unless they are small.
+
+        A line diff has no checkpoint, so cancelling it only stops it before it starts.
+
+        Args:
+            original: Original line
+            updated: Updated line
+            **options: Options of ``diffr.diff_line``, out-parameters included
+
+        Returns:
+            The result of ``diffr.diff_line``
+        """
+        if len(original) + len(updated) < self.inline_below:
+            return _diff_line(original, updated, **options)
+        if self.kind != "process":
+            return (await self._submit(_run_line, original, updated, options))[0]
+        degraded, stats = options.get("degraded"), options.get("stats")
+        copies = {
+            **options,
+            **({"degraded": []} if degraded is not None else {}),
+            **({"stats": DiffStats()} if stats is not None else {}),
+        }
+        result, worker_degraded, worker_stats = await self._submit(_run_line, original, updated, copies)
+        if degraded is not None:
+            degraded.extend(stage for stage in worker_degraded if stage not in degraded)
+        if stats is not None:
+            _add_stats(stats, worker_stats)
+        return result
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the pool, dropping diffs that did not start; the next diff starts a new one."""
+        if self._pool is not None:
+            self._pool.shutdown(wait, cancel_futures=True)
+            self._pool = None
+
+    async def __aenter__(self) -> "DiffExecutor":
+        """Return the executor itself."""
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        """Shut the pool down without blocking the event loop."""
+        await asyncio.get_running_loop().run_in_executor(None, self.shutdown)
+
+
+# ---------------------------------------------------------------------
+# Shared executor
+# ---------------------------------------------------------------------
+
+_executor: DiffExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> DiffExecutor:
+    """Return the executor of the module-level coroutines, created with the defaults on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = DiffExecutor()
+        return _executor
+
+
+def set_executor(executor: DiffExecutor | None) -> DiffExecutor | None:
+    """
+    Set the executor of the module-level coroutines, for instance to change its limits.
+
+    Args:
+        executor: The executor to use, or None to create one with the defaults on next use
+
+    Returns:
+        The previous executor, still running, or None when there was none
+    """
+    global _executor
+    with _executor_lock:
+        previous, _executor = _executor, executor
+    return previous
+
+
+async def diff_hunks(original: str, updated: str, **options) -> dict:
+    """``DiffExecutor.diff_hunks`` on the shared executor, see ``get_executor``."""
+    return await get_executor().diff_hunks(original, updated, **options)
+
+
+async def diff_line(original: str, updated: str, **options) -> list:
+    """``DiffExecutor.diff_line`` on the shared executor, see ``get_executor``."""
+    return await get_executor().diff_line(original, updated, **options)
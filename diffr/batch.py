@@ -0,0 +1,198 @@
+"""Batch mode: diff the pairs of a JSONL manifest in a pool of processes, streaming one JSON result per line."""
+
+import json
+import os
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from .server import _parse_request, _respond
+
+# A task carries up to this many pairs, or about this many characters to diff, so small pairs do not each pay the
+# round trip to a worker process while large ones still spread over all of them
+CHUNK_ENTRIES = 16
+CHUNK_CHARS = 1 << 16
+
+
+def _result_line(index: int, line: str, defaults: dict) -> tuple[str, bool]:
+    """
+    Diff the pair of one manifest line and encode its result line, or the error that stopped it.
+
+    The result of "json" requests is spliced in as encoded by ``_respond``, rendered formats are
+    wrapped in a string under ``output``.
+
+    Returns:
+        The result line, and whether the pair failed
+    """
+    result = {"index": index}
+    try:
+        request = json.loads(line)
+        if isinstance(request, dict):
+            if "id" in request:
+                result["id"] = request["id"]
+            request = {
+                **defaults,
+                **request,
+                "options": {**defaults.get("options", {}), **(request.get("options") or {})},
+            }
+        original, updated, settings, options = _parse_request(request)
+        body = _respond(original, updated, **settings, **options)
+    except Exception as error:
+        # One bad pair must not end the batch
+        result["error"] = f"{type(error).__name__}: {error}"
+        return json.dumps(result), True
+    if settings["format"] == "json":
+        return json.dumps(result)[:-1] + ', "result": ' + body.decode() + "}", False
+    result["output"] = body.decode("utf-8", "surrogateescape")
+    return json.dumps(result), False
+
+
+def _run_chunk(chunk: list[tuple[int, str]], defaults: dict) -> list[tuple[str, bool]]:
+    return [_result_line(index, line, defaults) for index, line in chunk]
+
+
+def _size(line: str) -> int:
+    """Rough number of characters to diff for a manifest line: the line itself, and the files it names."""
+    size = len(line)
+    if '_path"' in line:
+        try:
+            request = json.loads(line)
+            for key in ("old_path", "new_path"):
+                if isinstance(request.get(key), str):
+                    size += os.path.getsize(request[key])
+        except (ValueError, AttributeError, OSError):
+            pass  # Reported for the pair once it is diffed
+    return size
+
+
+def _chunks(lines: Iterable[str]) -> Iterator[list[tuple[int, str]]]:
+    """Numbered manifest lines, blank ones skipped, in chunks of ``CHUNK_ENTRIES`` pairs or ``CHUNK_CHARS``."""
+    chunk, size = [], 0
+    for index, line in enumerate(lines):
+        if not line.strip():
+            continue
+        chunk.append((index, line))
+        size += _size(line)
+        if len(chunk) >= CHUNK_ENTRIES or size >= CHUNK_CHARS:
+            yield chunk
+            chunk, size = [], 0
+    if chunk:
+        yield chunk
+
+
+def run_batch(
+    lines: Iterable[str],
+    write: Callable[[str], None],
+    jobs: int | None = None,
+    ordered: bool = False,
+    defaults: dict | None = None,
+) -> dict:
+    """
+    Diff every pair of a manifest and write one JSON result per line as soon as it is known.
+
+    Every manifest line is a request object like those of ``diffr serve``: the texts as ``old`` and
+    ``new`` or their paths as ``old_path`` and ``new_path``, relative to the working directory,
+    with optional ``format``, ``options`` and labels, plus an ``id`` copied to the result. Results
+    carry the ``index`` of their line from 0 and either ``result`` (the ``diff_hunks`` output, for
+    the "json" format), ``output`` (rendered text) or ``error``.
+
+    Only ``jobs * 4`` chunks of pairs are read ahead of the results written, so a manifest of any
+    length is diffed in bounded memory, whether it is a file or a pipe.
+
+    A worker that dies, for instance killed for memory, breaks the pool and every chunk running in
+    it. A new pool carries on with the manifest, and the chunks that were lost are diffed again one
+    at a time in a process of their own: only the pairs of a chunk that kills that process too fail.
+
+    Args:
+        lines: Lines of the manifest
+        write: Called with every result line, newline included
+        jobs: Worker processes, the number of CPUs by default; 1 diffs in this process
+        ordered: Write results in the order of the manifest instead of as they complete
+        defaults: Request keys applied to every line that does not set them, ``options`` merged
+
+    Returns:
+        Counts of the ``pairs`` diffed and of those ``failed``
+    """
+    defaults = defaults or {}
+    jobs = jobs or os.cpu_count() or 1
+    counts = {"pairs": 0, "failed": 0}
+
+    def emit(results: list[tuple[str, bool]]) -> None:
+        for line, failed in results:
+            counts["pairs"] += 1
+            counts["failed"] += failed
+            write(line + "\n")
+
+    if jobs == 1:
+        for chunk in _chunks(lines):
+            emit(_run_chunk(chunk, defaults))
+        return counts
+
+    def failed(chunk: list[tuple[int, str]], error: Exception) -> list[tuple[str, bool]]:
+        message = f"{type(error).__name__}: {error}"
+        return [(json.dumps({"index": index, "error": message}), True) for index, _ in chunk]
+
+    chunks = _chunks(lines)
+    # Position in the manifest, pairs and executor of every chunk submitted
+    pending: dict[Future, tuple[int, list[tuple[int, str]], ProcessPoolExecutor]] = {}
+    finished: dict[int, list[tuple[str, bool]]] = {}
+    # Chunks lost with a broken pool, waiting to be diffed alone in the single process of ``quarantine``
+    suspects: deque[tuple[int, list[tuple[int, str]]]] = deque()
+    pool = ProcessPoolExecutor(jobs)
+    quarantine = None
+    testing = False
+    submitted = written = 0
+    try:
+        while True:
+            while len(pending) + len(finished) + len(suspects) < jobs * 4 and (chunk := next(chunks, None)) is not None:
+                try:
+                    future = pool.submit(_run_chunk, chunk, defaults)
+                except BrokenProcessPool:
+                    # Its chunks are found broken as they are waited for
+                    pool.shutdown(wait=False)
+                    pool = ProcessPoolExecutor(jobs)
+                    future = pool.submit(_run_chunk, chunk, defaults)
+                pending[future] = (submitted, chunk, pool)
+                submitted += 1
+            if suspects and not testing:
+                quarantine = quarantine or ProcessPoolExecutor(1)
+                position, chunk = suspects.popleft()
+                pending[quarantine.submit(_run_chunk, chunk, defaults)] = (position, chunk, quarantine)
+                testing = True
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                position, chunk, executor = pending.pop(future)
+                if executor is quarantine:
+                    testing = False
+                try:
+                    results = future.result()
+                except BrokenProcessPool as error:
+                    if executor is quarantine:
+                        # Alone in its process, the chunk killed it: its pairs fail, not the batch
+                        quarantine.shutdown(wait=False)
+                        quarantine = None
+                        results = failed(chunk, error)
+                    else:
+                        if executor is pool:
+                            pool.shutdown(wait=False)
+                            pool = ProcessPoolExecutor(jobs)
+                        suspects.append((position, chunk))
+                        continue
+                except Exception as error:
+                    results = failed(chunk, error)
+                if ordered:
+                    finished[position] = results
+                else:
+                    emit(results)
+            # In order, a chunk is written once every chunk before it is
+            while written in finished:
+                emit(finished.pop(written))
+                written += 1
+    finally:
+        pool.shutdown(cancel_futures=True)
+        if quarantine is not None:
+            quarantine.shutdown(cancel_futures=True)
+    return counts
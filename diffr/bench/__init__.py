@@ -0,0 +1,25 @@
+"""Benchmark suite for diffr: named scenarios, timing and memory statistics, and regression gating."""
+
+from .alternatives import load_corpus, run_alternatives
+from .harness import Scenario, compare, run_scenario, run_scenarios, summarize
+from .memory import measure, run_memory
+from .scaling import fit_exponent, sweep
+from .scenarios import SCENARIOS
+from .workloads import Workload, generate
+
+__all__ = [
+    "SCENARIOS",
+    "Scenario",
+    "Workload",
+    "compare",
+    "fit_exponent",
+    "generate",
+    "load_corpus",
+    "measure",
+    "run_alternatives",
+    "run_memory",
+    "run_scenario",
+    "run_scenarios",
+    "summarize",
+    "sweep",
+]
@@ -0,0 +1,300 @@
+"""Command line of the benchmark suite: ``python -m diffr.bench run|list|compare|scale|generate|alternatives``."""
+
+import argparse
+import json
+import sys
+
+from ..core import diff_hunks, set_numpy_threshold
+from .alternatives import ENGINES, default_corpus, load_corpus, run_alternatives
+from .harness import MEMORY_METRICS, METRICS, compare, format_bytes, format_time, run_scenarios
+from .memory import run_memory
+from .scaling import PARAMETERS, sweep
+from .scenarios import SCENARIOS
+from .workloads import EDIT_TYPES, LENGTH_DISTRIBUTIONS, Workload, generate
+
+
+def _load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_report(report: dict, path: str) -> None:
+    if path == "-":
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+
+
+def _print_result(name: str, result: dict) -> None:
+    print(
+        f"{name:<20} median {format_time(result['median']):>10}  p95 {format_time(result['p95']):>10}  "
+        f"p99 {format_time(result['p99']):>10}  ({result['repeat']} x {result['inner']})",
+        file=sys.stderr,
+    )
+
+
+def _print_memory(name: str, result: dict) -> None:
+    print(
+        f"{name:<20} peak {format_bytes(result['peak']):>10}  retained {format_bytes(result['retained']):>10}  "
+        f"rss {format_bytes(result['rss']):>10}  trace {format_bytes(result['trace_peak']):>10}  "
+        f"({result['trace_allocations']} mallocs)",
+        file=sys.stderr,
+    )
+
+
+def run_main(args: argparse.Namespace) -> int:
+    """Run the selected scenarios, print a summary to stderr and optionally store the JSON report."""
+    unknown = [name for name in args.scenario if name not in SCENARIOS]
+    if unknown:
+        print(f"Unknown scenario: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    scenarios = [SCENARIOS[name] for name in args.scenario or SCENARIOS]
+    report = run_scenarios(scenarios, repeat=args.repeat, warmup=args.warmup, progress=_print_result)
+    if args.memory:
+        report["memory"] = run_memory(scenarios, progress=_print_memory)
+    if args.output:
+        _write_report(report, args.output)
+    return 0
+
+
+def list_main(args: argparse.Namespace) -> int:
+    """Print the name and description of every scenario."""
+    for name, scenario in SCENARIOS.items():
+        print(f"{name:<20} {scenario.description}")
+    return 0
+
+
+def compare_main(args: argparse.Namespace) -> int:
+    """Compare two reports on every metric, returning 1 when any scenario regressed beyond the tolerance."""
+    baseline, current = _load(args.baseline), _load(args.current)
+    regressed = []
+    for metric in args.metric or ["median"]:
+        rows = compare(baseline, current, tolerance=args.tolerance, metric=metric)
+        if metric in MEMORY_METRICS and not rows:
+            print(f"{metric}: no memory results, run with --memory", file=sys.stderr)
+        fmt = format_time if metric in METRICS else format_bytes
+        for row in rows:
+            ratio = f"{row['ratio']:.2f}x" if row["ratio"] is not None else "-"
+            print(
+                f"{row['name']:<20} {metric:<12} {fmt(row['baseline']):>10} -> {fmt(row['current']):>10}  "
+                f"{ratio:>7}  {row['status']}"
+            )
+        regressed.extend(f"{row['name']} ({metric})" for row in rows if row["status"] == "regressed")
+    if regressed:
+        print(f"Regressed beyond {args.tolerance:.0%}: {', '.join(regressed)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _add_workload_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = Workload()
+    parser.add_argument("--lines", type=int, default=defaults.lines, help="Lines of the original file")
+    parser.add_argument("--line-length", type=int, default=defaults.line_length, help="Mean line length")
+    parser.add_argument("--length-distribution", choices=LENGTH_DISTRIBUTIONS, default=defaults.length_distribution)
+    parser.add_argument(
+        "--duplicates", type=float, default=defaults.duplicate_ratio, help="Share of lines drawn from a small pool"
+    )
+    parser.add_argument("--edits", type=float, default=defaults.edit_density, help="Share of lines edited")
+    parser.add_argument(
+        "--edit-types",
+        default=",".join(defaults.edit_types),
+        help=f"Comma-separated edit types among {', '.join(EDIT_TYPES)}",
+    )
+    parser.add_argument("--move-size", type=int, default=defaults.move_size, help="Lines per moved block")
+    parser.add_argument("--seed", type=int, default=defaults.seed, help="Seed of the generator")
+
+
+def _workload(args: argparse.Namespace) -> Workload:
+    return Workload(
+        lines=args.lines,
+        line_length=args.line_length,
+        length_distribution=args.length_distribution,
+        duplicate_ratio=args.duplicates,
+        edit_density=args.edits,
+        edit_types=tuple(kind.strip() for kind in args.edit_types.split(",") if kind.strip()),
+        move_size=args.move_size,
+        seed=args.seed,
+    )
+
+
+def _number(text: str) -> int | float:
+    value = float(text)
+    return int(value) if value.is_integer() and "." not in text else value
+
+
+def scale_main(args: argparse.Namespace) -> int:
+    """Sweep one workload parameter, print the fitted exponents, and gate on the time exponent."""
+    values = [_number(value) for value in args.values.split(",")]
+
+    def progress(point: dict) -> None:
+        memory = f"  peak {point['peak_memory'] / 1e6:.1f} MB" if point["peak_memory"] is not None else ""
+        print(f"{args.param}={point['value']:<12} median {format_time(point['median']):>10}{memory}", file=sys.stderr)
+
+    previous = set_numpy_threshold(None) if args.no_numpy else None
+    try:
+        report = sweep(
+            args.param,
+            values,
+            _workload(args),
+            func=lambda old, new: diff_hunks(old, new, detect_moves=args.detect_moves),
+            repeat=args.repeat,
+            memory=not args.no_memory,
+            progress=progress,
+        )
+    finally:
+        if args.no_numpy:
+            set_numpy_threshold(previous)
+    for name, fit in report["exponents"].items():
+        if fit is not None:
+            print(f"{name} exponent: {fit['exponent']:.2f} (r2 {fit['r2']:.3f})", file=sys.stderr)
+    if args.output:
+        _write_report(report, args.output)
+
+    fit = report["exponents"]["time"]
+    if args.max_exponent is not None and fit is not None and fit["exponent"] > args.max_exponent:
+        print(f"Time exponent {fit['exponent']:.2f} exceeds {args.max_exponent}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def generate_main(args: argparse.Namespace) -> int:
+    """Write the original and updated file of a workload."""
+    old, new = generate(_workload(args))
+    for path, text in ((args.old, old), (args.new, new)):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+    return 0
+
+
+def alternatives_main(args: argparse.Namespace) -> int:
+    """Compare diffr with difflib and git on a corpus, and gate on how often they find the same hunks."""
+    if (args.old is None) != (args.new is None):
+        print("Give both an original and an updated path, or neither for the synthetic corpus", file=sys.stderr)
+        return 2
+    corpus = load_corpus(args.old, args.new) if args.old is not None else default_corpus()
+    if not corpus:
+        print("No file is present on both sides", file=sys.stderr)
+        return 2
+
+    def progress(pair: str, engine: str, result: dict) -> None:
+        print(
+            f"{pair:<24} {engine:<14} median {format_time(result['median']):>10}  "
+            f"{result['hunks']} hunks, {result['changes']} changed lines",
+            file=sys.stderr,
+        )
+
+    report = run_alternatives(
+        corpus,
+        engines=args.engine or None,
+        repeat=args.repeat,
+        memory=not args.no_memory,
+        git_algorithm=args.git_algorithm,
+        progress=progress,
+    )
+    print(f"{'engine':<14} {'MB/s':>8} {'p50':>10} {'p95':>10} {'p99':>10} {'peak':>10} {'hunks':>7} {'lines':>7}")
+    for name, result in report["engines"].items():
+        throughput = f"{result['throughput'] / 1e6:.2f}" if result["throughput"] else "-"
+        agreement = [f"{result[key]:.0%}" if key in result else "-" for key in ("hunks_agreement", "changes_agreement")]
+        print(
+            f"{name:<14} {throughput:>8} {format_time(result['median']):>10} {format_time(result['p95']):>10} "
+            f"{format_time(result['p99']):>10} {format_bytes(result['peak_memory']):>10} "
+            f"{agreement[0]:>7} {agreement[1]:>7}"
+        )
+    if args.output:
+        _write_report(report, args.output)
+
+    if args.min_agreement is not None:
+        below = [
+            name
+            for name, result in report["engines"].items()
+            if result.get("hunks_agreement", 1.0) < args.min_agreement
+        ]
+        if below:
+            print(f"Hunk agreement with diffr below {args.min_agreement:.0%}: {', '.join(below)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run entry point for the benchmark suite."""
+    parser = argparse.ArgumentParser(prog="diffr bench", description="Benchmark diffr and gate regressions")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Run scenarios and report timings")
+    run.add_argument("-s", "--scenario", action="append", default=[], help="Scenario to run (default: all)")
+    run.add_argument("--repeat", type=int, default=30, help="Timed samples per scenario (default: 30)")
+    run.add_argument("--warmup", type=int, default=3, help="Untimed calls before sampling (default: 3)")
+    run.add_argument(
+        "--memory", action="store_true", help="Also measure the memory of every scenario, each in a fresh process"
+    )
+    run.add_argument("-o", "--output", help="Write the JSON report to this file, or to stdout with -")
+    run.set_defaults(handler=run_main)
+
+    listing = commands.add_parser("list", help="List the available scenarios")
+    listing.set_defaults(handler=list_main)
+
+    comparison = commands.add_parser("compare", help="Compare a report against a baseline report")
+    comparison.add_argument("baseline", help="JSON report of the reference run")
+    comparison.add_argument("current", help="JSON report of the run being checked")
+    comparison.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative slowdown (default: 0.10)")
+    comparison.add_argument(
+        "--metric",
+        action="append",
+        choices=METRICS + MEMORY_METRICS,
+        help="Statistic compared, repeat to gate several (default: median)",
+    )
+    comparison.set_defaults(handler=compare_main)
+
+    scaling = commands.add_parser("scale", help="Sweep a workload parameter and fit scaling exponents")
+    scaling.add_argument("--param", choices=PARAMETERS, default="lines", help="Parameter to sweep (default: lines)")
+    scaling.add_argument(
+        "--values",
+        default="1000,10000,100000",
+        help="Comma-separated values of the parameter (default: 1000,10000,100000)",
+    )
+    scaling.add_argument("--repeat", type=int, default=3, help="Timed runs per point (default: 3)")
+    scaling.add_argument("--no-memory", action="store_true", help="Skip the memory measurements")
+    scaling.add_argument("--detect-moves", action="store_true", help="Diff with move detection")
+    scaling.add_argument("--no-numpy", action="store_true", help="Find anchors without NumPy, to measure its gain")
+    scaling.add_argument("--max-exponent", type=float, help="Fail when the time exponent exceeds this value")
+    scaling.add_argument("-o", "--output", help="Write the JSON report to this file, or to stdout with -")
+    _add_workload_arguments(scaling)
+    scaling.set_defaults(handler=scale_main)
+
+    generating = commands.add_parser("generate", help="Write a synthetic pair of files")
+    generating.add_argument("old", help="Path of the original file")
+    generating.add_argument("new", help="Path of the updated file")
+    _add_workload_arguments(generating)
+    generating.set_defaults(handler=generate_main)
+
+    alternatives = commands.add_parser("alternatives", help="Compare diffr with difflib and git diff --no-index")
+    alternatives.add_argument("old", nargs="?", help="Original file or directory (default: a synthetic corpus)")
+    alternatives.add_argument("new", nargs="?", help="Updated file or directory")
+    alternatives.add_argument(
+        "-e", "--engine", action="append", choices=list(ENGINES), help="Engine to run (default: all available)"
+    )
+    alternatives.add_argument("--repeat", type=int, default=5, help="Timed runs per engine and pair (default: 5)")
+    alternatives.add_argument("--no-memory", action="store_true", help="Skip the memory measurements")
+    alternatives.add_argument(
+        "--git-algorithm",
+        choices=("patience", "histogram", "myers", "minimal"),
+        default="patience",
+        help="Algorithm of git diff (default: patience, the closest to diffr)",
+    )
+    alternatives.add_argument(
+        "--min-agreement",
+        type=float,
+        help="Fail when an engine finds as many hunks as diffr on less than this share of the pairs",
+    )
+    alternatives.add_argument("-o", "--output", help="Write the JSON report to this file, or to stdout with -")
+    alternatives.set_defaults(handler=alternatives_main)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
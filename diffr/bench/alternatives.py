@@ -0,0 +1,289 @@
+"""Side-by-side benchmark of diffr against difflib and ``git diff --no-index`` on the same corpus."""
+
+import difflib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from datetime import UTC, datetime
+
+from ..core import diff_hunks
+from .harness import REPORT_VERSION, environment, summarize
+from .memory import measure
+from .scenarios import edit_file, sample_file
+from .workloads import Workload, generate
+
+
+@dataclass
+class Pair:
+    """An original and updated text of the corpus."""
+
+    name: str
+    old: str
+    new: str
+
+    @property
+    def size(self) -> int:
+        return len(self.old.encode("utf-8", "surrogateescape")) + len(self.new.encode("utf-8", "surrogateescape"))
+
+
+def default_corpus() -> list[Pair]:
+    """Synthetic pairs from code-like files of 2,000 lines to 10,000-line files with duplicates and moves."""
+    pairs = []
+    old = sample_file(2_000)
+    pairs.append(Pair("code_2000", old, edit_file(old)))
+    for name, workload in (
+        ("lines_1000", Workload(lines=1_000)),
+        ("lines_10000", Workload(lines=10_000, edit_density=0.02)),
+        ("duplicates_10000", Workload(lines=10_000, duplicate_ratio=0.2, edit_density=0.02)),
+        ("moves_10000", Workload(lines=10_000, edit_density=0.002, edit_types=("move",), move_size=20)),
+    ):
+        pairs.append(Pair(name, *generate(workload)))
+    return pairs
+
+
+def _read(path: str) -> str:
+    with open(path, encoding="utf-8", errors="surrogateescape", newline="") as f:
+        return f.read()
+
+
+def load_corpus(old_path: str, new_path: str) -> list[Pair]:
+    """
+    Load the pairs to compare from two files, or from the files at the same relative path in two directories.
+
+    Args:
+        old_path: Original file or directory
+        new_path: Updated file or directory
+
+    Returns:
+        One pair per file present on both sides, named after its relative path
+    """
+    if not os.path.isdir(old_path):
+        return [Pair(os.path.basename(new_path), _read(old_path), _read(new_path))]
+    pairs = []
+    for root, dirs, files in os.walk(old_path):
+        dirs.sort()
+        for name in sorted(files):
+            old_file = os.path.join(root, name)
+            relative = os.path.relpath(old_file, old_path)
+            new_file = os.path.join(new_path, relative)
+            if os.path.isfile(new_file):
+                pairs.append(Pair(relative, _read(old_file), _read(new_file)))
+    return pairs
+
+
+# ---------------------------------------------------------------------
+# Engines
+# ---------------------------------------------------------------------
+# Every engine prepares a pair outside of the timed region and returns a callable that diffs it and
+# returns ``(hunks, removed, added)``: the number of hunks without context lines, and the numbers of
+# lines removed and added. diffr hunks carry no context, so the others run with zero context too.
+
+
+def _diffr(pair: Pair) -> Callable[[], tuple[int, int, int]]:
+    def run():
+        hunks = diff_hunks(pair.old, pair.new)["hunks"]
+        removed = added = 0
+        for hunk in hunks:
+            for entry in hunk["lines"]:
+                removed += "content_old" in entry
+                added += "content_new" in entry
+        return len(hunks), removed, added
+
+    return run
+
+
+def _sequence_matcher(pair: Pair) -> Callable[[], tuple[int, int, int]]:
+    # Lines are compared without their endings, like diffr does
+    old, new = pair.old.splitlines(), pair.new.splitlines()
+
+    def run():
+        hunks = removed = added = 0
+        for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old, new, autojunk=False).get_opcodes():
+            if tag != "equal":
+                hunks += 1
+                removed += i2 - i1
+                added += j2 - j1
+        return hunks, removed, added
+
+    return run
+
+
+def _count_unified(lines: Iterable[str]) -> tuple[int, int, int]:
+    """Hunks, removed and added lines of unified diff output, skipping the file headers."""
+    hunks = removed = added = 0
+    for line in lines:
+        if line.startswith("@@"):
+            hunks += 1
+        elif not hunks:
+            continue
+        elif line.startswith("-"):
+            removed += 1
+        elif line.startswith("+"):
+            added += 1
+    return hunks, removed, added
+
+
+def _unified_diff(pair: Pair) -> Callable[[], tuple[int, int, int]]:
+    old, new = pair.old.splitlines(), pair.new.splitlines()
+    return lambda: _count_unified(difflib.unified_diff(old, new, n=0, lineterm=""))
+
+
+class _GitDiff:
+    """``git diff --no-index`` on temporary copies of a pair, keeping the RSS high-water mark of the last run."""
+
+    def __init__(self, pair: Pair, algorithm: str = "patience"):
+        self.directory = tempfile.TemporaryDirectory()
+        paths = []
+        for side, text in (("old", pair.old), ("new", pair.new)):
+            path = os.path.join(self.directory.name, side)
+            with open(path, "w", encoding="utf-8", errors="surrogateescape", newline="") as f:
+                f.write(text)
+            paths.append(path)
+        self.command = [
+            "git",
+            "diff",
+            "--no-index",
+            "--no-color",
+            "--no-ext-diff",
+            "--no-renames",
+            "-U0",
+            f"--diff-algorithm={algorithm}",
+            *paths,
+        ]
+        # Keep the user's configuration, like diff.algorithm, out of the measurements
+        self.env = {**os.environ, "GIT_CONFIG_NOSYSTEM": "1", "GIT_CONFIG_GLOBAL": os.devnull}
+        self.peak = None
+
+    def __call__(self) -> tuple[int, int, int]:
+        process = subprocess.Popen(self.command, stdout=subprocess.PIPE, env=self.env)
+        output = process.stdout.read()
+        process.stdout.close()
+        if hasattr(os, "wait4"):
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            # Kilobytes on Linux, bytes on macOS
+            self.peak = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+        else:
+            process.wait()
+        # Status 1 only means the files differ
+        if process.returncode not in (0, 1):
+            raise subprocess.CalledProcessError(process.returncode, self.command)
+        return _count_unified(output.decode("utf-8", "surrogateescape").splitlines())
+
+
+ENGINES = {
+    "diffr": ("diffr.diff_hunks, with inline diffs of replaced lines", _diffr),
+    "difflib": ("difflib.SequenceMatcher opcodes, without autojunk", _sequence_matcher),
+    "unified_diff": ("difflib.unified_diff with zero context lines, junk heuristic included", _unified_diff),
+    "git": ("git diff --no-index -U0 in a child process, startup included", _GitDiff),
+}
+
+
+def available_engines() -> list[str]:
+    """Names of the engines that can run here; git needs a ``git`` executable on the path."""
+    return [name for name in ENGINES if name != "git" or shutil.which("git")]
+
+
+def _peak_memory(engine: str, func: Callable[[], object]) -> int | None:
+    """Peak memory of one call: traced allocations and the malloc'd trace in process, the child's RSS for git."""
+    if engine == "git":
+        func()
+        return func.peak
+    result = measure(func)
+    return result["peak"] + result["trace_peak"]
+
+
+def run_alternatives(
+    corpus: Iterable[Pair],
+    engines: Iterable[str] | None = None,
+    repeat: int = 5,
+    memory: bool = True,
+    git_algorithm: str = "patience",
+    progress: Callable[[str, str, dict], None] | None = None,
+) -> dict:
+    """
+    Diff every pair of a corpus with every engine and report them side by side.
+
+    Every engine diffs every pair ``repeat`` times after one untimed call. Latency percentiles are
+    taken over all those calls, and throughput is the size of both texts of the corpus over the sum
+    of the median times per pair. Agreement is the share of pairs on which an engine finds the same
+    number of hunks, or of changed lines, as diffr; diffs are not unique, so a low share is a lead to
+    follow rather than a bug, but a drop after a change to diffr usually is one.
+
+    Args:
+        corpus: Pairs to diff
+        engines: Names of ``ENGINES`` to run, those of ``available_engines()`` by default
+        repeat: Timed calls per engine and pair
+        memory: Whether to measure the peak memory of every engine on every pair
+        git_algorithm: Value of ``git diff --diff-algorithm``; diffr is closest to "patience"
+        progress: Called with the pair name, engine name and result of every measurement
+
+    Returns:
+        A JSON-serializable report with a summary per engine under ``engines`` and the results per pair under ``pairs``
+    """
+    engines = list(engines or available_engines())
+    unknown = [name for name in engines if name not in ENGINES]
+    if unknown:
+        raise ValueError(f"Unknown engines {unknown}, expected some of {', '.join(ENGINES)}")
+    corpus = list(corpus)
+    samples = {name: [] for name in engines}
+    pairs = []
+    for pair in corpus:
+        results = {}
+        for name in engines:
+            prepare = ENGINES[name][1]
+            func = prepare(pair, git_algorithm) if name == "git" else prepare(pair)
+            hunks, removed, added = func()
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                func()
+                times.append(time.perf_counter() - start)
+            samples[name].extend(times)
+            results[name] = {
+                "median": summarize(times)["median"],
+                "hunks": hunks,
+                "changes": removed + added,
+                "peak_memory": _peak_memory(name, func) if memory else None,
+            }
+            if progress is not None:
+                progress(pair.name, name, results[name])
+        pairs.append(
+            {
+                "name": pair.name,
+                "bytes": pair.size,
+                "old_lines": pair.old.count("\n"),
+                "new_lines": pair.new.count("\n"),
+                "results": results,
+            }
+        )
+
+    size = sum(pair["bytes"] for pair in pairs)
+    summary = {}
+    for name in engines:
+        total = sum(pair["results"][name]["median"] for pair in pairs)
+        peaks = [pair["results"][name]["peak_memory"] for pair in pairs if pair["results"][name]["peak_memory"]]
+        summary[name] = {
+            "description": ENGINES[name][0],
+            "throughput": size / total if total else None,
+            **(summarize(samples[name]) if samples[name] else {}),
+            "peak_memory": max(peaks) if peaks else None,
+        }
+        if "diffr" in engines and pairs:
+            for key in ("hunks", "changes"):
+                agree = sum(pair["results"][name][key] == pair["results"]["diffr"][key] for pair in pairs)
+                summary[name][f"{key}_agreement"] = agree / len(pairs)
+
+    return {
+        "version": REPORT_VERSION,
+        "created": datetime.now(UTC).isoformat(timespec="seconds"),
+        "environment": environment(),
+        "config": {"repeat": repeat, "git_algorithm": git_algorithm if "git" in engines else None},
+        "engines": summary,
+        "pairs": pairs,
+    }
@@ -0,0 +1,238 @@
+"""Timing harness: runs scenarios with warmup and repetitions, and compares reports against a baseline."""
+
+import gc
+import math
+import platform
+import statistics
+import sys
+import time
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from importlib import metadata
+
+REPORT_VERSION = 1
+
+METRICS = ("mean", "median", "p95", "p99", "min", "max")
+
+# Memory statistics, in bytes except for allocation counts, stored under "memory" by ``diffr.bench.memory``
+MEMORY_METRICS = ("peak", "retained", "blocks", "rss", "trace_peak", "trace_bytes", "trace_allocations")
+
+# Samples shorter than this are repeated in a loop and averaged, so timer resolution does not dominate them
+MIN_SAMPLE_TIME = 1e-3
+
+
+@dataclass
+class Scenario:
+    """
+    A named benchmark.
+
+    ``setup`` prepares the inputs outside of the timed region and returns the zero-argument callable
+    that is timed. ``repeat`` and ``warmup`` override the defaults of the run for slow scenarios, and
+    ``inner`` fixes how many calls make up one sample instead of calibrating it. Scenarios whose
+    work happens outside of the process, like the command line, set ``memory`` to False.
+    """
+
+    name: str
+    description: str
+    setup: Callable[[], Callable[[], object]]
+    repeat: int | None = None
+    warmup: int | None = None
+    inner: int | None = None
+    memory: bool = True
+
+
+def percentile(ordered: list[float], q: float) -> float:
+    """Percentile ``q`` (0 to 100) of sorted samples, interpolating linearly between the closest ranks."""
+    if not ordered:
+        return math.nan
+    position = (len(ordered) - 1) * q / 100
+    low = math.floor(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def summarize(samples: Iterable[float]) -> dict:
+    """Summary statistics of timing samples, in seconds."""
+    ordered = sorted(samples)
+    return {
+        "mean": statistics.fmean(ordered),
+        "median": statistics.median(ordered),
+        "p95": percentile(ordered, 95),
+        "p99": percentile(ordered, 99),
+        "min": ordered[0],
+        "max": ordered[-1],
+        "stdev": statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+    }
+
+
+def _calibrate(func: Callable[[], object]) -> int:
+    """Count the calls per sample that make one sample take at least ``MIN_SAMPLE_TIME``."""
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    if elapsed >= MIN_SAMPLE_TIME:
+        return 1
+    return min(100_000, math.ceil(MIN_SAMPLE_TIME / max(elapsed, 1e-9)))
+
+
+def run_scenario(scenario: Scenario, repeat: int = 30, warmup: int = 3) -> dict:
+    """
+    Time one scenario.
+
+    Args:
+        scenario: The scenario to run
+        repeat: Number of timed samples, unless the scenario sets its own
+        warmup: Number of untimed calls made first, unless the scenario sets its own
+
+    Returns:
+        Summary statistics of the per-call time in seconds, with the number of samples and calls per sample
+    """
+    func = scenario.setup()
+    repeat = scenario.repeat or repeat
+    warmup = scenario.warmup if scenario.warmup is not None else warmup
+    for _ in range(warmup):
+        func()
+    inner = scenario.inner or _calibrate(func)
+
+    samples = []
+    gc_enabled = gc.isenabled()
+    # Collections triggered by earlier samples would otherwise land on arbitrary later ones
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(inner):
+                func()
+            samples.append((time.perf_counter() - start) / inner)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    return {"description": scenario.description, "repeat": repeat, "inner": inner, **summarize(samples)}
+
+
+def environment() -> dict:
+    """Describe the interpreter and machine a report was produced on."""
+    try:
+        version = metadata.version("diffr")
+    except metadata.PackageNotFoundError:
+        version = None
+    return {
+        "diffr": version,
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+    }
+
+
+def run_scenarios(
+    scenarios: Iterable[Scenario],
+    repeat: int = 30,
+    warmup: int = 3,
+    progress: Callable[[str, dict], None] | None = None,
+) -> dict:
+    """
+    Run scenarios one after the other and collect a report that can be stored as JSON.
+
+    Args:
+        scenarios: Scenarios to run, in order
+        repeat: Default number of timed samples per scenario
+        warmup: Default number of untimed calls per scenario
+        progress: Called with the name and result of every scenario as soon as it finishes
+
+    Returns:
+        The report, with the results of every scenario under ``scenarios``
+    """
+    results = {}
+    for scenario in scenarios:
+        results[scenario.name] = run_scenario(scenario, repeat, warmup)
+        if progress is not None:
+            progress(scenario.name, results[scenario.name])
+    return {
+        "version": REPORT_VERSION,
+        "created": datetime.now(UTC).isoformat(timespec="seconds"),
+        "environment": environment(),
+        "config": {"repeat": repeat, "warmup": warmup},
+        "scenarios": results,
+    }
+
+
+def compare(baseline: dict, current: dict, tolerance: float = 0.10, metric: str = "median") -> list[dict]:
+    """
+    Compare two reports scenario by scenario.
+
+    A scenario regressed when ``metric`` grew by more than ``tolerance`` (a fraction of the baseline),
+    and improved when it shrank by as much. Scenarios present in one report only are listed as
+    "missing" or "new", and those with no value for the metric, like RSS on some platforms, as
+    "unavailable"; neither fails the comparison. Memory metrics are read from the ``memory``
+    results of the reports.
+
+    Args:
+        baseline: Report of the reference run
+        current: Report of the run being checked
+        tolerance: Allowed relative growth
+        metric: Statistic compared, one of ``METRICS`` or ``MEMORY_METRICS``
+
+    Returns:
+        One row per scenario with ``name``, ``baseline``, ``current``, ``ratio`` and ``status``
+    """
+    if metric not in METRICS and metric not in MEMORY_METRICS:
+        raise ValueError(f"Unknown metric {metric!r}, expected one of {', '.join(METRICS + MEMORY_METRICS)}")
+    section = "scenarios" if metric in METRICS else "memory"
+    rows = []
+    old = baseline.get(section, {})
+    new = current.get(section, {})
+    for name in sorted(old.keys() | new.keys()):
+        if name not in new or name not in old:
+            rows.append(
+                {
+                    "name": name,
+                    "baseline": old[name][metric] if name in old else None,
+                    "current": new[name][metric] if name in new else None,
+                    "ratio": None,
+                    "status": "missing" if name in old else "new",
+                }
+            )
+            continue
+        before, after = old[name][metric], new[name][metric]
+        if before is None or after is None:
+            rows.append({"name": name, "baseline": before, "current": after, "ratio": None, "status": "unavailable"})
+            continue
+        if before:
+            ratio = after / before
+        else:
+            # Nothing used before, like a diff that needed no trace: any use at all is a regression
+            ratio = 1.0 if not after else math.inf
+        if ratio > 1 + tolerance:
+            status = "regressed"
+        elif ratio < 1 - tolerance:
+            status = "improved"
+        else:
+            status = "ok"
+        rows.append({"name": name, "baseline": before, "current": after, "ratio": ratio, "status": status})
+    return rows
+
+
+def format_time(seconds: float | None) -> str:
+    """Format a duration with a unit that keeps three significant digits readable."""
+    if seconds is None:
+        return "-"
+    for unit, scale in (("s", 1.0), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g} {unit}"
+    return f"{seconds / 1e-9:.3g} ns"
+
+
+def format_bytes(size: int | None) -> str:
+    """Format a size in bytes with a binary unit that keeps three significant digits readable."""
+    if size is None:
+        return "-"
+    if abs(size) < 1024:
+        return f"{size} B"
+    for unit in ("KiB", "MiB", "GiB"):
+        size /= 1024
+        if abs(size) < 1024 or unit == "GiB":
+            return f"{size:.3g} {unit}"
@@ -0,0 +1,153 @@
+"""Memory measurements: tracemalloc peak, RSS high-water mark and allocation counts of scenarios."""
+
+import gc
+import json
+import subprocess
+import sys
+import tracemalloc
+from collections.abc import Callable, Iterable
+
+from ..core import reset_trace_memory, trace_memory
+from .harness import Scenario
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _rss_high_water() -> int | None:
+    """High-water mark of the resident set size of the process in bytes, None where it is not available."""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _reset_rss_high_water() -> None:
+    """Lower the high-water mark to the current resident set size, where Linux allows it."""
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def measure(func: Callable[[], object]) -> dict:
+    """
+    Measure the memory used by one call of ``func``.
+
+    The first call only moves the RSS high-water mark, since tracing allocations costs memory of its
+    own. The second call runs under tracemalloc, which sees every allocation made through the Python
+    allocators, and with the counters of ``trace_memory()`` reset, which cover the edit graphs the
+    line diff engine allocates with libc malloc. Where the high-water mark cannot be reset, ``rss``
+    is only the growth beyond the highest mark reached so far, so run scenarios in a fresh process.
+
+    Args:
+        func: Zero-argument callable to measure
+
+    Returns:
+        Bytes at the traced ``peak``, bytes ``retained`` by the result, memory ``blocks`` the result
+        keeps allocated, growth of the ``rss`` high-water mark, and the ``trace_peak``, ``trace_bytes``
+        and ``trace_allocations`` of the malloc'd traces
+    """
+    gc.collect()
+    _reset_rss_high_water()
+    before = _rss_high_water()
+    func()
+    after = _rss_high_water()
+
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    reset_trace_memory()
+    tracemalloc.start()
+    try:
+        result = func()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    blocks = sys.getallocatedblocks() - blocks
+    trace = trace_memory()
+    del result
+
+    return {
+        "peak": peak,
+        "retained": retained,
+        "blocks": max(0, blocks),
+        "rss": after - before if before is not None and after is not None else None,
+        "trace_peak": trace["peak"],
+        "trace_bytes": trace["bytes"],
+        "trace_allocations": trace["allocations"],
+    }
+
+
+# Run in a fresh interpreter by ``measure_scenario``, with the name of the scenario as argument
+_WORKER = "import sys; from diffr.bench.memory import _measure_named; _measure_named(sys.argv[1])"
+
+
+def _measure_named(name: str) -> None:
+    """Measure a scenario of ``SCENARIOS`` and print the result as JSON."""
+    from .scenarios import SCENARIOS
+
+    json.dump(measure(SCENARIOS[name].setup()), sys.stdout)
+
+
+def measure_scenario(scenario: Scenario, isolate: bool = True) -> dict:
+    """
+    Measure the memory used by one call of a scenario.
+
+    Args:
+        scenario: The scenario to measure
+        isolate: Measure in a fresh interpreter, so earlier scenarios do not hide RSS growth and the
+            allocator starts from the same state; only possible for scenarios of ``SCENARIOS``
+
+    Returns:
+        The measurements of ``measure`` with the description of the scenario
+    """
+    from .scenarios import SCENARIOS
+
+    if isolate and SCENARIOS.get(scenario.name) is scenario:
+        output = subprocess.run(
+            [sys.executable, "-c", _WORKER, scenario.name],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        result = json.loads(output)
+    else:
+        result = measure(scenario.setup())
+    return {"description": scenario.description, **result}
+
+
+def run_memory(
+    scenarios: Iterable[Scenario],
+    isolate: bool = True,
+    progress: Callable[[str, dict], None] | None = None,
+) -> dict:
+    """
+    Measure the memory of scenarios one after the other, skipping those with ``memory`` set to False.
+
+    Args:
+        scenarios: Scenarios to measure, in order
+        isolate: Measure every scenario in a fresh interpreter, see ``measure_scenario``
+        progress: Called with the name and result of every scenario as soon as it is measured
+
+    Returns:
+        The results of every scenario by name, stored under ``memory`` in a report
+    """
+    results = {}
+    for scenario in scenarios:
+        if not scenario.memory:
+            continue
+        results[scenario.name] = measure_scenario(scenario, isolate)
+        if progress is not None:
+            progress(scenario.name, results[scenario.name])
+    return results
@@ -0,0 +1,113 @@
+"""Scaling sweeps: time and memory of a diff as one workload parameter grows, with fitted exponents."""
+
+import dataclasses
+import math
+import statistics
+import time
+import tracemalloc
+from collections.abc import Callable, Iterable
+from datetime import UTC, datetime
+
+from ..core import diff_hunks
+from .harness import REPORT_VERSION, environment
+from .workloads import Workload, generate
+
+PARAMETERS = ("lines", "line_length", "duplicate_ratio", "edit_density", "move_size")
+
+
+def fit_exponent(xs: Iterable[float], ys: Iterable[float]) -> dict | None:
+    """
+    Fit ``y = c * x ** k`` by least squares on logarithms.
+
+    Args:
+        xs: Parameter values
+        ys: Measurements at those values
+
+    Returns:
+        ``{"exponent": k, "r2": ...}``, or None when fewer than two points are positive
+    """
+    points = [(math.log(x), math.log(y)) for x, y in zip(xs, ys, strict=True) if x > 0 and y > 0]
+    if len({x for x, _ in points}) < 2:
+        return None
+    mean_x = statistics.fmean(x for x, _ in points)
+    mean_y = statistics.fmean(y for _, y in points)
+    sxx = sum((x - mean_x) ** 2 for x, _ in points)
+    sxy = sum((x - mean_x) * (y - mean_y) for x, y in points)
+    syy = sum((y - mean_y) ** 2 for _, y in points)
+    exponent = sxy / sxx
+    return {"exponent": exponent, "r2": sxy * sxy / (sxx * syy) if syy else 1.0}
+
+
+def _peak_memory(func: Callable[[], object]) -> int:
+    """Peak of the memory allocated through the Python allocators while ``func`` runs, in bytes."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def sweep(
+    parameter: str,
+    values: Iterable,
+    workload: Workload | None = None,
+    func: Callable[[str, str], object] = diff_hunks,
+    repeat: int = 3,
+    memory: bool = True,
+    progress: Callable[[dict], None] | None = None,
+) -> dict:
+    """
+    Measure ``func`` on workloads that only differ in one parameter.
+
+    Every point is timed ``repeat`` times, and its memory peak is measured in a separate run, since
+    tracing allocations slows the diff down. Exponents are fitted over the points with a positive
+    value, so a time exponent near 1 for ``lines`` means the diff scales linearly with file size.
+
+    Args:
+        parameter: Field of :class:`Workload` to vary, one of ``PARAMETERS``
+        values: Values taken by the parameter
+        workload: Values of every other parameter
+        func: Function called with the original and updated text
+        repeat: Timed runs per point
+        memory: Whether to measure the memory peak of every point
+        progress: Called with every point as soon as it is measured
+
+    Returns:
+        A JSON-serializable report with one entry per point under ``points`` and the fitted ``exponents``
+    """
+    if parameter not in PARAMETERS:
+        raise ValueError(f"Unknown parameter {parameter!r}, expected one of {', '.join(PARAMETERS)}")
+    workload = workload or Workload()
+    points = []
+    for value in values:
+        old, new = generate(dataclasses.replace(workload, **{parameter: value}))
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(old, new)
+            times.append(time.perf_counter() - start)
+        point = {
+            "value": value,
+            "old_lines": old.count("\n"),
+            "new_lines": new.count("\n"),
+            "median": statistics.median(times),
+            "min": min(times),
+            "peak_memory": _peak_memory(lambda: func(old, new)) if memory else None,
+        }
+        points.append(point)
+        if progress is not None:
+            progress(point)
+
+    exponents = {"time": fit_exponent([p["value"] for p in points], [p["median"] for p in points])}
+    if memory:
+        exponents["memory"] = fit_exponent([p["value"] for p in points], [p["peak_memory"] for p in points])
+    return {
+        "version": REPORT_VERSION,
+        "created": datetime.now(UTC).isoformat(timespec="seconds"),
+        "environment": environment(),
+        "parameter": parameter,
+        "workload": {**dataclasses.asdict(workload), parameter: None},
+        "points": points,
+        "exponents": exponents,
+    }
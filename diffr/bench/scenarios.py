@@ -0,0 +1,175 @@
+"""Named benchmark scenarios covering each stage of diffr, from tokenizing to the command line."""
+
+import io
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+from ..core import diff_hunks, diff_line, tokenize
+from ..core.patience import _collect_hunks, _compute_raw_diff
+from ..data_models import Diff
+from ..render import render
+from .harness import Scenario
+
+_NAMES = ("user", "config", "limits", "timeout", "retries", "region", "token", "path", "result", "value")
+_CALLS = ("get", "fetch", "process", "update", "compute", "load", "merge", "apply")
+
+
+def _statement(rng: random.Random) -> str:
+    name, other = rng.choice(_NAMES), rng.choice(_NAMES)
+    return f"{name}_{rng.randrange(100)} = {rng.choice(_CALLS)}({other}, {rng.randrange(1000)}, key={other!r})"
+
+
+def sample_line(seed: int = 0, statements: int = 13) -> str:
+    """Make a long line of code-like text, ``statements`` assignments separated by semicolons."""
+    rng = random.Random(seed)
+    return "; ".join(_statement(rng) for _ in range(statements))
+
+
+def edit_line(line: str, seed: int = 0, edits: int = 6) -> str:
+    """Replace ``edits`` word tokens of ``line`` with other words."""
+    rng = random.Random(seed)
+    tokens = tokenize(line)
+    words = [i for i, token in enumerate(tokens) if token.isidentifier()]
+    for i in rng.sample(words, min(edits, len(words))):
+        tokens[i] = rng.choice(_NAMES)
+    return "".join(tokens)
+
+
+def sample_file(lines: int, seed: int = 0) -> str:
+    """Make a file of ``lines`` indented statements grouped into functions."""
+    rng = random.Random(seed)
+    out = []
+    for i in range(lines):
+        if i % 20 == 0:
+            out.append(f"def {rng.choice(_CALLS)}_{i}({rng.choice(_NAMES)}):")
+        else:
+            out.append(f"    {_statement(rng)}")
+    return "\n".join(out) + "\n"
+
+
+def edit_file(text: str, seed: int = 0, ratio: float = 0.05) -> str:
+    """Modify, delete or insert roughly ``ratio`` of the lines of ``text``."""
+    rng = random.Random(seed)
+    out = []
+    for line in text.splitlines():
+        roll = rng.random()
+        if roll >= ratio:
+            out.append(line)
+        elif roll < ratio / 2:
+            out.append(edit_line(line, rng.randrange(1 << 30), 2))
+        elif roll < ratio * 3 / 4:
+            continue
+        else:
+            out.extend((line, f"    {_statement(rng)}"))
+    return "\n".join(out) + "\n"
+
+
+def _tokenize(tokenizer: str):
+    def setup():
+        line = sample_line()
+        return lambda: tokenize(line, tokenizer)
+
+    return setup
+
+
+def _diff_line(**options):
+    def setup():
+        old = sample_line()
+        new = edit_line(old)
+        return lambda: diff_line(old, new, **options)
+
+    return setup
+
+
+def _diff_hunks(lines: int, **options):
+    def setup():
+        old = sample_file(lines)
+        new = edit_file(old)
+        return lambda: diff_hunks(old, new, **options)
+
+    return setup
+
+
+def _raw_diff():
+    old = sample_file(2_000)
+    new = edit_file(old)
+    return lambda: _compute_raw_diff(old, new)
+
+
+def _hunks():
+    old = sample_file(2_000)
+    raw_diff = _compute_raw_diff(old, edit_file(old))
+    return lambda: _collect_hunks(raw_diff)
+
+
+def _from_hunks():
+    old = sample_file(2_000)
+    hunks = diff_hunks(old, edit_file(old))
+    return lambda: Diff.from_hunks(hunks)
+
+
+def _render(format: str):
+    def setup():
+        old = sample_file(2_000)
+        hunks = diff_hunks(old, edit_file(old))
+        return lambda: render(hunks, io.StringIO(), format=format)
+
+    return setup
+
+
+def _cli():
+    directory = tempfile.TemporaryDirectory()
+    old_path = os.path.join(directory.name, "old.py")
+    new_path = os.path.join(directory.name, "new.py")
+    old = sample_file(2_000)
+    with open(old_path, "w", encoding="utf-8") as f:
+        f.write(old)
+    with open(new_path, "w", encoding="utf-8") as f:
+        f.write(edit_file(old))
+    command = [sys.executable, "-m", "diffr.cli", old_path, new_path, "--format", "unified", "--no-color"]
+
+    # The temporary directory lives as long as the timed callable does
+    def run(directory=directory):
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    return run
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in (
+        Scenario("tokenize", "Word tokenizer on a 600-character line of code", _tokenize("word")),
+        Scenario("tokenize_code", "Code tokenizer on a 600-character line of code", _tokenize("code")),
+        Scenario("diff_line", "Token diff of a 600-character line with 6 edited words", _diff_line()),
+        Scenario(
+            "diff_line_char",
+            "Character diff of a 600-character line with 6 edited words",
+            _diff_line(granularity="char"),
+        ),
+        Scenario("diff_hunks", "Line diff of a 2,000-line file with 5% of its lines edited", _diff_hunks(2_000)),
+        Scenario(
+            "diff_hunks_moves",
+            "Line diff of a 2,000-line file with 5% of its lines edited, detecting moves",
+            _diff_hunks(2_000, detect_moves=True),
+        ),
+        Scenario(
+            "diff_hunks_large", "Line diff of a 50,000-line file with 5% of its lines edited", _diff_hunks(50_000)
+        ),
+        Scenario("compute_raw_diff", "Line matching alone on the 2,000-line diff, without hunks", _raw_diff),
+        Scenario("collect_hunks", "Hunk building and inline diffs of the 2,000-line diff", _hunks),
+        Scenario("from_hunks", "Diff.from_hunks on the hunks of the 2,000-line diff", _from_hunks),
+        Scenario("render_unified", "Unified rendering of the hunks of the 2,000-line diff", _render("unified")),
+        Scenario("render_color", "Colored rendering of the hunks of the 2,000-line diff", _render("color")),
+        Scenario(
+            "cli",
+            "diffr command on two 2,000-line files, including interpreter startup",
+            _cli,
+            repeat=10,
+            warmup=1,
+            memory=False,
+        ),
+    )
+}
@@ -0,0 +1,153 @@
+"""Seeded generator of synthetic file pairs with controlled size, shape and edits."""
+
+import math
+import random
+import string
+from dataclasses import dataclass
+
+LENGTH_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+EDIT_TYPES = ("insert", "delete", "modify", "move")
+
+# Lines are cut out of one shared text of random words, which is far cheaper than building every line word by word
+_SOURCE_LENGTH = 1 << 20
+
+# Number of distinct lines that duplicated lines are drawn from, like blank lines, braces or ``return``
+_DUPLICATE_POOL = 32
+
+
+@dataclass
+class Workload:
+    """
+    Parameters of a synthetic file pair.
+
+    ``lines`` lines are generated for the original file, with lengths drawn around ``line_length``
+    characters from ``length_distribution``. A share ``duplicate_ratio`` of them repeat lines of a
+    small pool, as blank lines and braces do in real code; every other line is unique. Then
+    ``edit_density`` of the lines are edited into the updated file, each with an edit type drawn
+    from ``edit_types``: a line is inserted after it, it is deleted, a few of its characters are
+    changed, or the block of ``move_size`` lines it starts is moved elsewhere.
+    """
+
+    lines: int = 1_000
+    line_length: int = 40
+    length_distribution: str = "lognormal"
+    duplicate_ratio: float = 0.0
+    edit_density: float = 0.05
+    edit_types: tuple[str, ...] = EDIT_TYPES
+    move_size: int = 8
+    seed: int = 0
+
+    def __post_init__(self):
+        """Reject settings no workload can be generated from."""
+        if self.length_distribution not in LENGTH_DISTRIBUTIONS:
+            raise ValueError(
+                f"Unknown length distribution {self.length_distribution!r}, "
+                f"expected one of {', '.join(LENGTH_DISTRIBUTIONS)}"
+            )
+        unknown = [kind for kind in self.edit_types if kind not in EDIT_TYPES]
+        if unknown or not self.edit_types:
+            raise ValueError(
+                f"Unknown edit types {unknown or self.edit_types}, expected some of {', '.join(EDIT_TYPES)}"
+            )
+        if not 0.0 <= self.duplicate_ratio <= 1.0 or not 0.0 <= self.edit_density <= 1.0:
+            raise ValueError("duplicate_ratio and edit_density must be between 0 and 1")
+
+
+class _LineFactory:
+    def __init__(self, workload: Workload, rng: random.Random):
+        self.rng = rng
+        self.mean = max(1, workload.line_length)
+        self.distribution = workload.length_distribution
+        words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 8))) for _ in range(1024)]
+        text = []
+        size = 0
+        while size < _SOURCE_LENGTH:
+            word = rng.choice(words)
+            text.append(word)
+            size += len(word) + 1
+        self.source = " ".join(text)
+        self.serial = 0
+
+    def length(self) -> int:
+        if self.distribution == "fixed":
+            return self.mean
+        if self.distribution == "uniform":
+            return self.rng.randint(1, 2 * self.mean - 1) if self.mean > 1 else 1
+        # Log-normal with the requested mean, clipped so a few huge lines cannot dominate a run
+        sigma = 0.6
+        value = self.rng.lognormvariate(math.log(self.mean) - sigma * sigma / 2, sigma)
+        return max(1, min(int(value), 8 * self.mean))
+
+    def unique(self) -> str:
+        """Make a line that differs from every other line of the factory, thanks to its serial number."""
+        self.serial += 1
+        tag = format(self.serial, "x")
+        size = max(0, self.length() - len(tag) - 1)
+        start = self.rng.randrange(len(self.source) - size)
+        return f"{tag} {self.source[start : start + size]}"
+
+    def modified(self, line: str) -> str:
+        """Replace a short stretch of characters of the line, so it stays similar to the original."""
+        width = max(1, min(5, len(line) // 4))
+        position = self.rng.randrange(max(1, len(line) - width + 1))
+        replacement = "".join(self.rng.choices(string.ascii_uppercase, k=width))
+        return line[:position] + replacement + line[position + width :]
+
+
+def generate(workload: Workload) -> tuple[str, str]:
+    """
+    Generate the original and updated text of a workload.
+
+    The same workload always produces the same texts, whatever ran before in the process.
+
+    Args:
+        workload: Parameters of the file pair
+
+    Returns:
+        ``(original, updated)``, both newline-terminated
+    """
+    rng = random.Random(workload.seed)
+    factory = _LineFactory(workload, rng)
+    pool = [factory.unique() for _ in range(_DUPLICATE_POOL)]
+    old = [
+        rng.choice(pool) if workload.duplicate_ratio and rng.random() < workload.duplicate_ratio else factory.unique()
+        for _ in range(workload.lines)
+    ]
+
+    edits = min(workload.lines, round(workload.lines * workload.edit_density))
+    kinds = {position: rng.choice(workload.edit_types) for position in rng.sample(range(workload.lines), edits)}
+    new = []
+    moved = []
+    i = 0
+    while i < len(old):
+        kind = kinds.get(i)
+        if kind == "move":
+            # Blocks are cut out here and put back at random positions below
+            moved.append(old[i : i + workload.move_size])
+            i += workload.move_size
+            continue
+        if kind is None:
+            new.append(old[i])
+        elif kind == "modify":
+            new.append(factory.modified(old[i]))
+        elif kind == "insert":
+            new.extend((old[i], factory.unique()))
+        i += 1
+
+    if moved:
+        targets = sorted(rng.randrange(len(new) + 1) for _ in moved)
+        rebuilt = []
+        start = 0
+        for target, block in zip(targets, moved, strict=True):
+            rebuilt.extend(new[start:target])
+            rebuilt.extend(block)
+            start = target
+        rebuilt.extend(new[start:])
+        new = rebuilt
+
+    return _join(old), _join(new)
+
+
+def _join(lines: list[str]) -> str:
+    return "\n".join(lines) + "\n" if lines else ""
@@ -1,37 +1,509 @@
 """Command-line interface for diffr."""
 
 import argparse
+import cProfile
+import json
+import os
 import sys
 import time
+from contextlib import contextmanager
 
-from .core import diff_hunks
-from .data_models.diff_model import Diff
+from .client import DEFAULT_ADDRESS, DiffClient, parse_address
+from .core import DiffStats, diff_hunks, dump_json, merge3
+from .core.merge import STRATEGIES
+from .core.myers import GRANULARITIES, TOKENIZERS
+from .core.renames import detect_renames
+from .render import FORMATS, render
 
+# Formats written as the JSON of ``diff_hunks``: one document, or one line per file with its paths
+JSON_FORMATS = ("json", "jsonl")
+
+
+def _read(path: str) -> str:
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+class _Phases:
+    """Wall-clock and CPU time of the phases of one command, added up when a phase runs several times."""
+
+    def __init__(self):
+        self.timings = {}
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+
+    @contextmanager
+    def phase(self, name: str):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            timing = self.timings.setdefault(name, {"wall": 0.0, "cpu": 0.0})
+            timing["wall"] += time.perf_counter() - wall
+            timing["cpu"] += time.process_time() - cpu
+
+    def total(self) -> dict:
+        return {"wall": time.perf_counter() - self.wall, "cpu": time.process_time() - self.cpu}
+
+
+def _print_profile(phases: _Phases, engine: DiffStats | None) -> None:
+    """Print the time of every phase of the command to stderr, with the phases of the diff engine under "diff"."""
+    print(f"{'Phase':<16} {'wall':>12} {'cpu':>12}", file=sys.stderr)
+    for name, timing in phases.timings.items():
+        print(f"{name:<16} {timing['wall']:>11.6f}s {timing['cpu']:>11.6f}s", file=sys.stderr)
+        if name == "diff" and engine is not None:
+            for phase, seconds in engine.timings.items():
+                print(f"  {phase:<14} {seconds:>11.6f}s", file=sys.stderr)
+    total = phases.total()
+    print(f"{'total':<16} {total['wall']:>11.6f}s {total['cpu']:>11.6f}s", file=sys.stderr)
+
+
+def _write_stats_json(path: str, stats: dict) -> None:
+    """Write the statistics of the command as one JSON object, to stderr for ``-``."""
+    if path == "-":
+        sys.stderr.write(json.dumps(stats) + "\n")
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2)
+        f.write("\n")
+
+
+def _write_json(data: dict, prefix: bytes = b"", suffix: bytes = b"\n") -> None:
+    """Stream JSON to stdout as bytes, after the text already written to it; engine statistics are left out."""
+    if "stats" in data:
+        data = {key: value for key, value in data.items() if key != "stats"}
+    sys.stdout.flush()
+    sys.stdout.buffer.write(prefix)
+    dump_json(data, sys.stdout.buffer)
+    sys.stdout.buffer.write(suffix)
 
-def main():
-    """Run entry point for the CLI."""
-    parser = argparse.ArgumentParser(description="Compare files and display differences")
-    parser.add_argument("file1", help="Path to first file to compare (original)")
-    parser.add_argument("file2", help="Path to second file to compare (modified)")
 
-    args = parser.parse_args()
+def _read_tree(root: str) -> dict[str, str]:
+    """Read every text file under ``root``, keyed by its ``/``-separated path relative to it."""
+    files = {}
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                files[os.path.relpath(path, root).replace(os.sep, "/")] = _read(path)
+            except UnicodeDecodeError:
+                continue  # Binary files have no line diff
+    return files
 
-    file1 = args.file1
-    file2 = args.file2
 
-    with open(file1, encoding="utf-8") as f1, open(file2, encoding="utf-8") as f2:
-        content1, content2 = f1.read(), f2.read()
+def _diff_directories(args: argparse.Namespace, options: dict, phases: _Phases) -> dict:
+    """
+    Diff two directory trees file by file, pairing renamed and copied files like ``git diff -M``.
+
+    The JSON formats write a record per changed file with its ``status``, ``old_path``,
+    ``new_path``, the ``similarity`` of renames and copies, and the ``diff_hunks`` output as
+    ``result``: all in one array for "json", one per line for "jsonl".
+
+    Returns:
+        Counts of the files, renames and copies, for ``--stats-json``
+    """
+    start_time = time.perf_counter()
+    with phases.phase("read"):
+        old_files = _read_tree(args.file1)
+        new_files = _read_tree(args.file2)
+    renames = []
+    if not args.no_renames:
+        with phases.phase("renames"):
+            renames = detect_renames(old_files, new_files, args.find_renames / 100, copies=args.find_copies)
+    source_of = {rename["new_path"]: rename for rename in renames}
+    renamed = {rename["old_path"] for rename in renames if rename["type"] == "rename"}
+    diffed = 0
+    records = 0
+
+    for path in sorted(old_files.keys() | new_files.keys()):
+        header = []
+        rename = None
+        if path in old_files and path in new_files:
+            old_path, old_text, status = path, old_files[path], "modified"
+            if old_text == new_files[path]:
+                continue
+        elif path in source_of:
+            rename = source_of[path]
+            old_path, old_text, status = rename["old_path"], old_files[rename["old_path"]], rename["type"]
+            header = [
+                f"similarity index {rename['similarity']}%",
+                f"{rename['type']} from {old_path}",
+                f"{rename['type']} to {path}",
+            ]
+        elif path in new_files:
+            old_path, old_text, status = path, "", "added"
+            header = [f"new file {path}"]
+        elif path in renamed:
+            continue
+        else:
+            old_path, old_text, status = path, old_files[path], "deleted"
+            header = [f"deleted file {path}"]
+
+        new_text = new_files.get(path, "")
+        if args.format in JSON_FORMATS:
+            hunks = {"hunks": []}
+            if old_text != new_text:
+                with phases.phase("diff"):
+                    hunks = diff_hunks(old_text, new_text, **options)
+                diffed += 1
+            record = {"status": status, "old_path": old_path, "new_path": path}
+            if rename is not None:
+                record["similarity"] = rename["similarity"]
+            record["result"] = hunks
+            with phases.phase("render"):
+                if args.format == "jsonl":
+                    _write_json(record)
+                else:
+                    _write_json(record, prefix=b", " if records else b"[", suffix=b"")
+            records += 1
+            continue
+        sys.stdout.write(f"diff a/{old_path} b/{path}\n")
+        for line in header:
+            sys.stdout.write(f"{line}\n")
+        if old_text != new_text:
+            with phases.phase("diff"):
+                hunks = diff_hunks(old_text, new_text, **options)
+            diffed += 1
+            with phases.phase("render"):
+                render(
+                    hunks,
+                    sys.stdout,
+                    format=args.format,
+                    color=not args.no_color,
+                    old_label=f"a/{old_path}",
+                    new_label=f"b/{path}",
+                )
+
+    if args.format == "json":
+        sys.stdout.buffer.write(b"]\n" if records else b"[]\n")
+    end_time = time.perf_counter()
+    copies = sum(1 for rename in renames if rename["type"] == "copy")
+    print(f"Elapsed time: {end_time - start_time:.8f}s", file=sys.stderr)
+    print(f"Files in tree 1: {len(old_files)}", file=sys.stderr)
+    print(f"Files in tree 2: {len(new_files)}", file=sys.stderr)
+    print(f"Renames: {len(renames) - copies}, copies: {copies}", file=sys.stderr)
+    return {
+        "files": {"old": len(old_files), "new": len(new_files), "diffed": diffed},
+        "renames": len(renames) - copies,
+        "copies": copies,
+    }
+
+
+def _diff_files(args: argparse.Namespace, options: dict, phases: _Phases) -> dict:
+    """
+    Diff two files and print the statistics of the diff to stderr.
+
+    Returns:
+        Line counts, hunk count and degradations of the diff, for ``--stats-json``
+    """
+    with phases.phase("read"):
+        content1, content2 = _read(args.file1), _read(args.file2)
         lines1, lines2 = content1.splitlines(), content2.splitlines()
+    with phases.phase("diff"):
         start_time = time.perf_counter()
-        hunks = diff_hunks(content1, content2)
+        hunks = diff_hunks(content1, content2, **options)
         end_time = time.perf_counter()
-        diff = Diff.from_hunks(hunks)
-        print(diff)
-        print(f"Elapsed time: {end_time - start_time:.8f}s")
-        print(f"Lines in file 1: {len(lines1)}")
-        print(f"Lines in file 2: {len(lines2)}")
-        print(f"Speed: {((len(lines1) + len(lines2)) / 1_000_000) / (end_time - start_time):.2f} M/s")
+    with phases.phase("render"):
+        if args.format == "json":
+            _write_json(hunks)
+        elif args.format == "jsonl":
+            _write_json({"old_path": args.file1, "new_path": args.file2, "result": hunks})
+        else:
+            render(
+                hunks,
+                sys.stdout,
+                format=args.format,
+                color=not args.no_color,
+                old_label=args.file1,
+                new_label=args.file2,
+            )
+    # Statistics go to stderr so the diff itself can be piped, e.g. into ``patch``
+    print(f"Elapsed time: {end_time - start_time:.8f}s", file=sys.stderr)
+    print(f"Lines in file 1: {len(lines1)}", file=sys.stderr)
+    print(f"Lines in file 2: {len(lines2)}", file=sys.stderr)
+    print(f"Speed: {((len(lines1) + len(lines2)) / 1_000_000) / (end_time - start_time):.2f} M/s", file=sys.stderr)
+    if hunks.get("degraded"):
+        print(f"Degraded: {', '.join(hunks['degraded'])}", file=sys.stderr)
+    return {
+        "lines": {"old": len(lines1), "new": len(lines2)},
+        "hunks": len(hunks["hunks"]),
+        "degraded": hunks.get("degraded"),
+    }
+
+
+def _add_diff_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options of the line diff itself, shared by the plain command and ``diffr batch``."""
+    parser.add_argument("--detect-moves", action="store_true", help="Report moved blocks of lines as moves")
+    parser.add_argument("-i", "--ignore-case", action="store_true", help="Ignore case differences")
+    parser.add_argument("-w", "--ignore-all-space", action="store_true", help="Ignore all white space")
+    parser.add_argument(
+        "-b", "--ignore-space-change", action="store_true", help="Ignore changes in the amount of white space"
+    )
+    parser.add_argument(
+        "-B", "--ignore-blank-lines", action="store_true", help="Ignore inserted or deleted blank lines"
+    )
+    parser.add_argument("--tokenizer", choices=TOKENIZERS, default="word", help="Tokenizer for inline diffs")
+    parser.add_argument(
+        "--granularity", choices=GRANULARITIES, default="token", help="Diff changed lines by token or by character"
+    )
+    parser.add_argument(
+        "--timeout-ms",
+        type=float,
+        metavar="MS",
+        help="Time budget per file; past it the diff gets coarser instead of taking longer",
+    )
+
+
+def _diff_options(args: argparse.Namespace) -> dict:
+    """Keyword arguments of ``diff_hunks`` from the options of ``_add_diff_arguments``."""
+    return {
+        "detect_moves": args.detect_moves,
+        "ignore_case": args.ignore_case,
+        "ignore_all_space": args.ignore_all_space,
+        "ignore_space_change": args.ignore_space_change,
+        "ignore_blank_lines": args.ignore_blank_lines,
+        "tokenizer": args.tokenizer,
+        "granularity": args.granularity,
+        "timeout_ms": args.timeout_ms,
+    }
+
+
+def merge_main(argv: list[str]) -> int:
+    """Run the ``diffr merge`` subcommand, returning 1 when unresolved conflicts remain."""
+    parser = argparse.ArgumentParser(prog="diffr merge", description="Three-way merge of two versions of a file")
+    parser.add_argument("base", help="Path to the common ancestor")
+    parser.add_argument("ours", help="Path to our version")
+    parser.add_argument("theirs", help="Path to their version")
+    parser.add_argument("--strategy", choices=STRATEGIES, help="Resolve conflicts instead of writing markers")
+    parser.add_argument("--diff3", action="store_true", help="Show the base lines inside conflict markers")
+    parser.add_argument("-o", "--output", help="Write the merged text to this file instead of stdout")
+
+    args = parser.parse_args(argv)
+
+    result = merge3(
+        _read(args.base), _read(args.ours), _read(args.theirs), strategy=args.strategy, show_base=args.diff3
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(result["merged"])
+    else:
+        sys.stdout.write(result["merged"])
+
+    unresolved = sum(1 for conflict in result["conflicts"] if not conflict["resolved"])
+    print(f"Conflicts: {len(result['conflicts'])} ({unresolved} unresolved)", file=sys.stderr)
+    return 1 if unresolved else 0
+
+
+def bench_main(argv: list[str]) -> int:
+    """Run the ``diffr bench`` subcommand, see :mod:`diffr.bench`."""
+    # Imported on demand so plain diffs do not pay for loading the benchmark scenarios
+    from .bench.__main__ import main as bench
+
+    return bench(argv)
+
+
+def serve_main(argv: list[str]) -> int:
+    """Run the ``diffr serve`` subcommand until interrupted, see :mod:`diffr.server`."""
+    import asyncio
+
+    from .aio import DiffExecutor
+    from .server import DiffServer, ResultCache
+
+    parser = argparse.ArgumentParser(prog="diffr serve", description="Serve diffs over HTTP from a warm worker pool")
+    parser.add_argument(
+        "address",
+        nargs="?",
+        default=DEFAULT_ADDRESS,
+        help=f"HOST:PORT, or the path of a Unix socket (default: {DEFAULT_ADDRESS})",
+    )
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--concurrency", type=int, help="Diffs handed to the workers at once (default: --workers)")
+    parser.add_argument("--max-waiting", type=int, help="Answer 503 once this many diffs wait for a worker")
+    parser.add_argument("--cache-mb", type=float, default=64, help="Size of the result cache in MB (default: 64)")
+    parser.add_argument(
+        "--root",
+        metavar="DIR",
+        help="Only read files under DIR for old_path and new_path (default: any file on a Unix socket, none over TCP)",
+    )
+    args = parser.parse_args(argv)
+
+    # A Unix socket only lets its owner in, who can read the files anyway; a port is open to every local user
+    root = args.root if args.root is not None else "/" if isinstance(parse_address(args.address), str) else None
+    server = DiffServer(
+        DiffExecutor(args.workers, args.concurrency, max_waiting=args.max_waiting),
+        ResultCache(int(args.cache_mb * 1_000_000)),
+        root,
+    )
+    try:
+        asyncio.run(server.serve(args.address, ready=lambda: print(f"Listening on {args.address}", file=sys.stderr)))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    except OSError as error:
+        print(f"Cannot listen on {args.address}: {error}", file=sys.stderr)
+        return 2
+    return 0
+
+
+def _diff_remote(args: argparse.Namespace, options: dict) -> int:
+    """Have a ``diffr serve`` process diff two files and print its response."""
+    address = args.remote_address or DEFAULT_ADDRESS
+    try:
+        with DiffClient(address) as client:
+            status, _, body = client.diff(
+                {
+                    "old_path": os.path.abspath(args.file1),
+                    "new_path": os.path.abspath(args.file2),
+                    "old_label": args.file1,
+                    "new_label": args.file2,
+                    "format": "json" if args.format in JSON_FORMATS else args.format,
+                    "color": not args.no_color,
+                    "options": {name: value for name, value in options.items() if value is not None},
+                }
+            )
+    except OSError as error:
+        print(f"Cannot reach the diffr server at {address}: {error}", file=sys.stderr)
+        return 2
+    if status != 200:
+        print(f"diffr server: {json.loads(body)['error']}", file=sys.stderr)
+        return 2
+    if args.format == "jsonl":
+        # The record of a local run, around the result as the server encoded it
+        paths = json.dumps({"old_path": args.file1, "new_path": args.file2})
+        body = paths[:-1].encode() + b', "result": ' + body + b"}"
+    sys.stdout.buffer.write(body + b"\n" if args.format in JSON_FORMATS else body)
+    sys.stdout.flush()
+    return 0
+
+
+def batch_main(argv: list[str]) -> int:
+    """Run the ``diffr batch`` subcommand, returning 1 when some pairs failed; see :mod:`diffr.batch`."""
+    from .batch import run_batch
+    from .server import RESPONSE_FORMATS
+
+    parser = argparse.ArgumentParser(
+        prog="diffr batch",
+        description="Diff the pairs of a JSONL manifest, writing one JSON result per line",
+    )
+    parser.add_argument("manifest", help="JSONL file of pairs, or - for stdin")
+    parser.add_argument("-j", "--jobs", type=int, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--ordered", action="store_true", help="Write results in manifest order")
+    parser.add_argument(
+        "--format",
+        choices=RESPONSE_FORMATS,
+        default="json",
+        help="Format of pairs that do not set one (default: json)",
+    )
+    parser.add_argument("-o", "--output", help="Write the results to this file instead of stdout")
+    _add_diff_arguments(parser)
+    args = parser.parse_args(argv)
+
+    options = {name: value for name, value in _diff_options(args).items() if value is not None}
+    start_time = time.perf_counter()
+    manifest = sys.stdin if args.manifest == "-" else open(args.manifest, encoding="utf-8")
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        counts = run_batch(manifest, output.write, args.jobs, args.ordered, {"format": args.format, "options": options})
+    finally:
+        if manifest is not sys.stdin:
+            manifest.close()
+        if output is not sys.stdout:
+            output.close()
+    print(f"Elapsed time: {time.perf_counter() - start_time:.8f}s", file=sys.stderr)
+    print(f"Pairs: {counts['pairs']} ({counts['failed']} failed)", file=sys.stderr)
+    return 1 if counts["failed"] else 0
+
+
+SUBCOMMANDS = {"merge": merge_main, "bench": bench_main, "serve": serve_main, "batch": batch_main}
+
+
+def main(argv: list[str] | None = None):
+    """Run entry point for the CLI."""
+    argv = sys.argv[1:] if argv is None else argv
+    # Only a first argument names a subcommand, so "diffr -- merge other.txt" diffs a file named merge
+    if argv and argv[0] in SUBCOMMANDS:
+        return SUBCOMMANDS[argv[0]](argv[1:])
+
+    parser = argparse.ArgumentParser(
+        description="Compare files and display differences",
+        epilog=(
+            "Subcommands: diffr merge BASE OURS THEIRS, diffr bench run|list|compare, diffr serve [ADDRESS], "
+            "diffr batch MANIFEST. To diff a file named like a subcommand, put -- or an option before it: "
+            "diffr -- merge other.txt"
+        ),
+    )
+    parser.add_argument("file1", help="Path to first file or directory to compare (original)")
+    parser.add_argument("file2", help="Path to second file or directory to compare (modified)")
+    parser.add_argument(
+        "--format", choices=(*FORMATS, *JSON_FORMATS), default="color", help="Output format (default: color)"
+    )
+    parser.add_argument("--no-color", action="store_true", help="Never use ANSI colors in the output")
+    _add_diff_arguments(parser)
+    parser.add_argument(
+        "-M",
+        "--find-renames",
+        type=int,
+        default=50,
+        metavar="PERCENT",
+        help="Minimum similarity of renamed files when diffing directories (default: 50)",
+    )
+    parser.add_argument("-C", "--find-copies", action="store_true", help="Also detect copied files in directories")
+    parser.add_argument("--no-renames", action="store_true", help="Do not detect renamed files in directories")
+    parser.add_argument(
+        "--profile", action="store_true", help="Print the wall-clock and CPU time of every phase to stderr"
+    )
+    parser.add_argument("--pstats", metavar="FILE", help="Run under cProfile and dump the pstats data to FILE")
+    parser.add_argument(
+        "--stats-json",
+        metavar="FILE",
+        help="Write timings and counters as JSON to FILE, or to stderr with -",
+    )
+    parser.add_argument("--remote", action="store_true", help="Have a running diffr serve diff two files")
+    parser.add_argument(
+        "--remote-address",
+        metavar="ADDRESS",
+        help=f"Where diffr serve listens, implies --remote (default: {DEFAULT_ADDRESS})",
+    )
+
+    args = parser.parse_args(argv)
+    options = _diff_options(args)
+    if args.remote or args.remote_address:
+        if os.path.isdir(args.file1) or os.path.isdir(args.file2):
+            parser.error("--remote diffs files, not directories")
+        if args.profile or args.pstats or args.stats_json:
+            parser.error("--remote cannot be combined with --profile, --pstats or --stats-json")
+        return _diff_remote(args, options)
+    # One DiffStats adds up the engine phases of every file diffed
+    engine = DiffStats() if args.profile or args.stats_json else None
+    if engine is not None:
+        options["stats"] = engine
+    directories = os.path.isdir(args.file1) and os.path.isdir(args.file2)
+
+    phases = _Phases()
+    profiler = cProfile.Profile() if args.pstats else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        summary = (_diff_directories if directories else _diff_files)(args, options, phases)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.pstats)
 
+    if args.profile:
+        _print_profile(phases, engine)
+    if args.stats_json:
+        _write_stats_json(
+            args.stats_json,
+            {
+                "old": args.file1,
+                "new": args.file2,
+                "directories": directories,
+                **summary,
+                "phases": phases.timings,
+                "total": phases.total(),
+                "engine": engine.as_dict(),
+            },
+        )
     return 0
 
 
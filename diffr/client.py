@@ -0,0 +1,133 @@
+"""Client of ``diffr serve``, kept to the socket module so it starts fast; see :mod:`diffr.server`."""
+
+import json
+import os
+import socket
+
+
+def _default_address() -> str:
+    """Pick a Unix socket of the current user where there are Unix sockets, else a localhost port."""
+    if not hasattr(socket, "AF_UNIX") or not hasattr(os, "getuid"):
+        return "127.0.0.1:8765"
+    directory = os.environ.get("XDG_RUNTIME_DIR") or os.environ.get("TMPDIR") or "/tmp"
+    return os.path.join(directory, f"diffr-{os.getuid()}.sock")
+
+
+# Only the user who started the server can connect to its socket, see ``DiffServer.serve``
+DEFAULT_ADDRESS = _default_address()
+
+
+def parse_address(address: str) -> tuple[str, int] | str:
+    """
+    Parse the address of a server into a TCP host and port, or a Unix socket path.
+
+    Args:
+        address: ``HOST:PORT``, ``:PORT`` for localhost, or the path of a Unix socket
+
+    Returns:
+        ``(host, port)`` for TCP, or the socket path
+    """
+    host, colon, port = address.rpartition(":")
+    if colon and port.isdigit() and "/" not in host:
+        return host or "127.0.0.1", int(port)
+    return address
+
+
+class DiffClient:
+    """
+    A connection to a diff server, kept open between requests so each one only costs a round trip.
+
+    Requests are the JSON objects described in ``diffr.server.DiffServer``. The client is not
+    thread-safe; open one per thread.
+    """
+
+    def __init__(self, address: str = DEFAULT_ADDRESS, timeout: float | None = None):
+        self.address = address
+        self.timeout = timeout
+        self._socket = None
+        self._file = None
+        where = parse_address(address)
+        if isinstance(where, str):
+            self._host = "localhost"
+        else:
+            self._host = f"[{where[0]}]:{where[1]}" if ":" in where[0] else f"{where[0]}:{where[1]}"
+
+    def _connect(self) -> None:
+        where = parse_address(self.address)
+        if isinstance(where, str):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            sock = socket.socket(socket.AF_INET6 if ":" in where[0] else socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(where)
+        except OSError:
+            sock.close()
+            raise
+        self._socket = sock
+        self._file = sock.makefile("rb")
+
+    def close(self) -> None:
+        if self._socket is not None:
+            self._file.close()
+            self._socket.close()
+            self._socket = self._file = None
+
+    def __enter__(self) -> "DiffClient":
+        """Return the client itself; it connects on the first request."""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Close the connection."""
+        self.close()
+
+    def _exchange(self, method: str, target: str, body: bytes) -> tuple[int, str, bytes]:
+        if self._socket is None:
+            self._connect()
+        head = f"{method} {target} HTTP/1.1\r\nHost: {self._host}\r\nContent-Type: application/json\r\n"
+        self._socket.sendall(f"{head}Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+        status_line = self._file.readline()
+        if not status_line:
+            raise ConnectionError("The server closed the connection")
+        status = int(status_line.split()[1])
+        headers = {}
+        while (line := self._file.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        payload = self._file.read(int(headers.get("content-length") or 0))
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, headers.get("content-type", ""), payload
+
+    def request(self, method: str, target: str, body: bytes = b"") -> tuple[int, str, bytes]:
+        """
+        Send one HTTP request, reconnecting once when a kept connection was closed by the server.
+
+        Returns:
+            The HTTP status, content type and body of the response
+        """
+        reused = self._socket is not None
+        try:
+            return self._exchange(method, target, body)
+        except ConnectionError:
+            self.close()
+            if not reused:
+                raise
+        return self._exchange(method, target, body)
+
+    def diff(self, request: dict) -> tuple[int, str, bytes]:
+        """
+        Send a diff request.
+
+        Args:
+            request: The request object, see ``diffr.server.DiffServer``
+
+        Returns:
+            The HTTP status, content type and body of the response
+        """
+        return self.request("POST", "/diff", json.dumps(request).encode())
+
+    def health(self) -> dict:
+        """Fetch the counters of the server."""
+        return json.loads(self.request("GET", "/health")[2])
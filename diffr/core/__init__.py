@@ -1,4 +1,45 @@
-from .myers import diff_line, tokenize
-from .patience import diff_hunks
+from .merge import merge3
+from .myers import (
+    DiffStats,
+    MemoryBudgetError,
+    diff_line,
+    diff_line_spans,
+    get_max_memory,
+    reset_trace_memory,
+    set_max_memory,
+    tokenize,
+    tokenize_spans,
+    trace_memory,
+)
+from .patch import PatchError, apply, apply_unified
+from .patience import DiffCancelledError, diff_hunks, get_numpy_threshold, set_numpy_threshold
+from .renames import detect_renames
+from .serialize import dump_json
+from .session import DiffSession
+from .similarity import SimilarityIndex, similarity
 
-__all__ = ["diff_line", "diff_hunks", "tokenize"]
+__all__ = [
+    "diff_line",
+    "diff_line_spans",
+    "diff_hunks",
+    "dump_json",
+    "tokenize",
+    "tokenize_spans",
+    "DiffSession",
+    "apply",
+    "apply_unified",
+    "PatchError",
+    "merge3",
+    "SimilarityIndex",
+    "similarity",
+    "detect_renames",
+    "MemoryBudgetError",
+    "set_max_memory",
+    "get_max_memory",
+    "set_numpy_threshold",
+    "get_numpy_threshold",
+    "trace_memory",
+    "reset_trace_memory",
+    "DiffStats",
+    "DiffCancelledError",
+]
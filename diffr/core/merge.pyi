@@ -0,0 +1,3 @@
+STRATEGIES: tuple[str, ...]
+
+def merge3(base: str, ours: str, theirs: str, strategy: str | None = None, show_base: bool = False) -> dict: ...
@@ -0,0 +1,171 @@
+from .patience import _diff_region
+
+# ---------------------------------------------------------------------
+# Three-way merge
+# ---------------------------------------------------------------------
+
+STRATEGIES = ("ours", "theirs", "union")
+
+
+cdef list _split(str text):
+    return text.splitlines(True)
+
+
+cdef list _match_base(list base, list other):
+    """Map every base line to its equal line in ``other``, or -1, from a single patience pass."""
+    cdef list matches = [-1] * len(base)
+    cdef Py_ssize_t i = 0, j = 0
+    for orig_line, upd_line in _diff_region(base, other, 0, len(base), 0, len(other)):
+        if orig_line is not None and upd_line is not None and orig_line == upd_line:
+            matches[i] = j
+        if orig_line is not None:
+            i += 1
+        if upd_line is not None:
+            j += 1
+    return matches
+
+
+cdef class _Writer:
+    """Collect merged lines, making sure a line without newline is never glued to the next one."""
+
+    cdef list pieces
+    cdef Py_ssize_t n_lines
+    cdef bint open_line
+    cdef str eol
+
+    def __cinit__(self, str eol):
+        self.pieces = []
+        self.n_lines = 0
+        self.open_line = False
+        self.eol = eol
+
+    cdef void write(self, list raw_lines, Py_ssize_t start, Py_ssize_t end):
+        cdef Py_ssize_t k
+        if start >= end:
+            return
+        if self.open_line:
+            self.pieces.append(self.eol)
+        for k in range(start, end):
+            self.pieces.append(raw_lines[k])
+        self.n_lines += end - start
+        last = raw_lines[end - 1]
+        self.open_line = not (last.endswith("\n") or last.endswith("\r"))
+
+    cdef void marker(self, str text):
+        if self.open_line:
+            self.pieces.append(self.eol)
+        self.pieces.append(text)
+        self.pieces.append(self.eol)
+        self.n_lines += 1
+        self.open_line = False
+
+
+cdef dict _range(Py_ssize_t start, Py_ssize_t end):
+    # Same 1-based, inclusive convention as hunk ranges; an empty side has ``end == start - 1``
+    return {"start": start + 1, "end": end}
+
+
+cpdef dict merge3(str base, str ours, str theirs, str strategy=None, bint show_base=False):
+    """
+    Merge the changes from ``base`` to ``ours`` and from ``base`` to ``theirs`` into one text.
+
+    Both sides are diffed against the same split base lines with the patience line diff, which
+    yields, for every base line, the line it is kept as on each side. Base lines kept on both sides
+    are stable; between two stable lines, a region changed on one side only takes that side, a
+    region changed identically on both sides is taken once, and anything else is a conflict. Line
+    endings and the final newline are part of a change, so ``merge3(base, x, base)`` and
+    ``merge3(base, base, x)`` both give back ``x``. The walk over the regions is linear in the size
+    of the three texts.
+
+    Parameters:
+        base (str): The common ancestor
+        ours (str): The first modified version
+        theirs (str): The second modified version
+        strategy (str): How to resolve conflicts: ``None`` writes conflict markers, ``ours`` or
+            ``theirs`` keep that side, and ``union`` keeps our lines followed by theirs
+        show_base (bool): Include the base lines between ``|||||||`` markers, as in diff3 output
+
+    Returns:
+        dict: ``{"merged": str, "conflicts": list}``, where each conflict holds the ``base_range``,
+        ``ours_range``, ``theirs_range`` and ``merged_range`` of the region (1-based, inclusive),
+        its ``base``, ``ours`` and ``theirs`` lines, and whether it was ``resolved`` by the strategy.
+    """
+    if strategy is not None and strategy not in STRATEGIES:
+        raise ValueError(f"Unknown merge strategy {strategy!r}, expected one of {', '.join(STRATEGIES)}")
+
+    cdef list raw_base = _split(base)
+    cdef list raw_ours = _split(ours)
+    cdef list raw_theirs = _split(theirs)
+    cdef list base_lines = [line.rstrip("\r\n") for line in raw_base]
+    cdef list ours_lines = [line.rstrip("\r\n") for line in raw_ours]
+    cdef list theirs_lines = [line.rstrip("\r\n") for line in raw_theirs]
+    cdef list match_ours = _match_base(base_lines, ours_lines)
+    cdef list match_theirs = _match_base(base_lines, theirs_lines)
+    cdef Py_ssize_t n_base = len(base_lines)
+    cdef Py_ssize_t i = 0, a = 0, b = 0, next_i, next_a, next_b, merged_start
+    cdef list conflicts = []
+    cdef bint ours_changed, theirs_changed
+    cdef str eol = "\r\n" if raw_base and raw_base[0].endswith("\r\n") else "\n"
+    cdef _Writer out = _Writer(eol)
+
+    while i < n_base or a < len(ours_lines) or b < len(theirs_lines):
+        # Copy the stable run; a side that only changed the line ending or dropped the final newline wins
+        while i < n_base and match_ours[i] == a and match_theirs[i] == b:
+            if raw_ours[a] != raw_base[i]:
+                out.write(raw_ours, a, a + 1)
+            else:
+                out.write(raw_theirs, b, b + 1)
+            i += 1
+            a += 1
+            b += 1
+
+        # The unstable region ends at the next base line kept on both sides
+        next_i = i
+        while next_i < n_base and (match_ours[next_i] == -1 or match_theirs[next_i] == -1):
+            next_i += 1
+        if next_i < n_base:
+            next_a = match_ours[next_i]
+            next_b = match_theirs[next_i]
+        else:
+            next_a = len(ours_lines)
+            next_b = len(theirs_lines)
+        if next_i == i and next_a == a and next_b == b:
+            break
+
+        # Line endings count, so that changing only them is not reverted
+        ours_changed = raw_ours[a:next_a] != raw_base[i:next_i]
+        theirs_changed = raw_theirs[b:next_b] != raw_base[i:next_i]
+        if not theirs_changed:
+            out.write(raw_ours, a, next_a)
+        elif not ours_changed or raw_ours[a:next_a] == raw_theirs[b:next_b]:
+            out.write(raw_theirs, b, next_b)
+        else:
+            merged_start = out.n_lines
+            if strategy is None:
+                out.marker("<<<<<<< ours")
+                out.write(raw_ours, a, next_a)
+                if show_base:
+                    out.marker("||||||| base")
+                    out.write(raw_base, i, next_i)
+                out.marker("=======")
+                out.write(raw_theirs, b, next_b)
+                out.marker(">>>>>>> theirs")
+            else:
+                if strategy != "theirs":
+                    out.write(raw_ours, a, next_a)
+                if strategy != "ours":
+                    out.write(raw_theirs, b, next_b)
+            conflicts.append({
+                "base_range": _range(i, next_i),
+                "ours_range": _range(a, next_a),
+                "theirs_range": _range(b, next_b),
+                "merged_range": _range(merged_start, out.n_lines),
+                "base": base_lines[i:next_i],
+                "ours": ours_lines[a:next_a],
+                "theirs": theirs_lines[b:next_b],
+                "resolved": strategy is not None,
+            })
+
+        i, a, b = next_i, next_a, next_b
+
+    return {"merged": "".join(out.pieces), "conflicts": conflicts}
@@ -1,2 +1,60 @@
-def diff_line(a: str, b: str) -> list: ...
-def tokenize(text: str) -> list: ...
+from array import array
+
+TOKENIZERS: tuple[str, ...]
+OUTPUTS: tuple[str, ...]
+GRANULARITIES: tuple[str, ...]
+
+class MemoryBudgetError(MemoryError):
+    required: int
+    max_memory: int
+    def __init__(self, message: str, required: int, max_memory: int) -> None: ...
+
+def set_max_memory(limit: int | None) -> int | None: ...
+def get_max_memory() -> int | None: ...
+def trace_memory() -> dict[str, int]: ...
+def reset_trace_memory() -> None: ...
+
+class DiffStats:
+    timings: dict[str, float]
+    recursions: int
+    max_depth: int
+    anchors: int
+    unanchored: int
+    line_diffs: int
+    edit_distance: int
+    hard_replaces: int
+    trace_allocations: int
+    trace_bytes: int
+    def __init__(self) -> None: ...
+    def add_time(self, phase: str, seconds: float) -> None: ...
+    def as_dict(self) -> dict: ...
+
+def diff_line(
+    a: str,
+    b: str,
+    ignore_case: bool = False,
+    ignore_all_space: bool = False,
+    ignore_space_change: bool = False,
+    tokenizer: str = "word",
+    output: str = "tokens",
+    granularity: str = "token",
+    deadline: float | None = None,
+    timeout_ms: float | None = None,
+    degraded: list[str] | None = None,
+    max_memory: int | None = None,
+    stats: DiffStats | None = None,
+) -> list: ...
+def diff_line_spans(
+    original: str,
+    updated: str,
+    ignore_case: bool = False,
+    ignore_all_space: bool = False,
+    ignore_space_change: bool = False,
+    tokenizer: str = "word",
+    deadline: float | None = None,
+    timeout_ms: float | None = None,
+    degraded: list[str] | None = None,
+    max_memory: int | None = None,
+) -> tuple[list[tuple[str, int, int, int, int]], array, array]: ...
+def tokenize(text: str, tokenizer: str = "word") -> list: ...
+def tokenize_spans(text: str, tokenizer: str = "word") -> array: ...
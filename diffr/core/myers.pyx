@@ -1,18 +1,171 @@
 from libc.stdlib cimport malloc, free
 cimport cython
-from libc.string cimport memcpy
+from libc.string cimport memcmp, memcpy
+from cpython cimport array
+from cpython.mem cimport PyMem_Free
+from cpython.list cimport PyList_GET_ITEM
+from cpython.object cimport PyObject_RichCompareBool, Py_EQ
 from cpython.pycapsule cimport PyCapsule_New, PyCapsule_GetPointer
+from cpython.ref cimport PyObject
+
+import array
+import unicodedata
+from time import monotonic, perf_counter
+
+from cpython.unicode cimport (
+    PyUnicode_1BYTE_KIND,
+    PyUnicode_AsUCS4Copy,
+    PyUnicode_2BYTE_KIND,
+    PyUnicode_DATA,
+    PyUnicode_KIND,
+    PyUnicode_READ,
+    Py_UNICODE_ISALNUM,
+    Py_UNICODE_ISSPACE,
+    Py_UNICODE_TOLOWER,
+)
+
+TOKENIZERS = ("word", "whitespace", "char", "code")
+
+OUTPUTS = ("tokens", "opcodes", "runs")
+
+GRANULARITIES = ("token", "char")
+
+cdef enum:
+    CLASS_OTHER = 0
+    CLASS_SPACE = 1
+    CLASS_WORD = 2
+
+cdef enum:
+    MODE_WORD = 0
+    MODE_WHITESPACE = 1
+    MODE_CHAR = 2
+    MODE_CODE = 3
+
+ctypedef fused char_t:
+    unsigned char
+    unsigned short
+    unsigned int
+
+# Character classes of the ASCII range, looked up directly instead of classified per call
+cdef unsigned char ASCII_CLASS[128]
+cdef int _c
+for _c in range(128):
+    if _c == 32 or 9 <= _c <= 13:
+        ASCII_CLASS[_c] = CLASS_SPACE
+    elif 48 <= _c <= 57 or 65 <= _c <= 90 or 97 <= _c <= 122 or _c == 95:
+        ASCII_CLASS[_c] = CLASS_WORD
+    else:
+        ASCII_CLASS[_c] = CLASS_OTHER
+
+# Classes of non-ASCII characters that need the Unicode database (combining marks and symbols)
+cdef dict _unicode_classes = {}
+
+_CODE_OPERATORS = frozenset([
+    "...", "===", "!==", "**=", "//=", ">>=", "<<=", "<=>",
+    "==", "!=", "<=", ">=", "->", "=>", "**", "//", "&&", "||", "::", ":=",
+    "+=", "-=", "*=", "/=", "%=", "&=", "|=", "^=", "<<", ">>", "++", "--",
+])
+
 
 @cython.inline
-cdef bint is_separator(int ch):
-    return ch == 32 or (9 <= ch <= 13)
+cdef int char_class(unsigned int ch):
+    if ch < 128:
+        return ASCII_CLASS[ch]
+    if Py_UNICODE_ISSPACE(ch):
+        return CLASS_SPACE
+    if Py_UNICODE_ISALNUM(ch):
+        return CLASS_WORD
+    cls = _unicode_classes.get(ch)
+    if cls is None:
+        # Combining marks (accents, Indic vowel signs...) belong to the word they follow
+        cls = CLASS_WORD if unicodedata.category(chr(ch)).startswith("M") else CLASS_OTHER
+        _unicode_classes[ch] = cls
+    return cls
+
 
 @cython.inline
-cdef bint is_alphanumeric(int ch):
-    return (48 <= ch <= 57) or (65 <= ch <= 90) or (97 <= ch <= 122) or (ch == 95)
+cdef bint is_separator(unsigned int ch):
+    return char_class(ch) == CLASS_SPACE
+
+
+cdef int _tokenizer_mode(str tokenizer) except -1:
+    if tokenizer == "word":
+        return MODE_WORD
+    if tokenizer == "whitespace":
+        return MODE_WHITESPACE
+    if tokenizer == "char":
+        return MODE_CHAR
+    if tokenizer == "code":
+        return MODE_CODE
+    raise ValueError(f"Unknown tokenizer {tokenizer!r}, expected one of {', '.join(TOKENIZERS)}")
+
+
+cdef void _scan(const char_t* data, Py_ssize_t n, str text, int mode, list tokens, array.array bounds) except *:
+    """
+    Tokenize the raw code points of ``text``; compiled once per PEP 393 storage width.
+
+    Tokens are appended to ``tokens`` as substrings, or, when ``tokens`` is None, their end offsets
+    are appended to ``bounds``.
+    """
+    cdef Py_ssize_t i = 0, start
+    cdef int end
+    cdef int cls
+    cdef unsigned int ch
+
+    while i < n:
+        start = i
+        ch = data[i]
+        cls = char_class(ch)
+        i += 1
+        if cls == CLASS_SPACE:
+            # Group separators together as tokens
+            while i < n and char_class(data[i]) == CLASS_SPACE:
+                i += 1
+        elif mode == MODE_WHITESPACE:
+            while i < n and char_class(data[i]) != CLASS_SPACE:
+                i += 1
+        elif cls == CLASS_WORD:
+            if mode == MODE_CODE and 48 <= ch <= 57:
+                # Numbers keep their decimal point and exponent sign: 2.0, 1e-3
+                while i < n:
+                    ch = data[i]
+                    if char_class(ch) == CLASS_WORD:
+                        i += 1
+                    elif ch == 46 and i + 1 < n and 48 <= data[i + 1] <= 57:
+                        i += 1
+                    elif (ch == 43 or ch == 45) and (data[i - 1] == 101 or data[i - 1] == 69):
+                        i += 1
+                    else:
+                        break
+            else:
+                while i < n and char_class(data[i]) == CLASS_WORD:
+                    i += 1
+        elif mode == MODE_CODE:
+            if start + 3 <= n and text[start:start + 3] in _CODE_OPERATORS:
+                i = start + 3
+            elif start + 2 <= n and text[start:start + 2] in _CODE_OPERATORS:
+                i = start + 2
+        if tokens is not None:
+            tokens.append(text[start:i])
+        else:
+            end = <int> i
+            array.extend_buffer(bounds, <char*> &end, 1)
+
+
+cdef void _tokenize_into(str text, int mode, list tokens, array.array bounds) except *:
+    """Dispatch ``_scan`` on the storage width of ``text``."""
+    cdef Py_ssize_t n = len(text)
+    cdef unsigned int kind = PyUnicode_KIND(text)
+    if kind == PyUnicode_1BYTE_KIND:
+        _scan(<const unsigned char*> PyUnicode_DATA(text), n, text, mode, tokens, bounds)
+    elif kind == PyUnicode_2BYTE_KIND:
+        _scan(<const unsigned short*> PyUnicode_DATA(text), n, text, mode, tokens, bounds)
+    else:
+        _scan(<const unsigned int*> PyUnicode_DATA(text), n, text, mode, tokens, bounds)
+
 
 @cython.final
-cpdef list[str] tokenize(str text):
+cpdef list[str] tokenize(str text, str tokenizer="word"):
     """
     Tokenizes the input text into a list of strings, separating by whitespace and alphanumeric characters.
 
@@ -20,42 +173,92 @@ cpdef list[str] tokenize(str text):
     (whitespace characters) and alphanumeric characters into tokens. Non-alphanumeric and non-separator
     characters are treated as individual tokens.
 
+    The text is read straight from its PEP 393 buffer with a loop specialized for each storage width.
+    ASCII characters are classified through a lookup table and the rest with the Unicode database, so
+    words such as ``café`` or ``данные`` and runs of CJK characters stay single tokens.
+
+    Tokenizers:
+        word: Whitespace runs, word runs and single punctuation characters (the default)
+        whitespace: Whitespace runs and runs of everything else
+        char: One token per character
+        code: Like ``word``, but numbers such as ``2.0`` and operators such as ``==`` stay whole
+
     Parameters:
         text (str): The input text to be tokenized
+        tokenizer (str): Name of the tokenizer to use
 
     Returns:
         list[str]: A list of tokens extracted from the input text
     """
     cdef:
-        Py_ssize_t i = 0, n = len(text), start
+        int mode = _tokenizer_mode(tokenizer)
         list tokens = []
-        int ch
 
-    while i < n:
-        ch = ord(text[i])
-        if is_separator(ch):
-            # Group separators together as tokens
-            start = i
-            while i < n and is_separator(ord(text[i])):
-                i += 1
-            tokens.append(text[start:i])
-        elif is_alphanumeric(ch):
-            start = i
-            while i < n:
-                ch = ord(text[i])
-                if not is_alphanumeric(ch):
-                    break
-                i += 1
-            tokens.append(text[start:i])
-        else:
-            tokens.append(text[i])
-            i += 1
+    if mode == MODE_CHAR:
+        return list(text)
 
+    _tokenize_into(text, mode, tokens, None)
     return tokens
 
 
 @cython.final
-cpdef list[tuple[str, str]] diff_line(str original, str updated):
+cpdef array.array tokenize_spans(str text, str tokenizer="word"):
+    """
+    Tokenizes the input text like ``tokenize``, but returns token boundaries instead of substrings.
+
+    No string is created per token: the boundaries are written to a single ``array('i')``, which
+    supports the buffer protocol and can be wrapped in a ``memoryview`` without copying.
+
+    Parameters:
+        text (str): The input text to be tokenized
+        tokenizer (str): Name of the tokenizer to use, see ``tokenize``
+
+    Returns:
+        array.array: ``len(tokens) + 1`` offsets starting at 0, where token ``k`` is
+        ``text[bounds[k]:bounds[k + 1]]``
+    """
+    cdef:
+        int mode = _tokenizer_mode(tokenizer)
+        array.array bounds
+
+    if mode == MODE_CHAR:
+        return array.array("i", range(len(text) + 1))
+
+    bounds = array.array("i", [0])
+    _tokenize_into(text, mode, None, bounds)
+    return bounds
+
+
+cdef list _token_keys(list tokens, bint ignore_case, bint ignore_space):
+    """Comparison keys for tokens: whitespace runs all share one key, other tokens may be case-folded."""
+    cdef list keys = []
+    cdef str token
+    for token in tokens:
+        if ignore_space and is_separator(ord(token[0])):
+            keys.append(" ")
+        elif ignore_case:
+            keys.append(token.casefold())
+        else:
+            keys.append(token)
+    return keys
+
+
+@cython.final
+cpdef list[tuple[str, str]] diff_line(
+    str original,
+    str updated,
+    bint ignore_case=False,
+    bint ignore_all_space=False,
+    bint ignore_space_change=False,
+    str tokenizer="word",
+    str output="tokens",
+    str granularity="token",
+    deadline=None,
+    timeout_ms=None,
+    list degraded=None,
+    max_memory=None,
+    DiffStats stats=None,
+):
     """
     Implements the Myers diff algorithm to find differences between two text lines.
 
@@ -70,133 +273,780 @@ cpdef list[tuple[str, str]] diff_line(str original, str updated):
     3. Converting the path into a series of edit operations
     4. Backtracking through the solution to build the diff
 
+    Comparison keys for the ignore options are computed once per token; the tokens themselves are
+    kept for the output, so equal tokens are reported with their original text.
+
     Parameters:
         original (str): The original text line
         updated (str): The updated text line
+        ignore_case (bool): Compare tokens case-insensitively
+        ignore_all_space (bool): Treat all whitespace runs as equal to each other
+        ignore_space_change (bool): Same as ``ignore_all_space`` at the token level, where
+            whitespace runs are single tokens
+        tokenizer (str): Tokenizer used to split both lines, see ``tokenize``
+        output (str): Shape of the result: ``tokens`` (one tuple per token), ``opcodes`` or ``runs``
+        granularity (str): ``token`` diffs the tokens of ``tokenizer``; ``char`` diffs characters with
+            a linear-space bisection straight on the string buffers, followed by a semantic cleanup
+            that folds equalities shorter than the changes around them into those changes. The ignore
+            options then compare characters, with every whitespace character equal to any other.
+        deadline (float): ``time.monotonic()`` value after which the diff stops searching for a
+            minimal edit script
+        timeout_ms (float): Time budget in milliseconds, an alternative to ``deadline``; the earlier
+            of the two applies
+        degraded (list): Receives "region" when time ran out, in which case everything between the
+            common prefix and suffix of the unfinished stretch is reported as deleted and inserted
+        max_memory (int): Memory budget in bytes, ``get_max_memory()`` by default. The Myers trace
+            is kept while it fits; past the budget the diff falls back to a linear-space bisection
+            that recomputes instead of remembering, and ``MemoryBudgetError`` is raised when not even
+            that fits.
+        stats (DiffStats): Receives the time spent tokenizing and diffing, the edit distance in
+            tokens (characters with ``granularity="char"``) and the memory malloc'd for the trace
 
     Returns:
-        list[tuple[str, str]]: A list of tuples where each tuple consists of:
+        list[tuple[str, str]]: With ``output="tokens"``, a list of tuples where each tuple consists of:
             - An operation string: "equal", "insert", or "delete"
             - The token the operation applies to
 
+        With ``output="opcodes"``, difflib-style ``(tag, i1, i2, j1, j2)`` tuples, tagged "equal",
+        "replace", "delete" or "insert", where ``original[i1:i2]`` became ``updated[j1:j2]``.
+        With ``output="runs"``, ``(tag, text)`` tuples in which consecutive tokens with the same
+        operation are joined, and every changed stretch is one "delete" run followed by one "insert"
+        run; joining the "equal" and "delete" texts gives back the original line.
+
     Time complexity: O((N+M)*D) where N and M are the lengths of the input sequences
     and D is the edit distance between them.
-    Space complexity: O((N+M)²)
+    Space complexity: O(N+M+D²) for tokens, O(N+M) for characters or under a tight ``max_memory``
+    """
+    cdef:
+        list[str] words1, words2
+        list keys1, keys2
+        _KeyPair pair
+        list script = []
+        str tag
+        Py_ssize_t i1, i2, j1, j2, i
+        double end = _resolve_deadline(deadline, timeout_ms)
+        Py_ssize_t budget = _resolve_max_memory(max_memory)
+        double start = 0.0
+        Py_ssize_t allocations = _trace_allocations, allocated = _trace_bytes
+
+    if output not in OUTPUTS:
+        raise ValueError(f"Unknown output {output!r}, expected one of {', '.join(OUTPUTS)}")
+    if stats is not None:
+        start = perf_counter()
+        stats.line_diffs += 1
+    if granularity == "char":
+        opcodes = _char_opcodes(
+            original, updated, ignore_case, ignore_all_space or ignore_space_change, end, degraded, budget
+        )
+        if stats is not None:
+            _record_line_diff(stats, start, _distance(opcodes), allocations, allocated)
+        if output == "opcodes":
+            return opcodes
+        if output == "runs":
+            return _text_runs(
+                opcodes, original, updated, tokenize_spans(original, "char"), tokenize_spans(updated, "char")
+            )
+        for tag, i1, i2, j1, j2 in opcodes:
+            if tag != "insert":
+                for i in range(i1, i2):
+                    script.append(("equal" if tag == "equal" else "delete", original[i]))
+            if tag == "insert" or tag == "replace":
+                for i in range(j1, j2):
+                    script.append(("insert", updated[i]))
+        return script
+    if granularity != "token":
+        raise ValueError(f"Unknown granularity {granularity!r}, expected one of {', '.join(GRANULARITIES)}")
+
+    if output != "tokens":
+        opcodes, bounds1, bounds2 = diff_line_spans(
+            original, updated, ignore_case, ignore_all_space, ignore_space_change, tokenizer, end or None,
+            None, degraded, budget,
+        )
+        if stats is not None:
+            _record_line_diff(stats, start, _distance(opcodes), allocations, allocated)
+        if output == "runs":
+            return _text_runs(opcodes, original, updated, bounds1, bounds2)
+        return [
+            (tag, bounds1[i1], bounds1[i2], bounds2[j1], bounds2[j2]) for tag, i1, i2, j1, j2 in opcodes
+        ]
+
+    words1 = tokenize(original, tokenizer) if original else []
+    words2 = tokenize(updated, tokenizer) if updated else []
+    keys1, keys2 = words1, words2
+    if ignore_case or ignore_all_space or ignore_space_change:
+        keys1 = _token_keys(words1, ignore_case, ignore_all_space or ignore_space_change)
+        keys2 = _token_keys(words2, ignore_case, ignore_all_space or ignore_space_change)
+    if stats is not None:
+        stats.add_time("tokenize", perf_counter() - start)
+        start = perf_counter()
+
+    pair.keys1 = <PyObject*> keys1
+    pair.keys2 = <PyObject*> keys2
+    runs = _myers_runs(len(words1), len(words2), _keys_equal, &pair, end, degraded, budget)
+    if stats is not None:
+        _record_line_diff(stats, start, _distance(runs), allocations, allocated)
+    for tag, i1, i2, j1, j2 in runs:
+        if tag == "insert":
+            for i in range(j1, j2):
+                script.append((tag, words2[i]))
+        else:
+            for i in range(i1, i2):
+                script.append((tag, words1[i]))
+    return script
+
+
+cdef void _record_line_diff(
+    DiffStats stats, double start, Py_ssize_t distance, Py_ssize_t allocations, Py_ssize_t allocated
+) except *:
+    """Add one line diff that started at ``start`` and found ``distance`` to ``stats``."""
+    stats.add_time("diff", perf_counter() - start)
+    stats.edit_distance += distance
+    stats.trace_allocations += _trace_allocations - allocations
+    stats.trace_bytes += _trace_bytes - allocated
+
+
+@cython.final
+cpdef tuple diff_line_spans(
+    str original,
+    str updated,
+    bint ignore_case=False,
+    bint ignore_all_space=False,
+    bint ignore_space_change=False,
+    str tokenizer="word",
+    deadline=None,
+    timeout_ms=None,
+    list degraded=None,
+    max_memory=None,
+):
+    """
+    Diffs two text lines like ``diff_line``, without creating a string per token.
+
+    Both lines are split with ``tokenize_spans`` and tokens are compared in place, straight from
+    the PEP 393 buffers of the two strings. Text is only materialized when ``ignore_case`` needs
+    case-folded tokens; callers slice the lines with the returned boundaries when they want it.
+
+    Parameters:
+        original (str): The original text line
+        updated (str): The updated text line
+        ignore_case (bool): Compare tokens case-insensitively
+        ignore_all_space (bool): Treat all whitespace runs as equal to each other
+        ignore_space_change (bool): Same as ``ignore_all_space`` at the token level
+        tokenizer (str): Tokenizer used to split both lines, see ``tokenize``
+        deadline (float): ``time.monotonic()`` value after which the search is cut short
+        timeout_ms (float): Time budget in milliseconds, see ``diff_line``
+        degraded (list): Receives "region" when time ran out, see ``diff_line``
+        max_memory (int): Memory budget in bytes, see ``diff_line``
+
+    Returns:
+        tuple: ``(opcodes, bounds1, bounds2)``, where ``opcodes`` is a list of difflib-style
+        ``(tag, i1, i2, j1, j2)`` tuples over token indices, tagged "equal", "replace", "delete"
+        or "insert", and ``bounds1`` / ``bounds2`` are the ``tokenize_spans`` boundaries of each
+        line, so tokens ``i1:i2`` are ``original[bounds1[i1]:bounds1[i2]]``
+    """
+    cdef:
+        array.array bounds1 = tokenize_spans(original, tokenizer)
+        array.array bounds2 = tokenize_spans(updated, tokenizer)
+        Py_ssize_t N = len(bounds1) - 1
+        Py_ssize_t M = len(bounds2) - 1
+        _SpanPair spans
+        _KeyPair pair
+        list keys1, keys2, runs
+        double end = _resolve_deadline(deadline, timeout_ms)
+        Py_ssize_t budget = _resolve_max_memory(max_memory)
+
+    if ignore_case:
+        keys1 = _token_keys(tokenize(original, tokenizer), True, ignore_all_space or ignore_space_change)
+        keys2 = _token_keys(tokenize(updated, tokenizer), True, ignore_all_space or ignore_space_change)
+        pair.keys1 = <PyObject*> keys1
+        pair.keys2 = <PyObject*> keys2
+        runs = _myers_runs(N, M, _keys_equal, &pair, end, degraded, budget)
+    else:
+        spans.data1 = PyUnicode_DATA(original)
+        spans.data2 = PyUnicode_DATA(updated)
+        spans.kind1 = PyUnicode_KIND(original)
+        spans.kind2 = PyUnicode_KIND(updated)
+        spans.bounds1 = bounds1.data.as_ints
+        spans.bounds2 = bounds2.data.as_ints
+        spans.ignore_space = ignore_all_space or ignore_space_change
+        runs = _myers_runs(N, M, _spans_equal, &spans, end, degraded, budget)
+    return _group_runs(runs), bounds1, bounds2
+
+
+cpdef list _text_runs(list opcodes, str original, str updated, array.array bounds1, array.array bounds2):
+    """Turn ``diff_line_spans`` opcodes into ``(tag, text)`` runs, slicing each run once."""
+    cdef list runs = []
+    cdef int* b1 = bounds1.data.as_ints
+    cdef int* b2 = bounds2.data.as_ints
+    cdef str tag
+    cdef Py_ssize_t i1, i2, j1, j2
+
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "equal":
+            runs.append((tag, original[b1[i1]:b1[i2]]))
+            continue
+        if i1 < i2:
+            runs.append(("delete", original[b1[i1]:b1[i2]]))
+        if j1 < j2:
+            runs.append(("insert", updated[b2[j1]:b2[j2]]))
+    return runs
+
+
+# ---------------------------------------------------------------------
+# Time budgets
+# ---------------------------------------------------------------------
+
+cpdef double _resolve_deadline(object deadline=None, object timeout_ms=None) except? -1.0:
+    """The earlier of an absolute ``time.monotonic()`` deadline and a budget from now, 0.0 for none."""
+    cdef double end = 0.0
+    if timeout_ms is not None:
+        end = monotonic() + timeout_ms / 1000.0
+    if deadline is not None and (end == 0.0 or deadline < end):
+        end = deadline
+    return end
+
+
+cdef inline bint _expired(double deadline) except -1:
+    return deadline != 0.0 and monotonic() >= deadline
+
+
+cdef inline void _degrade(list degraded, str stage) except *:
+    if degraded is not None and stage not in degraded:
+        degraded.append(stage)
+
+
+# ---------------------------------------------------------------------
+# Memory budgets
+# ---------------------------------------------------------------------
+
+class MemoryBudgetError(MemoryError):
+    """Raised when no diff strategy fits in the memory budget."""
+
+    def __init__(self, message, required, max_memory):
+        super().__init__(message)
+        self.required = required
+        self.max_memory = max_memory
+
+    def __reduce__(self):
+        # Keep every argument when the error crosses a process boundary
+        return type(self), (self.args[0], self.required, self.max_memory)
+
+
+cdef Py_ssize_t _default_max_memory = 0
+
+
+def set_max_memory(limit):
+    """
+    Set the process-wide memory budget of a single line diff, used when ``max_memory`` is not given.
+
+    Parameters:
+        limit (int): Budget in bytes, or None for no limit
+
+    Returns:
+        int: The previous budget, None when there was none
+    """
+    global _default_max_memory
+    cdef Py_ssize_t previous = _default_max_memory
+    _default_max_memory = _resolve_max_memory(0 if limit is None else limit)
+    return previous or None
+
+
+def get_max_memory():
+    """The process-wide memory budget set with ``set_max_memory``, None when there is none."""
+    return _default_max_memory or None
+
+
+cpdef Py_ssize_t _resolve_max_memory(object max_memory) except -1:
+    """The given budget in bytes, the process-wide one for None, with 0 meaning no limit."""
+    if max_memory is None:
+        return _default_max_memory
+    if max_memory < 0:
+        raise ValueError(f"max_memory must not be negative, got {max_memory}")
+    return max_memory
+
+
+# ---------------------------------------------------------------------
+# Trace accounting
+# ---------------------------------------------------------------------
+
+# The trace and the bisection vectors come from libc malloc, which tracemalloc does not see
+cdef Py_ssize_t _trace_allocations = 0
+cdef Py_ssize_t _trace_bytes = 0
+cdef Py_ssize_t _trace_live = 0
+cdef Py_ssize_t _trace_peak = 0
+
+
+cdef inline void _trace_alloc(Py_ssize_t size) noexcept:
+    global _trace_allocations, _trace_bytes, _trace_live, _trace_peak
+    _trace_allocations += 1
+    _trace_bytes += size
+    _trace_live += size
+    if _trace_live > _trace_peak:
+        _trace_peak = _trace_live
+
+
+cdef inline void _trace_free(Py_ssize_t size) noexcept:
+    global _trace_live
+    _trace_live -= size
+
+
+def trace_memory():
+    """
+    Memory malloc'd by the line diff engine since the last ``reset_trace_memory()``.
+
+    Returns:
+        dict: ``allocations`` made, total ``bytes`` allocated, and ``peak`` bytes held at once
+    """
+    return {"allocations": _trace_allocations, "bytes": _trace_bytes, "peak": _trace_peak}
+
+
+def reset_trace_memory():
+    """Reset the counters of ``trace_memory()``; the peak restarts from the memory currently held."""
+    global _trace_allocations, _trace_bytes, _trace_peak
+    _trace_allocations = 0
+    _trace_bytes = 0
+    _trace_peak = _trace_live
+
+
+# ---------------------------------------------------------------------
+# Instrumentation
+# ---------------------------------------------------------------------
+
+@cython.final
+cdef class DiffStats:
+    """
+    Where the time of a diff went, filled in by ``diff_hunks(stats=True)`` and ``diff_line(stats=...)``.
+
+    The same instance can be passed to several calls to add them up.
+
+    Attributes:
+        timings (dict): Seconds per phase. ``diff_hunks`` reports "split" (lines and their endings),
+            "keys" (comparison keys of the ignore options), "anchors" (unique lines and their longest
+            increasing subsequence), "recursion" (the rest of the patience recursion), "moves",
+            "inline" (inline diffs of replaced lines) and "hunks" (the rest of hunk building);
+            ``diff_line`` reports "tokenize" and "diff"
+        recursions (int): Calls of the patience recursion
+        max_depth (int): Deepest nesting of the patience recursion, 1 for a single level
+        anchors (int): Unique lines used as anchors, over all levels
+        unanchored (int): Regions without any anchor, whose lines were paired in order
+        line_diffs (int): Inline diffs computed
+        edit_distance (int): Tokens, or characters, inserted and deleted by those inline diffs
+        hard_replaces (int): Replaced lines too dissimilar for their inline diff to be kept
+        trace_allocations (int): Buffers malloc'd for edit graphs, see ``trace_memory``
+        trace_bytes (int): Bytes malloc'd for edit graphs
+    """
+
+    cdef public dict timings
+    cdef public Py_ssize_t recursions, max_depth, anchors, unanchored
+    cdef public Py_ssize_t line_diffs, edit_distance, hard_replaces, trace_allocations, trace_bytes
+
+    def __init__(self):
+        self.timings = {}
+
+    cpdef void add_time(self, str phase, double seconds):
+        """Add ``seconds`` to the time of ``phase``."""
+        self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+
+    def as_dict(self):
+        """The statistics as a JSON-serializable dict."""
+        return {
+            "timings": dict(self.timings),
+            "recursions": self.recursions,
+            "max_depth": self.max_depth,
+            "anchors": self.anchors,
+            "unanchored": self.unanchored,
+            "line_diffs": self.line_diffs,
+            "edit_distance": self.edit_distance,
+            "hard_replaces": self.hard_replaces,
+            "trace_allocations": self.trace_allocations,
+            "trace_bytes": self.trace_bytes,
+        }
+
+    def __repr__(self):
+        return "DiffStats(" + ", ".join(f"{key}={value!r}" for key, value in self.as_dict().items()) + ")"
+
+
+cdef inline Py_ssize_t _distance(list opcodes):
+    """Number of items inserted and deleted by difflib-style opcodes."""
+    cdef Py_ssize_t distance = 0, i1, i2, j1, j2
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag != "equal":
+            distance += (i2 - i1) + (j2 - j1)
+    return distance
+
+
+# ---------------------------------------------------------------------
+# Token comparison
+# ---------------------------------------------------------------------
+
+ctypedef int (*_token_eq)(void* ctx, Py_ssize_t x, Py_ssize_t y) except -1
+
+
+cdef struct _KeyPair:
+    PyObject* keys1
+    PyObject* keys2
+
+
+cdef struct _SpanPair:
+    void* data1
+    void* data2
+    int kind1
+    int kind2
+    int* bounds1
+    int* bounds2
+    bint ignore_space
+
+
+cdef int _keys_equal(void* ctx, Py_ssize_t x, Py_ssize_t y) except -1:
+    """Compare two items of the key lists, by identity first."""
+    cdef _KeyPair* pair = <_KeyPair*> ctx
+    cdef PyObject* a = PyList_GET_ITEM(<object> pair.keys1, x)
+    cdef PyObject* b = PyList_GET_ITEM(<object> pair.keys2, y)
+    if a == b:
+        return 1
+    return PyObject_RichCompareBool(<object> a, <object> b, Py_EQ)
+
+
+cdef int _spans_equal(void* ctx, Py_ssize_t x, Py_ssize_t y) except -1:
+    """Compare two tokens through their boundaries in the string buffers."""
+    cdef _SpanPair* p = <_SpanPair*> ctx
+    cdef Py_ssize_t s1 = p.bounds1[x]
+    cdef Py_ssize_t s2 = p.bounds2[y]
+    cdef Py_ssize_t n = p.bounds1[x + 1] - s1
+    cdef Py_ssize_t k
+
+    if p.ignore_space and is_separator(PyUnicode_READ(p.kind1, p.data1, s1)) \
+            and is_separator(PyUnicode_READ(p.kind2, p.data2, s2)):
+        return 1
+    if n != p.bounds2[y + 1] - s2:
+        return 0
+    if p.kind1 == p.kind2:
+        return memcmp(<char*> p.data1 + s1 * p.kind1, <char*> p.data2 + s2 * p.kind2, n * p.kind1) == 0
+    # Same text can be stored with different widths when only one line has wider characters
+    for k in range(n):
+        if PyUnicode_READ(p.kind1, p.data1, s1 + k) != PyUnicode_READ(p.kind2, p.data2, s2 + k):
+            return 0
+    return 1
+
+
+# ---------------------------------------------------------------------
+# Myers forward pass and backtracking
+# ---------------------------------------------------------------------
+
+cdef enum:
+    OP_NONE = -1
+    OP_EQUAL = 0
+    OP_INSERT = 1
+    OP_DELETE = 2
+
+cdef tuple _OP_TAGS = ("equal", "insert", "delete")
+
+
+cdef list _myers_runs(
+    Py_ssize_t N, Py_ssize_t M, _token_eq equal, void* ctx, double deadline=0.0, list degraded=None,
+    Py_ssize_t max_memory=0,
+):
+    """
+    Run the Myers forward pass over two sequences of ``N`` and ``M`` tokens compared with ``equal``.
+
+    The trace kept for backtracking only holds the ``2d + 1`` diagonals that edit distance d can
+    reach, so it grows with the square of the edit distance instead of with ``D * (N + M)``. When a
+    ``max_memory`` budget in bytes is set and the trace outgrows it, the pass is dropped for the
+    linear-space bisection of ``_linear_runs``, which recomputes the edit graph instead of
+    remembering it.
+
+    The clock is checked once per edit distance when a ``deadline`` is set. Once it has passed, the
+    search is abandoned for ``_coarse_runs`` and "region" is recorded in ``degraded``.
+
+    Returns:
+        list: The edit script as runs ``(tag, i1, i2, j1, j2)`` of consecutive operations with the
+        same tag, in order; a changed stretch may alternate between "delete" and "insert" runs
     """
     cdef:
-        list[str] words1 = tokenize(original) if original else []
-        list[str] words2 = tokenize(updated) if updated else []
-        Py_ssize_t N = len(words1)
-        Py_ssize_t M = len(words2)
-        Py_ssize_t max_d, size, i, d, k, k_index, x, y
+        Py_ssize_t max_d, size, i, d, k, k_index, x, y, width, used
         int offset
-        int* V1 = NULL
-        int* V2 = NULL
         int* V = NULL
         list trace = []
-        int ch
-        object a, b
         int idx, idx1, idx2, down, up
-        bint toggle = True
+        bint overflow = False
         int* snapshot = NULL
 
     if N == 0 and M == 0:
         return []
     if N == 0:
-        return [("insert", w) for w in words2]
+        return [("insert", 0, 0, 0, M)]
     if M == 0:
-        return [("delete", w) for w in words1]
+        return [("delete", 0, N, 0, 0)]
 
     max_d = N + M
     size = 2 * max_d + 1
     offset = max_d
+    used = size * sizeof(int)
+    if max_memory and used > max_memory:
+        return _linear_runs(N, M, equal, ctx, deadline, degraded, max_memory)
 
-    V1 = <int*> malloc(size * sizeof(int))
-    V2 = <int*> malloc(size * sizeof(int))
-    if not V1 or not V2:
-        if V1: free(V1)
-        if V2: free(V2)
+    V = <int*> malloc(size * sizeof(int))
+    if not V:
         raise MemoryError()
-
+    _trace_alloc(used)
     for i in range(size):
-        V1[i] = -1
-        V2[i] = -1
-    V1[offset] = 0
-    V = V1
+        V[i] = -1
 
     try:
         # Initial snake
-        x = V[offset]
-        y = x
-        while x < N and y < M:
-            a = words1[x]
-            b = words2[y]
-            if a is b or a == b:
-                x += 1
-                y += 1
-            else:
-                break
+        x = 0
+        y = 0
+        while x < N and y < M and equal(ctx, x, y):
+            x += 1
+            y += 1
         V[offset] = x
         if x >= N and y >= M:
-            return [("equal", token) for token in words1]
-
-        snapshot = <int*> malloc(size * sizeof(int))
-        if not snapshot:
-            raise MemoryError()
-        memcpy(snapshot, V, size * sizeof(int))
-        trace.append(PyCapsule_New(snapshot, b"V_ptr", NULL))
-
-        for d in range(1, max_d + 1):
-            V = V2 if toggle else V1
-            memcpy(V, V1 if toggle else V2, size * sizeof(int))
-            toggle = not toggle
-
-            for k in range(-d, d + 1, 2):
-                k_index = k + offset
-                if k == -d:
-                    idx = (k + 1) + offset
-                    x = 0 if idx < 0 or idx >= size else (V1 if toggle else V2)[idx]
-                elif k == d:
-                    idx = (k - 1) + offset
-                    x = 0 if idx < 0 or idx >= size else (V1 if toggle else V2)[idx] + 1
-                else:
-                    idx1 = (k - 1) + offset
-                    idx2 = (k + 1) + offset
-                    down = -1 if idx1 < 0 or idx1 >= size else (V1 if toggle else V2)[idx1]
-                    up = 0 if idx2 < 0 or idx2 >= size else (V1 if toggle else V2)[idx2]
-                    x = up if down < up else down + 1
-                y = x - k
-                while x < N and y < M:
-                    a = words1[x]
-                    b = words2[y]
-                    if a is b or a == b:
+            return [("equal", 0, N, 0, M)]
+
+        for d in range(max_d + 1):
+            if d > 0:
+                if _expired(deadline):
+                    _degrade(degraded, "region")
+                    return _coarse_runs(N, M, equal, ctx)
+                # Diagonals of edit distance d only read those of d - 1, which have the other parity,
+                # so a single vector can be updated in place
+                for k in range(-d, d + 1, 2):
+                    k_index = k + offset
+                    if k == -d:
+                        idx = (k + 1) + offset
+                        x = 0 if idx < 0 or idx >= size else V[idx]
+                    elif k == d:
+                        idx = (k - 1) + offset
+                        x = 0 if idx < 0 or idx >= size else V[idx] + 1
+                    else:
+                        idx1 = (k - 1) + offset
+                        idx2 = (k + 1) + offset
+                        down = -1 if idx1 < 0 or idx1 >= size else V[idx1]
+                        up = 0 if idx2 < 0 or idx2 >= size else V[idx2]
+                        x = up if down < up else down + 1
+                    y = x - k
+                    while x < N and y < M and equal(ctx, x, y):
                         x += 1
                         y += 1
-                    else:
+                    V[k_index] = x
+                    if x >= N and y >= M:
                         break
-                V[k_index] = x
-                if x >= N and y >= M:
-                    snapshot = <int*> malloc(size * sizeof(int))
-                    if not snapshot:
-                        raise MemoryError()
-                    memcpy(snapshot, V, size * sizeof(int))
-                    trace.append(PyCapsule_New(snapshot, b"V_ptr", NULL))
-                    return _backtrack_fast(words1, words2, trace, offset, size)
-
-            snapshot = <int*> malloc(size * sizeof(int))
+
+            # Snapshot of diagonals -d..d, the ones the backtracking reads for this edit distance
+            width = 2 * d + 1
+            if max_memory and used + width * <Py_ssize_t> sizeof(int) > max_memory:
+                overflow = True
+                break
+            snapshot = <int*> malloc(width * sizeof(int))
             if not snapshot:
                 raise MemoryError()
-            memcpy(snapshot, V, size * sizeof(int))
+            memcpy(snapshot, V + offset - d, width * sizeof(int))
             trace.append(PyCapsule_New(snapshot, b"V_ptr", NULL))
+            _trace_alloc(width * sizeof(int))
+            used += width * sizeof(int)
+            if x >= N and y >= M:
+                break
+
+        if not overflow:
+            return _backtrack_fast(N, M, trace)
+
+    finally:
+        free(V)
+        for capsule in trace:
+            free(<int*> PyCapsule_GetPointer(capsule, b"V_ptr"))
+        _trace_free(used)
+
+    return _linear_runs(N, M, equal, ctx, deadline, degraded, max_memory)
+
+
+cdef list _coarse_runs(Py_ssize_t N, Py_ssize_t M, _token_eq equal, void* ctx):
+    """Keep the common prefix and suffix of both sequences and replace everything between them."""
+    cdef Py_ssize_t prefix = 0, suffix = 0
+    cdef list runs = []
+
+    while prefix < N and prefix < M and equal(ctx, prefix, prefix):
+        prefix += 1
+    while suffix < N - prefix and suffix < M - prefix and equal(ctx, N - suffix - 1, M - suffix - 1):
+        suffix += 1
+    if prefix:
+        runs.append(("equal", 0, prefix, 0, prefix))
+    if prefix < N - suffix:
+        runs.append(("delete", prefix, N - suffix, prefix, prefix))
+    if prefix < M - suffix:
+        runs.append(("insert", N - suffix, N - suffix, prefix, M - suffix))
+    if suffix:
+        runs.append(("equal", N - suffix, N, M - suffix, M))
+    return runs
+
+
+cdef list _linear_runs(
+    Py_ssize_t N, Py_ssize_t M, _token_eq equal, void* ctx, double deadline, list degraded, Py_ssize_t max_memory
+):
+    """Diff two token sequences in linear space, by bisection, when no trace fits ``max_memory``."""
+    cdef Py_ssize_t required = 2 * (N + M + 4) * sizeof(Py_ssize_t)
+    cdef list runs = []
+    if max_memory and required > max_memory:
+        raise MemoryBudgetError(
+            f"Diffing {N} against {M} tokens needs at least {required} bytes, over the budget of {max_memory}",
+            required,
+            max_memory,
+        )
+    _token_diff(equal, ctx, 0, N, 0, M, runs, deadline, degraded)
+    return runs
+
+
+cdef int _token_diff(
+    _token_eq equal, void* ctx, Py_ssize_t a0, Py_ssize_t a1, Py_ssize_t b0, Py_ssize_t b1, list runs,
+    double deadline, list degraded,
+) except -1:
+    """Diff tokens ``a0:a1`` against ``b0:b1`` like ``_char_diff``, comparing them with ``equal``."""
+    cdef Py_ssize_t prefix = 0, suffix = 0, p
+
+    while a0 + prefix < a1 and b0 + prefix < b1 and equal(ctx, a0 + prefix, b0 + prefix):
+        prefix += 1
+    _push_run(runs, OP_EQUAL, a0, a0 + prefix, b0, b0 + prefix)
+    a0 += prefix
+    b0 += prefix
+    while a1 - suffix > a0 and b1 - suffix > b0 and equal(ctx, a1 - suffix - 1, b1 - suffix - 1):
+        suffix += 1
+    a1 -= suffix
+    b1 -= suffix
+
+    if a0 == a1 or b0 == b1:
+        _push_run(runs, OP_DELETE, a0, a1, b0, b0)
+        _push_run(runs, OP_INSERT, a1, a1, b0, b1)
+    elif b1 - b0 == 1:
+        p = a0
+        while p < a1 and not equal(ctx, p, b0):
+            p += 1
+        if p < a1:
+            _push_run(runs, OP_DELETE, a0, p, b0, b0)
+            _push_run(runs, OP_EQUAL, p, p + 1, b0, b1)
+            _push_run(runs, OP_DELETE, p + 1, a1, b1, b1)
+        else:
+            _push_run(runs, OP_DELETE, a0, a1, b0, b0)
+            _push_run(runs, OP_INSERT, a1, a1, b0, b1)
+    elif a1 - a0 == 1:
+        p = b0
+        while p < b1 and not equal(ctx, a0, p):
+            p += 1
+        if p < b1:
+            _push_run(runs, OP_INSERT, a0, a0, b0, p)
+            _push_run(runs, OP_EQUAL, a0, a1, p, p + 1)
+            _push_run(runs, OP_INSERT, a1, a1, p + 1, b1)
+        else:
+            _push_run(runs, OP_DELETE, a0, a1, b0, b0)
+            _push_run(runs, OP_INSERT, a1, a1, b0, b1)
+    else:
+        _token_bisect(equal, ctx, a0, a1, b0, b1, runs, deadline, degraded)
+
+    _push_run(runs, OP_EQUAL, a1, a1 + suffix, b1, b1 + suffix)
+    return 0
+
 
+cdef int _token_bisect(
+    _token_eq equal, void* ctx, Py_ssize_t a0, Py_ssize_t a1, Py_ssize_t b0, Py_ssize_t b1, list runs,
+    double deadline, list degraded,
+) except -1:
+    """The middle-snake bisection of ``_char_bisect`` over tokens compared with ``equal``."""
+    cdef:
+        Py_ssize_t n = a1 - a0
+        Py_ssize_t m = b1 - b0
+        Py_ssize_t max_d = (n + m + 1) // 2
+        Py_ssize_t v_offset = max_d
+        Py_ssize_t v_length = 2 * max_d + 2
+        Py_ssize_t delta = n - m
+        bint front = delta % 2 != 0
+        Py_ssize_t k1start = 0, k1end = 0, k2start = 0, k2end = 0
+        Py_ssize_t d, i, k1, k2, k1_offset, k2_offset, x1, y1, x2, y2
+        Py_ssize_t split_x = -1, split_y = -1
+        Py_ssize_t* v1 = <Py_ssize_t*> malloc(2 * v_length * sizeof(Py_ssize_t))
+        Py_ssize_t* v2
+
+    if not v1:
+        raise MemoryError()
+    _trace_alloc(2 * v_length * sizeof(Py_ssize_t))
+    v2 = v1 + v_length
+    for i in range(2 * v_length):
+        v1[i] = -1
+    v1[v_offset + 1] = 0
+    v2[v_offset + 1] = 0
+
+    try:
+        for d in range(max_d):
+            if _expired(deadline):
+                _degrade(degraded, "region")
+                break
+
+            # Forward path
+            k1 = -d + k1start
+            while k1 <= d - k1end and split_x < 0:
+                k1_offset = v_offset + k1
+                if k1 == -d or (k1 != d and v1[k1_offset - 1] < v1[k1_offset + 1]):
+                    x1 = v1[k1_offset + 1]
+                else:
+                    x1 = v1[k1_offset - 1] + 1
+                y1 = x1 - k1
+                while x1 < n and y1 < m and equal(ctx, a0 + x1, b0 + y1):
+                    x1 += 1
+                    y1 += 1
+                v1[k1_offset] = x1
+                if x1 > n:
+                    k1end += 2
+                elif y1 > m:
+                    k1start += 2
+                elif front:
+                    k2_offset = v_offset + delta - k1
+                    if 0 <= k2_offset < v_length and v2[k2_offset] != -1 and x1 >= n - v2[k2_offset]:
+                        split_x, split_y = x1, y1
+                k1 += 2
+            if split_x >= 0:
+                break
+
+            # Reverse path
+            k2 = -d + k2start
+            while k2 <= d - k2end and split_x < 0:
+                k2_offset = v_offset + k2
+                if k2 == -d or (k2 != d and v2[k2_offset - 1] < v2[k2_offset + 1]):
+                    x2 = v2[k2_offset + 1]
+                else:
+                    x2 = v2[k2_offset - 1] + 1
+                y2 = x2 - k2
+                while x2 < n and y2 < m and equal(ctx, a1 - x2 - 1, b1 - y2 - 1):
+                    x2 += 1
+                    y2 += 1
+                v2[k2_offset] = x2
+                if x2 > n:
+                    k2end += 2
+                elif y2 > m:
+                    k2start += 2
+                elif not front:
+                    k1_offset = v_offset + delta - k2
+                    if 0 <= k1_offset < v_length and v1[k1_offset] != -1:
+                        x1 = v1[k1_offset]
+                        if x1 >= n - x2:
+                            split_x, split_y = x1, v_offset + x1 - k1_offset
+                k2 += 2
+            if split_x >= 0:
+                break
     finally:
-        if V1: free(V1)
-        if V2: free(V2)
+        free(v1)
+        _trace_free(2 * v_length * sizeof(Py_ssize_t))
+
+    if split_x < 0:
+        _push_run(runs, OP_DELETE, a0, a1, b0, b0)
+        _push_run(runs, OP_INSERT, a1, a1, b0, b1)
+        return 0
+    _token_diff(equal, ctx, a0, a0 + split_x, b0, b0 + split_y, runs, deadline, degraded)
+    _token_diff(equal, ctx, a0 + split_x, a1, b0 + split_y, b1, runs, deadline, degraded)
+    return 0
 
-    return _backtrack_fast(words1, words2, trace, offset, size)
 
+cdef inline void _close_run(list runs, int op, Py_ssize_t x, Py_ssize_t y, Py_ssize_t run_x, Py_ssize_t run_y):
+    if op != OP_NONE:
+        runs.append((_OP_TAGS[op], x, run_x, y, run_y))
 
-cdef list _backtrack_fast(list words1, list words2, list trace, int offset, Py_ssize_t size):
+
+cdef list _backtrack_fast(Py_ssize_t N, Py_ssize_t M, list trace):
     """
     Backtrack through the diff trace to construct an edit script that transforms words1 into words2.
 
@@ -206,32 +1056,31 @@ cdef list _backtrack_fast(list words1, list words2, list trace, int offset, Py_s
     to determine the optimal path through the edit graph.
 
     Parameters:
-        words1 (list): The original list of tokens
-        words2 (list): The modified list of tokens
-        trace (list): List of PyCapsules containing snapshots of the V vector at each edit step
-        offset (int): The offset used to index into V vectors (V[k+offset] where k is the diagonal)
-        size (Py_ssize_t): The size of the V vectors
+        N (Py_ssize_t): The number of tokens of the original sequence
+        M (Py_ssize_t): The number of tokens of the modified sequence
+        trace (list): List of PyCapsules containing snapshots of the V vector at each edit step;
+            snapshot d holds diagonals -d..d, diagonal k at index k + d
 
     Returns:
-        list: A list of tuples (operation, token) where operation is one of
-              "equal", "insert", or "delete", and token is the affected token.
+        list: Runs ``(operation, i1, i2, j1, j2)`` where operation is one of "equal", "insert",
+              or "delete" and the ranges are the affected token indices of each sequence.
     """
     cdef:
-        list script = []
-        Py_ssize_t x = len(words1)
-        Py_ssize_t y = len(words2)
+        list runs = []
+        Py_ssize_t x = N
+        Py_ssize_t y = M
         Py_ssize_t n_trace = len(trace)
-        Py_ssize_t d, k, prev_k, prev_x, prev_y, snake_len, i
+        Py_ssize_t d, k, prev_k, prev_x, prev_y, snake_len, offset, size
+        Py_ssize_t run_x = x, run_y = y
         int* v
         int left, right
-        bint is_insert
+        int op = OP_NONE, step
         int idx
-        cdef str tag_equal = "equal"
-        cdef str tag_insert = "insert"
-        cdef str tag_delete = "delete"
 
     for d in range(n_trace - 1, 0, -1):
         v = <int*> PyCapsule_GetPointer(trace[d - 1], b"V_ptr")
+        offset = d - 1
+        size = 2 * d - 1
         k = x - y
         idx = (k - 1) + offset
         left = -1 if idx < 0 or idx >= size else v[idx]
@@ -241,32 +1090,310 @@ cdef list _backtrack_fast(list words1, list words2, list trace, int offset, Py_s
             prev_k = k + 1
             idx = prev_k + offset
             prev_x = 0 if idx < 0 or idx >= size else v[idx]
-            is_insert = True
+            step = OP_INSERT
         else:
             prev_k = k - 1
             idx = prev_k + offset
-            prev_x = 0 if idx < 0 or idx >= size else v[idx] + 1
-            is_insert = False
+            prev_x = 0 if idx < 0 or idx >= size else v[idx]
+            step = OP_DELETE
         prev_y = prev_x - prev_k
-        snake_len = x - prev_x if (x - prev_x) < (y - prev_y) else y - prev_y
-        for i in range(snake_len):
-            x -= 1
+        # The snake runs from the point right after the insertion or deletion up to (x, y)
+        snake_len = x - prev_x if step == OP_INSERT else y - prev_y
+        if snake_len > 0:
+            if op != OP_EQUAL:
+                _close_run(runs, op, x, y, run_x, run_y)
+                op, run_x, run_y = OP_EQUAL, x, y
+            x -= snake_len
+            y -= snake_len
+        if op != step:
+            _close_run(runs, op, x, y, run_x, run_y)
+            op, run_x, run_y = step, x, y
+        if step == OP_INSERT:
             y -= 1
-            script.append((tag_equal, words1[x]))
-        if is_insert:
-            y -= 1
-            script.append((tag_insert, words2[y]))
         else:
             x -= 1
-            script.append((tag_delete, words1[x]))
 
-    snake_len = x if x < y else y
-    for i in range(snake_len):
-        x -= 1
-        y -= 1
-        script.append((tag_equal, words1[x]))
-    script.reverse()
+    if x > 0 and op != OP_EQUAL:
+        _close_run(runs, op, x, y, run_x, run_y)
+        op, run_x, run_y = OP_EQUAL, x, y
+    _close_run(runs, op, 0, 0, run_x, run_y)
+    runs.reverse()
+    return runs
 
-    for capsule in trace:
-        free(<int*> PyCapsule_GetPointer(capsule, b"V_ptr"))
-    return script
+
+cdef list _group_runs(list runs):
+    """Merge the alternating delete and insert runs of every changed stretch into difflib opcodes."""
+    cdef list opcodes = []
+    cdef Py_ssize_t i1, i2, j1, j2, c1 = 0, c2 = 0
+    cdef bint changed = False
+    cdef str tag
+
+    for tag, i1, i2, j1, j2 in runs:
+        if tag == "equal":
+            if changed:
+                opcodes.append(_change_opcode(c1, i1, c2, j1))
+                changed = False
+            opcodes.append((tag, i1, i2, j1, j2))
+        elif not changed:
+            c1, c2 = i1, j1
+            changed = True
+    if changed:
+        i2, j2 = runs[len(runs) - 1][2], runs[len(runs) - 1][4]
+        opcodes.append(_change_opcode(c1, i2, c2, j2))
+    return opcodes
+
+
+cdef inline tuple _change_opcode(Py_ssize_t i1, Py_ssize_t i2, Py_ssize_t j1, Py_ssize_t j2):
+    if i1 == i2:
+        return ("insert", i1, i2, j1, j2)
+    if j1 == j2:
+        return ("delete", i1, i2, j1, j2)
+    return ("replace", i1, i2, j1, j2)
+
+
+# ---------------------------------------------------------------------
+# Character-level diff
+# ---------------------------------------------------------------------
+
+cdef void _push_run(list runs, int op, Py_ssize_t i1, Py_ssize_t i2, Py_ssize_t j1, Py_ssize_t j2) except *:
+    """Append a run, extending the last one when it has the same operation."""
+    cdef tuple last
+    if i1 == i2 and j1 == j2:
+        return
+    if runs:
+        last = runs[len(runs) - 1]
+        if last[0] is _OP_TAGS[op]:
+            runs[len(runs) - 1] = (last[0], last[1], i2, last[3], j2)
+            return
+    runs.append((_OP_TAGS[op], i1, i2, j1, j2))
+
+
+cdef int _char_diff(
+    const Py_UCS4* a, Py_ssize_t a0, Py_ssize_t a1, const Py_UCS4* b, Py_ssize_t b0, Py_ssize_t b1, list runs,
+    double deadline, list degraded,
+) except -1:
+    """Diff ``a[a0:a1]`` against ``b[b0:b1]``, appending runs in order."""
+    cdef Py_ssize_t prefix = 0, suffix = 0, p
+
+    while a0 + prefix < a1 and b0 + prefix < b1 and a[a0 + prefix] == b[b0 + prefix]:
+        prefix += 1
+    _push_run(runs, OP_EQUAL, a0, a0 + prefix, b0, b0 + prefix)
+    a0 += prefix
+    b0 += prefix
+    while a1 - suffix > a0 and b1 - suffix > b0 and a[a1 - suffix - 1] == b[b1 - suffix - 1]:
+        suffix += 1
+    a1 -= suffix
+    b1 -= suffix
+
+    if a0 == a1 or b0 == b1:
+        _push_run(runs, OP_DELETE, a0, a1, b0, b0)
+        _push_run(runs, OP_INSERT, a1, a1, b0, b1)
+    elif b1 - b0 == 1:
+        # A single character is either kept once or replaced
+        p = a0
+        while p < a1 and a[p] != b[b0]:
+            p += 1
+        if p < a1:
+            _push_run(runs, OP_DELETE, a0, p, b0, b0)
+            _push_run(runs, OP_EQUAL, p, p + 1, b0, b1)
+            _push_run(runs, OP_DELETE, p + 1, a1, b1, b1)
+        else:
+            _push_run(runs, OP_DELETE, a0, a1, b0, b0)
+            _push_run(runs, OP_INSERT, a1, a1, b0, b1)
+    elif a1 - a0 == 1:
+        p = b0
+        while p < b1 and b[p] != a[a0]:
+            p += 1
+        if p < b1:
+            _push_run(runs, OP_INSERT, a0, a0, b0, p)
+            _push_run(runs, OP_EQUAL, a0, a1, p, p + 1)
+            _push_run(runs, OP_INSERT, a1, a1, p + 1, b1)
+        else:
+            _push_run(runs, OP_DELETE, a0, a1, b0, b0)
+            _push_run(runs, OP_INSERT, a1, a1, b0, b1)
+    else:
+        _char_bisect(a, a0, a1, b, b0, b1, runs, deadline, degraded)
+
+    _push_run(runs, OP_EQUAL, a1, a1 + suffix, b1, b1 + suffix)
+    return 0
+
+
+cdef int _char_bisect(
+    const Py_UCS4* a, Py_ssize_t a0, Py_ssize_t a1, const Py_UCS4* b, Py_ssize_t b0, Py_ssize_t b1, list runs,
+    double deadline, list degraded,
+) except -1:
+    """
+    Find the middle snake of the two ranges by walking the edit graph from both ends at once, then
+    diff the halves before and after it. Only two diagonal vectors are kept, so space stays linear.
+    Past the ``deadline`` the ranges are replaced as a whole, like ranges with nothing in common.
+    """
+    cdef:
+        Py_ssize_t n = a1 - a0
+        Py_ssize_t m = b1 - b0
+        Py_ssize_t max_d = (n + m + 1) // 2
+        Py_ssize_t v_offset = max_d
+        Py_ssize_t v_length = 2 * max_d + 2
+        Py_ssize_t delta = n - m
+        bint front = delta % 2 != 0
+        Py_ssize_t k1start = 0, k1end = 0, k2start = 0, k2end = 0
+        Py_ssize_t d, i, k1, k2, k1_offset, k2_offset, x1, y1, x2, y2
+        Py_ssize_t split_x = -1, split_y = -1
+        Py_ssize_t* v1 = <Py_ssize_t*> malloc(2 * v_length * sizeof(Py_ssize_t))
+        Py_ssize_t* v2
+
+    if not v1:
+        raise MemoryError()
+    _trace_alloc(2 * v_length * sizeof(Py_ssize_t))
+    v2 = v1 + v_length
+    for i in range(2 * v_length):
+        v1[i] = -1
+    v1[v_offset + 1] = 0
+    v2[v_offset + 1] = 0
+
+    try:
+        for d in range(max_d):
+            if _expired(deadline):
+                _degrade(degraded, "region")
+                break
+
+            # Forward path
+            k1 = -d + k1start
+            while k1 <= d - k1end and split_x < 0:
+                k1_offset = v_offset + k1
+                if k1 == -d or (k1 != d and v1[k1_offset - 1] < v1[k1_offset + 1]):
+                    x1 = v1[k1_offset + 1]
+                else:
+                    x1 = v1[k1_offset - 1] + 1
+                y1 = x1 - k1
+                while x1 < n and y1 < m and a[a0 + x1] == b[b0 + y1]:
+                    x1 += 1
+                    y1 += 1
+                v1[k1_offset] = x1
+                if x1 > n:
+                    k1end += 2
+                elif y1 > m:
+                    k1start += 2
+                elif front:
+                    k2_offset = v_offset + delta - k1
+                    if 0 <= k2_offset < v_length and v2[k2_offset] != -1 and x1 >= n - v2[k2_offset]:
+                        split_x, split_y = x1, y1
+                k1 += 2
+            if split_x >= 0:
+                break
+
+            # Reverse path
+            k2 = -d + k2start
+            while k2 <= d - k2end and split_x < 0:
+                k2_offset = v_offset + k2
+                if k2 == -d or (k2 != d and v2[k2_offset - 1] < v2[k2_offset + 1]):
+                    x2 = v2[k2_offset + 1]
+                else:
+                    x2 = v2[k2_offset - 1] + 1
+                y2 = x2 - k2
+                while x2 < n and y2 < m and a[a1 - x2 - 1] == b[b1 - y2 - 1]:
+                    x2 += 1
+                    y2 += 1
+                v2[k2_offset] = x2
+                if x2 > n:
+                    k2end += 2
+                elif y2 > m:
+                    k2start += 2
+                elif not front:
+                    k1_offset = v_offset + delta - k2
+                    if 0 <= k1_offset < v_length and v1[k1_offset] != -1:
+                        x1 = v1[k1_offset]
+                        if x1 >= n - x2:
+                            split_x, split_y = x1, v_offset + x1 - k1_offset
+                k2 += 2
+            if split_x >= 0:
+                break
+    finally:
+        free(v1)
+        _trace_free(2 * v_length * sizeof(Py_ssize_t))
+
+    if split_x < 0:
+        # Nothing in common, or no time left to find it
+        _push_run(runs, OP_DELETE, a0, a1, b0, b0)
+        _push_run(runs, OP_INSERT, a1, a1, b0, b1)
+        return 0
+    _char_diff(a, a0, a0 + split_x, b, b0, b0 + split_y, runs, deadline, degraded)
+    _char_diff(a, a0 + split_x, a1, b, b0 + split_y, b1, runs, deadline, degraded)
+    return 0
+
+
+cdef list _cleanup_semantic(list opcodes):
+    """
+    Merge changes separated by trivial equalities, as the semantic cleanup of diff-match-patch does.
+
+    An equality is dropped when it is no longer than the changes on either side of it, so two
+    unrelated words read as one replacement rather than a scatter of shared letters.
+    After a merge the scan resumes two equalities back, which keeps the pass linear in practice.
+    """
+    cdef list ops = opcodes
+    cdef list equalities = []
+    cdef Py_ssize_t pointer = 0, e, last_len = -1
+    cdef Py_ssize_t ins1 = 0, del1 = 0, ins2 = 0, del2 = 0
+    cdef tuple op, before, after
+
+    while pointer < len(ops):
+        op = ops[pointer]
+        if op[0] == "equal":
+            equalities.append(pointer)
+            ins1, del1, ins2, del2 = ins2, del2, 0, 0
+            last_len = op[2] - op[1]
+        else:
+            del2 += op[2] - op[1]
+            ins2 += op[4] - op[3]
+            if 0 <= last_len <= max(ins1, del1) and last_len <= max(ins2, del2):
+                e = equalities.pop()
+                before = ops[e - 1]
+                after = ops[e + 1]
+                ops[e - 1:e + 2] = [_change_opcode(before[1], after[2], before[3], after[4])]
+                if equalities:
+                    equalities.pop()
+                pointer = equalities[len(equalities) - 1] if equalities else -1
+                ins1 = del1 = ins2 = del2 = 0
+                last_len = -1
+        pointer += 1
+    return ops
+
+
+cdef list _char_opcodes(
+    str original, str updated, bint ignore_case, bint ignore_space, double deadline=0.0, list degraded=None,
+    Py_ssize_t max_memory=0,
+):
+    """Diff two lines character by character and return cleaned-up difflib-style opcodes."""
+    cdef Py_ssize_t n = len(original), m = len(updated), i
+    cdef Py_UCS4* a = NULL
+    cdef Py_UCS4* b = NULL
+    cdef list runs = []
+    # UCS-4 copies of both lines, plus the two diagonal vectors of the outermost bisection
+    cdef Py_ssize_t required = (n + m) * sizeof(Py_UCS4) + 2 * (n + m + 4) * sizeof(Py_ssize_t)
+
+    if max_memory and required > max_memory:
+        raise MemoryBudgetError(
+            f"Diffing {n} against {m} characters needs {required} bytes, over the budget of {max_memory}",
+            required,
+            max_memory,
+        )
+
+    a = PyUnicode_AsUCS4Copy(original)
+    try:
+        b = PyUnicode_AsUCS4Copy(updated)
+        if ignore_case or ignore_space:
+            for i in range(n):
+                a[i] = 32 if ignore_space and Py_UNICODE_ISSPACE(a[i]) else (
+                    Py_UNICODE_TOLOWER(a[i]) if ignore_case else a[i]
+                )
+            for i in range(m):
+                b[i] = 32 if ignore_space and Py_UNICODE_ISSPACE(b[i]) else (
+                    Py_UNICODE_TOLOWER(b[i]) if ignore_case else b[i]
+                )
+        _char_diff(a, 0, n, b, 0, m, runs, deadline, degraded)
+    finally:
+        PyMem_Free(a)
+        if b:
+            PyMem_Free(b)
+    if not runs:
+        return []
+    return _cleanup_semantic(_group_runs(runs))
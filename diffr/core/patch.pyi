@@ -0,0 +1,6 @@
+class PatchError(ValueError):
+    hunk_index: int
+    def __init__(self, message: str, hunk_index: int) -> None: ...
+
+def apply(original: str, diff: dict, reverse: bool = False, fuzz: int = 0, max_offset: int = 0) -> str: ...
+def apply_unified(original: str, patch_text: str, reverse: bool = False, fuzz: int = 0, max_offset: int = 0) -> str: ...
@@ -0,0 +1,274 @@
+import re
+
+# ---------------------------------------------------------------------
+# Patch application
+# ---------------------------------------------------------------------
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class PatchError(ValueError):
+    """Raised when a hunk cannot be located in the text it is applied to."""
+
+    def __init__(self, message, hunk_index):
+        super().__init__(message)
+        self.hunk_index = hunk_index
+
+
+cdef class _PatchHunk:
+    cdef public Py_ssize_t old_start
+    cdef public list old_lines
+    cdef public list new_lines
+    cdef public Py_ssize_t leading
+    cdef public Py_ssize_t trailing
+    cdef public object old_eol
+    cdef public object new_eol
+
+    def __init__(self, Py_ssize_t old_start, list old_lines, list new_lines,
+                 Py_ssize_t leading=0, Py_ssize_t trailing=0, object old_eol=None, object new_eol=None):
+        self.old_start = old_start
+        self.old_lines = old_lines
+        self.new_lines = new_lines
+        self.leading = leading
+        self.trailing = trailing
+        self.old_eol = old_eol
+        self.new_eol = new_eol
+
+    cdef _PatchHunk reversed(self, Py_ssize_t new_start):
+        return _PatchHunk(
+            new_start, self.new_lines, self.old_lines, self.leading, self.trailing, self.new_eol, self.old_eol
+        )
+
+
+cdef list _hunks_from_diff(dict diff, bint reverse):
+    """Convert ``diff_hunks`` output into patch hunks; diffr hunks carry no context lines."""
+    cdef list hunks = []
+    cdef list old_lines, new_lines
+    cdef dict missing = diff.get("no_newline_at_end")
+    # Without the record, both texts end with a newline or the diff predates it
+    cdef object old_eol = None if missing is None else "old" not in missing
+    cdef object new_eol = None if missing is None else "new" not in missing
+    for hunk in diff.get("hunks", []):
+        old_lines = []
+        new_lines = []
+        for entry in hunk["lines"]:
+            if entry["type"] == "equal":
+                old_lines.append(entry["content"])
+                new_lines.append(entry["content"])
+                continue
+            if "content_old" in entry:
+                old_lines.append(entry["content_old"])
+            if "content_new" in entry:
+                new_lines.append(entry["content_new"])
+        patch_hunk = _PatchHunk(hunk["old_range"]["start"] - 1, old_lines, new_lines, 0, 0, old_eol, new_eol)
+        hunks.append(patch_hunk.reversed(hunk["new_range"]["start"] - 1) if reverse else patch_hunk)
+    return hunks
+
+
+cdef list _hunks_from_unified(str patch_text, bint reverse):
+    """Parse the hunks of a single-file unified diff, ignoring file headers and trailing garbage."""
+    cdef list hunks = []
+    cdef list lines = patch_text.splitlines()
+    cdef Py_ssize_t i = 0, n = len(lines)
+    cdef Py_ssize_t old_count, new_count, old_seen, new_seen, leading, trailing
+    cdef list old_lines, new_lines
+    cdef str line, tag, last_tag
+    cdef bint changed
+
+    while i < n:
+        match = _HUNK_HEADER.match(lines[i])
+        i += 1
+        if match is None:
+            continue
+
+        old_count = int(match.group(2)) if match.group(2) is not None else 1
+        new_count = int(match.group(4)) if match.group(4) is not None else 1
+        old_start = int(match.group(1)) - (1 if old_count else 0)
+        new_start = int(match.group(3)) - (1 if new_count else 0)
+        old_lines = []
+        new_lines = []
+        old_seen = new_seen = leading = trailing = 0
+        changed = False
+        old_eol = new_eol = True
+        last_tag = " "
+
+        while i < n and (old_seen < old_count or new_seen < new_count or lines[i].startswith("\\")):
+            line = lines[i]
+            i += 1
+            if line.startswith("\\"):
+                # "\ No newline at end of file" refers to the side of the previous line
+                if last_tag != "+":
+                    old_eol = False
+                if last_tag != "-":
+                    new_eol = False
+                continue
+            tag = line[:1] or " "
+            if tag == " ":
+                old_lines.append(line[1:])
+                new_lines.append(line[1:])
+                old_seen += 1
+                new_seen += 1
+                if changed:
+                    trailing += 1
+                else:
+                    leading += 1
+            elif tag == "-":
+                old_lines.append(line[1:])
+                old_seen += 1
+                changed = True
+                trailing = 0
+            elif tag == "+":
+                new_lines.append(line[1:])
+                new_seen += 1
+                changed = True
+                trailing = 0
+            else:
+                raise PatchError(f"Malformed line in hunk {len(hunks)}: {line!r}", len(hunks))
+            last_tag = tag
+
+        if old_seen != old_count or new_seen != new_count:
+            raise PatchError(f"Hunk {len(hunks)} is truncated", len(hunks))
+
+        patch_hunk = _PatchHunk(old_start, old_lines, new_lines, leading, trailing, old_eol, new_eol)
+        hunks.append(patch_hunk.reversed(new_start) if reverse else patch_hunk)
+
+    return hunks
+
+
+cdef bint _matches(list lines, Py_ssize_t pos, list expected, Py_ssize_t lo, Py_ssize_t hi):
+    cdef Py_ssize_t k
+    if pos < 0 or pos + (hi - lo) > len(lines):
+        return False
+    for k in range(lo, hi):
+        if lines[pos + k - lo] != expected[k]:
+            return False
+    return True
+
+
+cdef tuple _locate(
+    list lines, _PatchHunk hunk, Py_ssize_t expected, Py_ssize_t lower, int fuzz, Py_ssize_t max_offset
+):
+    """
+    Find where ``hunk`` applies, returning ``(position, skipped_leading, skipped_trailing)`` or ``None``.
+
+    Positions are tried at growing distance from ``expected``, never before ``lower``. With fuzz,
+    up to ``fuzz`` context lines are dropped from each end of the hunk before searching again.
+    """
+    cdef Py_ssize_t n_old = len(hunk.old_lines)
+    cdef Py_ssize_t n_lines = len(lines)
+    cdef Py_ssize_t limit, delta, pos, f, skip_lead, skip_trail
+    limit = max_offset if max_offset >= 0 else n_lines
+
+    for f in range(fuzz + 1):
+        skip_lead = min(f, hunk.leading)
+        skip_trail = min(f, hunk.trailing)
+        if f and skip_lead + skip_trail == 0:
+            break
+        for delta in range(limit + 1):
+            pos = expected + skip_lead + delta
+            if pos >= lower and _matches(lines, pos, hunk.old_lines, skip_lead, n_old - skip_trail):
+                return pos - skip_lead, skip_lead, skip_trail
+            pos = expected + skip_lead - delta
+            if delta and pos >= lower and _matches(lines, pos, hunk.old_lines, skip_lead, n_old - skip_trail):
+                return pos - skip_lead, skip_lead, skip_trail
+            if expected + delta > n_lines and expected - delta < lower:
+                break
+    return None
+
+
+cdef str _apply_hunks(str original, list hunks, int fuzz, Py_ssize_t max_offset):
+    cdef list raw_lines = original.splitlines(True)
+    cdef list lines = [line.rstrip("\r\n") for line in raw_lines]
+    cdef Py_ssize_t n_lines = len(lines)
+    cdef list offsets = [0] * (n_lines + 1)
+    cdef list pieces = []
+    cdef Py_ssize_t i, pos, cur = 0, shift = 0, skip_lead, skip_trail, end
+    cdef _PatchHunk hunk
+    cdef str eol = "\n"
+    cdef bint ends_with_eol = bool(raw_lines) and raw_lines[n_lines - 1] != lines[n_lines - 1]
+    cdef object final_eol = None
+
+    # Line-offset array: unchanged stretches are copied as single slices of the original text
+    for i in range(n_lines):
+        offsets[i + 1] = offsets[i] + len(raw_lines[i])
+    if n_lines and raw_lines[0].endswith("\r\n"):
+        eol = "\r\n"
+
+    for i in range(len(hunks)):
+        hunk = hunks[i]
+        found = _locate(lines, hunk, hunk.old_start + shift, cur, fuzz, max_offset)
+        if found is None:
+            raise PatchError(f"Hunk {i} does not apply at line {hunk.old_start + 1}", i)
+        pos, skip_lead, skip_trail = found
+
+        # Context lines dropped by fuzz are kept from the original, not rewritten
+        end = pos + len(hunk.old_lines)
+        pieces.append(original[offsets[cur]:offsets[pos + skip_lead]])
+        if pos + skip_lead == n_lines and n_lines and not ends_with_eol:
+            # Appending after a last line that has no newline of its own
+            pieces.append(eol)
+        for line in hunk.new_lines[skip_lead:len(hunk.new_lines) - skip_trail]:
+            pieces.append(line)
+            pieces.append(eol)
+        if skip_trail:
+            pieces.append(original[offsets[end - skip_trail]:offsets[end]])
+        cur = end
+        shift = pos - hunk.old_start
+        if cur == n_lines:
+            final_eol = hunk.new_eol
+
+    pieces.append(original[offsets[cur]:offsets[n_lines]])
+    result = "".join(pieces)
+
+    # When the last hunk reaches the end, the result only lacks a final newline if the patch says so
+    # or, for diffr hunks that do not record it, if the original lacked one too
+    if cur == n_lines and hunks and result.endswith(eol):
+        if final_eol is False or (final_eol is None and n_lines and not ends_with_eol):
+            result = result[:len(result) - len(eol)]
+    return result
+
+
+cpdef str apply(str original, dict diff, bint reverse=False, int fuzz=0, Py_ssize_t max_offset=0):
+    """
+    Apply the output of ``diff_hunks`` to ``original`` and return the updated text.
+
+    Unchanged lines, including their line endings, are copied from ``original`` through a table of
+    line offsets, so the cost is linear in the size of the text plus the size of the diff. The
+    final newline is added or dropped as recorded in the ``no_newline_at_end`` of the diff.
+
+    Parameters:
+        original (str): The text the diff was computed against (or its result when reversing)
+        diff (dict): A diff as returned by ``diff_hunks``
+        reverse (bool): Undo the diff instead, turning the updated text back into the original
+        fuzz (int): Number of context lines that may be ignored at each end of a hunk
+        max_offset (int): How many lines away from its recorded position a hunk may be found;
+            negative searches the whole text
+
+    Returns:
+        str: The patched text
+
+    Raises:
+        PatchError: If a hunk does not match the text
+    """
+    return _apply_hunks(original, _hunks_from_diff(diff, reverse), fuzz, max_offset)
+
+
+cpdef str apply_unified(str original, str patch_text, bint reverse=False, int fuzz=0, Py_ssize_t max_offset=0):
+    """
+    Apply a single-file unified diff, such as the ``unified`` output of ``diffr.render``, to ``original``.
+
+    Parameters:
+        original (str): The text to patch
+        patch_text (str): The unified diff; file headers and lines outside of hunks are ignored
+        reverse (bool): Apply the patch in reverse, like ``patch -R``
+        fuzz (int): Number of context lines that may be ignored at each end of a hunk
+        max_offset (int): How many lines away from its recorded position a hunk may be found;
+            negative searches the whole text
+
+    Returns:
+        str: The patched text
+
+    Raises:
+        PatchError: If the patch is malformed or a hunk does not match the text
+    """
+    return _apply_hunks(original, _hunks_from_unified(patch_text, reverse), fuzz, max_offset)
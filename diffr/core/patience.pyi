@@ -1 +1,31 @@
-def diff_hunks(a: str, b: str, threshold: float) -> list: ...
+from typing import Protocol
+
+from .myers import DiffStats
+
+class _Cancel(Protocol):
+    def is_set(self) -> bool: ...
+
+NUMPY_THRESHOLD: int
+
+class DiffCancelledError(Exception): ...
+
+def set_numpy_threshold(lines: int | None) -> int | None: ...
+def get_numpy_threshold() -> int | None: ...
+def diff_hunks(
+    a: str,
+    b: str,
+    threshold: float = 0.4,
+    detect_moves: bool = False,
+    min_move_lines: int = 3,
+    ignore_case: bool = False,
+    ignore_all_space: bool = False,
+    ignore_space_change: bool = False,
+    ignore_blank_lines: bool = False,
+    tokenizer: str = "word",
+    granularity: str = "token",
+    deadline: float | None = None,
+    timeout_ms: float | None = None,
+    max_memory: int | None = None,
+    stats: bool | DiffStats = False,
+    cancel: _Cancel | None = None,
+) -> dict: ...
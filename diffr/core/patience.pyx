@@ -1,43 +1,267 @@
+from libc.stdint cimport int64_t
+from libc.stdlib cimport malloc, free
+
+import re
+from time import monotonic, perf_counter
 from typing import List, Tuple, Dict, Any
-from .myers import diff_line
+from .myers import (
+    GRANULARITIES,
+    DiffStats,
+    _resolve_deadline,
+    _text_runs,
+    diff_line,
+    diff_line_spans,
+    tokenize_spans,
+    trace_memory,
+)
+
+# Comparison flags, combined into the ``flags`` argument of the internal helpers
+IGNORE_CASE = 1
+IGNORE_ALL_SPACE = 2
+IGNORE_SPACE_CHANGE = 4
+IGNORE_BLANK_LINES = 8
+
+_SPACE_RUN = re.compile(r"\s+")
+
+# Ways a diff under a time budget can give up precision, from the mildest to the coarsest
+DEGRADATIONS = ("inline", "lines", "region")
+
+# Regions of at least this many lines, both sides together, look for anchors over NumPy arrays when
+# NumPy is installed; below it, building the arrays costs more than the dicts it replaces
+NUMPY_THRESHOLD = 1_000
+
+cdef Py_ssize_t _numpy_threshold = NUMPY_THRESHOLD
+
+# NumPy takes longer to import than most diffs take, so it is imported for the first large region:
+# False until then, None when it is not installed
+_np = False
+
+
+cdef object _numpy():
+    global _np
+    if _np is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _np = numpy
+    return _np
+
+
+class DiffCancelledError(Exception):
+    """Raised at the next checkpoint of a diff once its ``cancel`` event is set."""
+
+
+cdef inline bint _expired(double deadline) except -1:
+    return deadline != 0.0 and monotonic() >= deadline
+
+
+cdef inline void _check_cancel(object cancel) except *:
+    # ``cancel`` is anything with an ``is_set()`` method, like ``threading.Event``
+    if cancel is not None and cancel.is_set():
+        raise DiffCancelledError("The diff was cancelled")
+
+
+cdef inline void _degrade(list degraded, str stage) except *:
+    if degraded is not None and stage not in degraded:
+        degraded.append(stage)
 
 # ---------------------------------------------------------------------
 # Patience diff functions (line-level)
 # ---------------------------------------------------------------------
 
-cpdef list _compute_raw_diff(str original, str updated):
+cpdef int _comparison_flags(
+    bint ignore_case=False, bint ignore_all_space=False, bint ignore_space_change=False, bint ignore_blank_lines=False
+):
+    return (
+        (IGNORE_CASE if ignore_case else 0)
+        | (IGNORE_ALL_SPACE if ignore_all_space else 0)
+        | (IGNORE_SPACE_CHANGE if ignore_space_change else 0)
+        | (IGNORE_BLANK_LINES if ignore_blank_lines else 0)
+    )
+
+
+cdef list _line_keys(list lines, int flags):
+    """Normalized comparison key of every line, computed once so the recursion compares keys only."""
+    cdef list keys = []
+    cdef str line
+    for line in lines:
+        if flags & IGNORE_ALL_SPACE:
+            line = "".join(line.split())
+        elif flags & IGNORE_SPACE_CHANGE:
+            line = _SPACE_RUN.sub(" ", line.rstrip())
+        if flags & IGNORE_CASE:
+            line = line.casefold()
+        keys.append(line)
+    return keys
+
+
+cpdef list _compute_raw_diff(
+    str original, str updated, int flags=0, double deadline=0.0, list degraded=None, object stats=None,
+    object cancel=None,
+):
+    cdef double start = perf_counter() if stats is not None else 0.0, anchors = 0.0
     cdef list orig_lines = original.splitlines(True)  # Keep line endings
     cdef list upd_lines = updated.splitlines(True)    # Keep line endings
 
     # Strip line endings for comparison but preserve for output
     cdef list orig_stripped = [line.rstrip('\r\n') for line in orig_lines]
     cdef list upd_stripped = [line.rstrip('\r\n') for line in upd_lines]
+    cdef list orig_keys = orig_stripped, upd_keys = upd_stripped
+    cdef list raw_keys, raw_diff
+    cdef Py_ssize_t o = 0, u = 0
+    cdef bint keyed = flags & (IGNORE_CASE | IGNORE_ALL_SPACE | IGNORE_SPACE_CHANGE)
+
+    if stats is not None:
+        start = _lap(stats, "split", start)
+    if keyed:
+        orig_keys = _line_keys(orig_stripped, flags)
+        upd_keys = _line_keys(upd_stripped, flags)
+        if stats is not None:
+            start = _lap(stats, "keys", start)
+    if _expired(deadline):
+        # No time left for the line diff at all: replace everything between the common ends
+        _degrade(degraded, "region")
+        raw_keys = _coarse_region(orig_keys, upd_keys, 0, len(orig_keys), 0, len(upd_keys), False)
+    else:
+        if stats is not None:
+            anchors = stats.timings.get("anchors", 0.0)
+        raw_keys = _diff_recursive(
+            orig_keys, upd_keys, 0, len(orig_keys), 0, len(upd_keys), deadline, degraded, stats, 1, cancel
+        )
+    if stats is not None:
+        # The anchor search was timed on its own inside the recursion
+        stats.add_time("recursion", perf_counter() - start - (stats.timings.get("anchors", 0.0) - anchors))
+        start = perf_counter()
+    if not keyed:
+        return raw_keys
+
+    # Put the original lines back; lines with equal keys become equal pairs
+    raw_diff = []
+    for orig_key, upd_key in raw_keys:
+        if orig_key is not None and upd_key is not None and orig_key == upd_key:
+            raw_diff.append((orig_stripped[o], orig_stripped[o]))
+        else:
+            raw_diff.append((
+                orig_stripped[o] if orig_key is not None else None,
+                upd_stripped[u] if upd_key is not None else None,
+            ))
+        if orig_key is not None:
+            o += 1
+        if upd_key is not None:
+            u += 1
+    if stats is not None:
+        _lap(stats, "keys", start)
+    return raw_diff
+
+
+cdef double _lap(object stats, str phase, double start) except? -1.0:
+    """Add the time since ``start`` to ``phase`` and return the current time."""
+    cdef double now = perf_counter()
+    stats.add_time(phase, now - start)
+    return now
+
+
+def set_numpy_threshold(lines):
+    """
+    Set the region size from which anchors are found with NumPy, ``NUMPY_THRESHOLD`` by default.
 
-    return _diff_recursive(orig_stripped, upd_stripped, 0, len(orig_stripped), 0, len(upd_stripped))
+    Parameters:
+        lines (int): Lines of both sides together, or None to never use NumPy
+
+    Returns:
+        int: The previous threshold, None when NumPy was not used
+    """
+    global _numpy_threshold
+    cdef Py_ssize_t previous = _numpy_threshold
+    if lines is not None and lines < 0:
+        raise ValueError(f"lines must not be negative, got {lines}")
+    _numpy_threshold = 0 if lines is None else max(1, lines)
+    return previous or None
+
+
+def get_numpy_threshold():
+    """The threshold set with ``set_numpy_threshold``, None when NumPy is not installed or not used."""
+    return _numpy_threshold or None if _numpy() is not None else None
 
 
 cdef list _diff_recursive(
     list orig, list upd,
     int ostart, int oend,
-    int ustart, int uend
+    int ustart, int uend,
+    double deadline=0.0, list degraded=None, object stats=None, int depth=1, object cancel=None
 ):
     cdef list result = []
-    cdef dict orig_uniques = {}
-    cdef dict upd_uniques = {}
-    cdef list common = []
-    cdef int i, j, o, u, total, equal
-    cdef float similarity
-    cdef list word_diff
-    cdef list lis
-    cdef list j_indices = []
+    cdef list anchors
+    cdef int i, j, o, u
+    cdef double start = 0.0
 
     # Base cases
     if ostart >= oend and ustart >= uend:
         return result
     elif ostart >= oend:
-        return [("", line) for line in upd[ustart:uend]]
+        return [(None, line) for line in upd[ustart:uend]]
     elif ustart >= uend:
-        return [(line, "") for line in orig[ostart:oend]]
+        return [(line, None) for line in orig[ostart:oend]]
+
+    _check_cancel(cancel)
+    if _expired(deadline):
+        # Out of time: skip the anchor search and pair the lines of this region in order
+        _degrade(degraded, "lines")
+        return _coarse_region(orig, upd, ostart, oend, ustart, uend, True)
+
+    if stats is not None:
+        stats.recursions += 1
+        if depth > stats.max_depth:
+            stats.max_depth = depth
+        start = perf_counter()
+
+    if _numpy_threshold and (oend - ostart) + (uend - ustart) >= _numpy_threshold and _numpy() is not None:
+        anchors = _numpy_anchors(orig, upd, ostart, oend, ustart, uend)
+    else:
+        anchors = _unique_anchors(orig, upd, ostart, oend, ustart, uend)
+    if stats is not None:
+        stats.add_time("anchors", perf_counter() - start)
+        stats.anchors += len(anchors)
+        stats.unanchored += not anchors
+
+    if not anchors:
+        # No common anchors, perform Myers-like line diff
+        o, u = ostart, ustart
+        while o < oend and u < uend:
+            result.append((orig[o], upd[u]))
+
+            o += 1
+            u += 1
+
+        # Add remaining lines
+        result.extend((line, None) for line in orig[o:oend])
+        result.extend((None, line) for line in upd[u:uend])
+        return result
+
+    # Recurse between anchors
+    cdef int prev_o = ostart
+    cdef int prev_u = ustart
+    for i, j in anchors:
+        result += _diff_recursive(orig, upd, prev_o, i, prev_u, j, deadline, degraded, stats, depth + 1, cancel)
+        result.append((orig[i], upd[j]))
+        prev_o = i + 1
+        prev_u = j + 1
+
+    # Add remaining after last anchor
+    result += _diff_recursive(orig, upd, prev_o, oend, prev_u, uend, deadline, degraded, stats, depth + 1, cancel)
+    return result
+
+
+cdef list _unique_anchors(list orig, list upd, int ostart, int oend, int ustart, int uend):
+    """
+    Pairs ``(i, j)`` of lines unique on both sides of the region that form the longest sequence in
+    the same order on both sides.
+    """
+    cdef dict orig_uniques = {}
+    cdef dict upd_uniques = {}
+    cdef list common = []
+    cdef int i, j
 
     # Find unique lines for anchoring
     for i in range(ostart, oend):
@@ -49,50 +273,135 @@ cdef list _diff_recursive(
         upd_uniques[line] = -1 if line in upd_uniques else j
 
     # Find common unique lines
-    common = []
     for line, i in orig_uniques.items():
         if i != -1 and (j := upd_uniques.get(line, -1)) != -1:
             common.append((i, j))
 
     # Find LIS of common indices
-    j_indices = [j for _, j in common]
-    lis = _longest_increasing_subsequence(j_indices)
-
-    if not lis:
-        # No common anchors, perform Myers-like line diff
-        o, u = ostart, ustart
-        while o < oend and u < uend:
+    cdef dict anchor_of = {j: i for i, j in common}
+    return [(anchor_of[j], j) for j in _longest_increasing_subsequence([j for _, j in common])]
+
+
+cdef list _numpy_anchors(list orig, list upd, int ostart, int oend, int ustart, int uend):
+    """
+    The anchors of ``_unique_anchors``, found over 64-bit line hashes with NumPy.
+
+    Every line is hashed once, and sorting the hashes of both sides together replaces the two dicts
+    keyed by the lines: a hash found exactly twice, once on each side, is a line unique on both.
+    Two different lines with the same hash can only hide an anchor, and the anchors kept are
+    compared as strings, so a collision never pairs different lines.
+    """
+    cdef Py_ssize_t n = oend - ostart, m = uend - ustart, p
+    cdef list anchors = []
+    cdef int i, j
+
+    hashes = _np.empty(n + m, dtype=_np.int64)
+    hashes[:n] = _np.fromiter(map(hash, orig[ostart:oend]), dtype=_np.int64, count=n)
+    hashes[n:] = _np.fromiter(map(hash, upd[ustart:uend]), dtype=_np.int64, count=m)
+    order = _np.argsort(hashes)
+    ordered = hashes[order]
+    # First position of every run of equal hashes in sorted order, and the length of the run
+    runs = _np.flatnonzero(_np.concatenate(([True], ordered[1:] != ordered[:n + m - 1])))
+    pairs = runs[_np.diff(_np.append(runs, n + m)) == 2]
+    first = _np.minimum(order[pairs], order[pairs + 1])
+    second = _np.maximum(order[pairs], order[pairs + 1])
+    both = (first < n) & (second >= n)
+
+    # Updated position of every candidate by original position, to list them in original order
+    match = _np.full(n, -1, dtype=_np.int64)
+    match[first[both]] = second[both] - n
+    candidates = _np.flatnonzero(match >= 0)
+    cdef const int64_t[::1] orig_pos = _np.ascontiguousarray(candidates, dtype=_np.int64)
+    cdef const int64_t[::1] upd_pos = _np.ascontiguousarray(match[candidates])
+
+    for p in _lis_positions(upd_pos):
+        i = ostart + orig_pos[p]
+        j = ustart + upd_pos[p]
+        if orig[i] == upd[j]:
+            anchors.append((i, j))
+    return anchors
+
+
+cdef list _lis_positions(const int64_t[::1] values):
+    """
+    Positions of a longest increasing subsequence of ``values``, the same one as
+    ``_longest_increasing_subsequence`` picks, computed over C arrays.
+    """
+    cdef Py_ssize_t n = values.shape[0], length = 0, pos, lo, hi, mid
+    cdef Py_ssize_t* tail_pos
+    cdef Py_ssize_t* prev
+    cdef list positions = []
+    if n == 0:
+        return positions
+
+    tail_pos = <Py_ssize_t*> malloc(2 * n * sizeof(Py_ssize_t))
+    if not tail_pos:
+        raise MemoryError()
+    prev = tail_pos + n
+    try:
+        for pos in range(n):
+            lo, hi = 0, length
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if values[tail_pos[mid]] < values[pos]:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            prev[pos] = tail_pos[lo - 1] if lo > 0 else -1
+            tail_pos[lo] = pos
+            if lo == length:
+                length += 1
+
+        pos = tail_pos[length - 1]
+        while pos != -1:
+            positions.append(pos)
+            pos = prev[pos]
+    finally:
+        free(tail_pos)
+    positions.reverse()
+    return positions
+
+
+cdef list _coarse_region(list orig, list upd, int ostart, int oend, int ustart, int uend, bint pair_lines):
+    """
+    Diff a region without searching for anchors. Lines shared at both ends stay equal; the lines
+    between them are paired in order when ``pair_lines`` is set, and otherwise all deleted, then
+    all inserted.
+    """
+    cdef list result = []
+    cdef int o, u, suffix = 0
+
+    while ostart < oend and ustart < uend and orig[ostart] == upd[ustart]:
+        result.append((orig[ostart], upd[ustart]))
+        ostart += 1
+        ustart += 1
+    while ostart < oend - suffix and ustart < uend - suffix and orig[oend - suffix - 1] == upd[uend - suffix - 1]:
+        suffix += 1
+    o, u = ostart, ustart
+    if pair_lines:
+        while o < oend - suffix and u < uend - suffix:
             result.append((orig[o], upd[u]))
-
             o += 1
             u += 1
+    result.extend([(line, None) for line in orig[o:oend - suffix]])
+    result.extend([(None, line) for line in upd[u:uend - suffix]])
+    result.extend([(orig[oend - suffix + k], upd[uend - suffix + k]) for k in range(suffix)])
+    return result
 
-        # Add remaining lines
-        result.extend((line, "") for line in orig[o:oend])
-        result.extend(("", line) for line in upd[u:uend])
-        return result
 
-    # Recurse between anchors
-    cdef int prev_o = ostart
-    cdef int prev_u = ustart
-    for j_idx in lis:
-        for i, j in common:
-            if j == j_idx:
-                result += _diff_recursive(orig, upd, prev_o, i, prev_u, j)
-                result.append((orig[i], upd[j]))
-                prev_o = i + 1
-                prev_u = j + 1
-                break
-
-    # Add remaining after last anchor
-    result += _diff_recursive(orig, upd, prev_o, oend, prev_u, uend)
-    return result
+cpdef list _diff_region(list orig, list upd, int ostart, int oend, int ustart, int uend):
+    """Run the patience recursion over ``orig[ostart:oend]`` against ``upd[ustart:uend]``."""
+    return _diff_recursive(orig, upd, ostart, oend, ustart, uend)
 
 
 cpdef list _longest_increasing_subsequence(list indices):
     cdef list tails = []
-    cdef int idx, lo, hi, mid
-    for idx in indices:
+    cdef list tail_pos = []
+    cdef list prev = [-1] * len(indices)
+    cdef list lis = []
+    cdef int idx, lo, hi, mid, pos
+    for pos in range(len(indices)):
+        idx = indices[pos]
         lo, hi = 0, len(tails)
         while lo < hi:
             mid = (lo + hi) // 2
@@ -100,18 +409,43 @@ cpdef list _longest_increasing_subsequence(list indices):
                 lo = mid + 1
             else:
                 hi = mid
+        if lo > 0:
+            prev[pos] = tail_pos[lo - 1]
         if lo == len(tails):
             tails.append(idx)
+            tail_pos.append(pos)
         else:
             tails[lo] = idx
-    return tails
+            tail_pos[lo] = pos
+
+    # Walk the predecessor links back from the last tail to recover the actual subsequence
+    pos = tail_pos[len(tail_pos) - 1] if tail_pos else -1
+    while pos != -1:
+        lis.append(indices[pos])
+        pos = prev[pos]
+    lis.reverse()
+    return lis
 
 # ---------------------------------------------------------------------
 # Hunk processing
 # ---------------------------------------------------------------------
 
-cdef dict _create_diff_entry(str orig_line, str upd_line, int* old_line_num, int* new_line_num, float threshold=0.4):
+cdef dict _create_diff_entry(
+    str orig_line,
+    str upd_line,
+    int* old_line_num,
+    int* new_line_num,
+    float threshold=0.4,
+    int flags=0,
+    str tokenizer="word",
+    str granularity="token",
+    double deadline=0.0,
+    list degraded=None,
+    object max_memory=None,
+    object stats=None,
+):
     cdef dict entry = {}
+    cdef double start = 0.0
     cdef int line_number_old = 0
     cdef int line_number_new = 0
 
@@ -131,24 +465,78 @@ cdef dict _create_diff_entry(str orig_line, str upd_line, int* old_line_num, int
             "line_number_new": line_number_new,
             "content": orig_line
         })
-    elif orig_line is None or not orig_line:
+    elif orig_line is None:
         entry.update({
             "type": "insert",
             "line_number_new": line_number_new,
             "content_new": upd_line
         })
-    elif upd_line is None or not upd_line:
+    elif upd_line is None:
         entry.update({
             "type": "delete",
             "line_number_old": line_number_old,
             "content_old": orig_line
         })
+    elif _expired(deadline):
+        # Out of time for inline diffs: report a hard replace
+        _degrade(degraded, "inline")
+        entry.update({
+            "type": "replace",
+            "line_number_old": line_number_old,
+            "line_number_new": line_number_new,
+            "content_old": orig_line,
+            "content_new": upd_line
+        })
     else:
-        # Analyze similarity
-        word_diff = diff_line(orig_line, upd_line)
-        total = len(word_diff)
-        equal = sum(1 for t, _ in word_diff if t == "equal")
+        # Analyze similarity on token spans; text is only sliced out for soft replaces
+        inline_degraded = [] if deadline else None
+        if stats is not None:
+            start = perf_counter()
+        if granularity == "char":
+            opcodes = diff_line(
+                orig_line,
+                upd_line,
+                flags & IGNORE_CASE,
+                flags & IGNORE_ALL_SPACE,
+                flags & IGNORE_SPACE_CHANGE,
+                output="opcodes",
+                granularity="char",
+                deadline=deadline or None,
+                degraded=inline_degraded,
+                max_memory=max_memory,
+            )
+            bounds1 = tokenize_spans(orig_line, "char")
+            bounds2 = tokenize_spans(upd_line, "char")
+        else:
+            opcodes, bounds1, bounds2 = diff_line_spans(
+                orig_line,
+                upd_line,
+                flags & IGNORE_CASE,
+                flags & IGNORE_ALL_SPACE,
+                flags & IGNORE_SPACE_CHANGE,
+                tokenizer,
+                deadline or None,
+                None,
+                inline_degraded,
+                max_memory,
+            )
+        if stats is not None:
+            stats.add_time("inline", perf_counter() - start)
+        if inline_degraded:
+            # The inline diff of this line itself was cut short
+            _degrade(degraded, "inline")
+        equal = changed = 0
+        for tag, i1, i2, j1, j2 in opcodes:
+            if tag == "equal":
+                equal += i2 - i1
+            else:
+                changed += (i2 - i1) + (j2 - j1)
+        total = equal + changed
         similarity = equal / total if total else 0.0
+        if stats is not None:
+            stats.line_diffs += 1
+            stats.edit_distance += changed
+            stats.hard_replaces += similarity < threshold
 
         if similarity < threshold:
             # Treat as hard replace (mimicking delete + insert), no inline diff
@@ -167,63 +555,370 @@ cdef dict _create_diff_entry(str orig_line, str upd_line, int* old_line_num, int
                 "line_number_new": line_number_new,
                 "content_old": orig_line,
                 "content_new": upd_line,
-                "inline_diff": [{"type": t, "value": v} for t, v in word_diff]
+                "inline_diff": [
+                    {"type": t, "value": v} for t, v in _text_runs(opcodes, orig_line, upd_line, bounds1, bounds2)
+                ]
             })
 
     return {k: v for k, v in entry.items() if v is not None}
 
-cdef list _group_hunks(list diff_entries):
+cdef dict _create_move_entry(str orig_line, str upd_line, int* old_line_num, int* new_line_num, int move):
+    # Moved lines are never paired, so exactly one side is set and no inline diff is needed
+    if orig_line is not None:
+        old_line_num[0] += 1
+        return {"type": "move", "line_number_old": old_line_num[0], "content_old": orig_line, "move": move}
+    new_line_num[0] += 1
+    return {"type": "move", "line_number_new": new_line_num[0], "content_new": upd_line, "move": move}
+
+cpdef list _collect_hunks(
+    list raw_diff,
+    int old_line_num=0,
+    int new_line_num=0,
+    float threshold=0.4,
+    list spans=None,
+    dict move_of=None,
+    int flags=0,
+    str tokenizer="word",
+    str granularity="token",
+    double deadline=0.0,
+    list degraded=None,
+    object max_memory=None,
+    object stats=None,
+    object cancel=None,
+):
+    """
+    Turn raw line pairs into hunks, numbering lines from the given offsets.
+
+    When ``spans`` is given, the 0-based half-open extent ``(old_start, old_end, new_start, new_end)``
+    of every hunk is appended to it, so callers can relocate hunks without re-reading their entries.
+    ``move_of`` maps positions in ``raw_diff`` to the move block their line belongs to, while
+    ``flags``, ``tokenizer`` and ``granularity`` are passed down to the inline diffs. Past the
+    ``deadline``, replaced lines get no inline diff and "inline" is recorded in ``degraded``.
+    ``max_memory`` bounds the memory of each inline diff, see ``diff_line``. ``stats`` receives the
+    time and counters of the inline diffs. ``cancel`` is checked every 1024 lines.
+    """
     cdef list hunks = []
     cdef list current_hunk = []
-
-    for entry in diff_entries:
-        if entry["type"] == "equal":
+    cdef int hunk_old = 0
+    cdef int hunk_new = 0
+    cdef Py_ssize_t k
+
+    for k in range(len(raw_diff)):
+        if not k & 1023:
+            _check_cancel(cancel)
+        orig_line, upd_line = raw_diff[k]
+        if not current_hunk:
+            hunk_old = old_line_num
+            hunk_new = new_line_num
+        if move_of and k in move_of:
+            entry = _create_move_entry(orig_line, upd_line, &old_line_num, &new_line_num, move_of[k])
+        else:
+            entry = _create_diff_entry(
+                orig_line, upd_line, &old_line_num, &new_line_num, threshold, flags, tokenizer, granularity,
+                deadline, degraded, max_memory, stats,
+            )
+        if entry["type"] == "equal" or (flags & IGNORE_BLANK_LINES and _is_blank_change(entry)):
             if current_hunk:
-                hunks.append(_build_hunk(current_hunk))
+                hunks.append(_build_hunk(current_hunk, hunk_old, old_line_num - 1, hunk_new, new_line_num - 1))
+                if spans is not None:
+                    spans.append((hunk_old, old_line_num - 1, hunk_new, new_line_num - 1))
                 current_hunk = []
         else:
             current_hunk.append(entry)
 
     if current_hunk:
-        hunks.append(_build_hunk(current_hunk))
+        hunks.append(_build_hunk(current_hunk, hunk_old, old_line_num, hunk_new, new_line_num))
+        if spans is not None:
+            spans.append((hunk_old, old_line_num, hunk_new, new_line_num))
 
     return hunks
 
-cdef dict _build_hunk(list hunk_entries):
-    cdef int min_old = 2**30
-    cdef int max_old = -1
-    cdef int min_new = 2**30
-    cdef int max_new = -1
-
-    for entry in hunk_entries:
-        if "line_number_old" in entry:
-            ln = entry["line_number_old"]
-            min_old = min(min_old, ln)
-            max_old = max(max_old, ln)
-        if "line_number_new" in entry:
-            ln = entry["line_number_new"]
-            min_new = min(min_new, ln)
-            max_new = max(max_new, ln)
-
+cdef bint _is_blank_change(dict entry):
+    """Whether the entry only inserts or deletes a blank line."""
+    if entry["type"] == "insert":
+        return not entry["content_new"].strip()
+    if entry["type"] == "delete":
+        return not entry["content_old"].strip()
+    return False
+
+cdef dict _build_hunk(list hunk_entries, int old_start, int old_end, int new_start, int new_end):
+    # Ranges are 1-based and inclusive; a side without lines gets ``end == start - 1``,
+    # with ``start`` pointing right after the line the change happens at
     return {
-        "old_range": {"start": min_old, "end": max_old},
-        "new_range": {"start": min_new, "end": max_new},
+        "old_range": {"start": old_start + 1, "end": old_end},
+        "new_range": {"start": new_start + 1, "end": new_end},
         "lines": hunk_entries
     }
 
 # ---------------------------------------------------------------------
-# API for processing Hunks
+# Move detection
 # ---------------------------------------------------------------------
 
-cpdef dict diff_hunks(str original, str updated, float threshold=0.4):
-    cdef list raw_diff = _compute_raw_diff(original, updated)
-    cdef list diff_entries = []
-    cdef int old_line_num = 0
-    cdef int new_line_num = 0
+cdef unsigned long long _HASH_BASE = 1000003
+
+
+cdef list _window_hashes(list ids, int width):
+    """Polynomial rolling hashes (mod 2**64) of every ``width``-long window of line ids."""
+    cdef Py_ssize_t n = len(ids), p
+    cdef unsigned long long h = 0, top = 1
+    cdef list hashes = []
+    if n < width:
+        return hashes
+    for p in range(width - 1):
+        top *= _HASH_BASE
+    for p in range(width):
+        h = h * _HASH_BASE + <unsigned long long> ids[p]
+    hashes.append(h)
+    for p in range(width, n):
+        h = (h - <unsigned long long> ids[p - width] * top) * _HASH_BASE + <unsigned long long> ids[p]
+        hashes.append(h)
+    return hashes
+
+
+cdef bint _is_block(list ids, list numbers, Py_ssize_t start, int width):
+    """Whether the window covers consecutive lines and is not made of blank lines only."""
+    cdef Py_ssize_t k
+    cdef bint blank = True
+    if <int> numbers[start + width - 1] - <int> numbers[start] != width - 1:
+        return False
+    for k in range(start, start + width):
+        if ids[k] != 0:
+            blank = False
+            break
+    return not blank
+
+
+cpdef list _detect_moves(list raw_diff, int min_lines, dict move_of, list moves):
+    """
+    Find blocks of at least ``min_lines`` consecutive removed lines that reappear as added lines.
+
+    Removed and added lines are interned to integer ids, windows of ``min_lines`` ids are indexed
+    by rolling hash, and every hit is verified and then extended as far as both blocks stay
+    consecutive. Moved lines are split out of any positional pair they were part of, so they
+    never reach ``diff_line``. Returns the new raw pairs, fills ``move_of`` with the position of
+    every moved line in them and appends ``{"old_range", "new_range"}`` to ``moves`` per block.
+    """
+    cdef dict interned = {}
+    cdef list removed_ids = [], removed_nums = [], removed_pos = []
+    cdef list added_ids = [], added_nums = [], added_pos = []
+    cdef Py_ssize_t k, o = 0, u = 0, p, q, length, n_removed, n_added
+    cdef int line_id
+    cdef dict index = {}
+    cdef bytearray used
+    cdef dict removed_move = {}
+    cdef dict added_move = {}
+    cdef list result = []
+    cdef int move
 
-    for orig_line, upd_line in raw_diff:
-        entry = _create_diff_entry(orig_line, upd_line, &old_line_num, &new_line_num, threshold)
-        if entry:
-            diff_entries.append(entry)
+    for k in range(len(raw_diff)):
+        orig_line, upd_line = raw_diff[k]
+        if orig_line is not None and orig_line == upd_line:
+            o += 1
+            u += 1
+            continue
+        if orig_line is not None:
+            line_id = 0 if not orig_line.strip() else interned.setdefault(orig_line, len(interned) + 1)
+            removed_ids.append(line_id)
+            removed_nums.append(o)
+            removed_pos.append(k)
+            o += 1
+        if upd_line is not None:
+            line_id = 0 if not upd_line.strip() else interned.setdefault(upd_line, len(interned) + 1)
+            added_ids.append(line_id)
+            added_nums.append(u)
+            added_pos.append(k)
+            u += 1
 
-    return {"hunks": _group_hunks(diff_entries)}
+    n_removed = len(removed_ids)
+    n_added = len(added_ids)
+    if min_lines < 1 or n_removed < min_lines or n_added < min_lines:
+        return raw_diff
+
+    cdef list removed_hashes = _window_hashes(removed_ids, min_lines)
+    cdef list added_hashes = _window_hashes(added_ids, min_lines)
+    for p in range(len(removed_hashes)):
+        if _is_block(removed_ids, removed_nums, p, min_lines):
+            index.setdefault(removed_hashes[p], []).append(p)
+
+    used = bytearray(n_removed)
+    q = 0
+    while q < len(added_hashes):
+        candidates = index.get(added_hashes[q]) if _is_block(added_ids, added_nums, q, min_lines) else None
+        length = 0
+        if candidates:
+            for p in candidates:
+                length = 0
+                while (
+                    q + length < n_added
+                    and p + length < n_removed
+                    and not used[p + length]
+                    and added_ids[q + length] == removed_ids[p + length]
+                    and <int> added_nums[q + length] - <int> added_nums[q] == length
+                    and <int> removed_nums[p + length] - <int> removed_nums[p] == length
+                ):
+                    length += 1
+                if length >= min_lines:
+                    break
+        if length < min_lines:
+            q += 1
+            continue
+
+        move = len(moves)
+        moves.append({
+            "old_range": {"start": removed_nums[p] + 1, "end": removed_nums[p] + length},
+            "new_range": {"start": added_nums[q] + 1, "end": added_nums[q] + length},
+        })
+        for k in range(length):
+            used[p + k] = 1
+            removed_move[removed_pos[p + k]] = move
+            added_move[added_pos[q + k]] = move
+        q += length
+
+    if not moves:
+        return raw_diff
+
+    for k in range(len(raw_diff)):
+        orig_line, upd_line = raw_diff[k]
+        if orig_line is not None and upd_line is not None and (k in removed_move or k in added_move):
+            if k in removed_move:
+                move_of[len(result)] = removed_move[k]
+            result.append((orig_line, None))
+            if k in added_move:
+                move_of[len(result)] = added_move[k]
+            result.append((None, upd_line))
+        else:
+            move = removed_move.get(k, added_move.get(k, -1))
+            if move != -1:
+                move_of[len(result)] = move
+            result.append((orig_line, upd_line))
+    return result
+
+# ---------------------------------------------------------------------
+# API for processing Hunks
+# ---------------------------------------------------------------------
+
+cdef void _split_last_lines(list raw_diff, dict no_newline, dict move_of) except *:
+    """
+    Put the last line of a side without a final newline into a hunk, unless the other side ends with the same line.
+
+    Such a line only stays equal when it is the last line of both sides and neither has the newline; otherwise it is
+    removed and added again, as GNU diff shows it, so applying the hunks gives every line its newline back or not.
+    """
+    cdef Py_ssize_t k, last_old = -1, last_new = -1
+    for k in range(len(raw_diff) - 1, -1, -1):
+        orig_line, upd_line = raw_diff[k]
+        if last_old < 0 and orig_line is not None:
+            last_old = k
+        if last_new < 0 and upd_line is not None:
+            last_new = k
+        if last_old >= 0 and last_new >= 0:
+            break
+    if "old" in no_newline and "new" in no_newline and last_old == last_new:
+        return
+    # At most one of the two lines is in an equal pair, since the other side goes on after it
+    for k in (last_old if "old" in no_newline else -1, last_new if "new" in no_newline else -1):
+        if k < 0:
+            continue
+        orig_line, upd_line = raw_diff[k]
+        if orig_line is not None and orig_line == upd_line:
+            raw_diff[k:k + 1] = [(orig_line, None), (None, upd_line)]
+            if move_of:
+                for p in sorted([p for p in move_of if p > k], reverse=True):
+                    move_of[p + 1] = move_of.pop(p)
+            return
+
+
+cdef dict _missing_newlines(str original, str updated, list raw_diff):
+    """Number of the last line of each side whose text does not end with a newline, by side."""
+    cdef dict missing = {}
+    cdef Py_ssize_t old_lines = 0, new_lines = 0
+    cdef bint old_missing = original and not original.endswith(("\n", "\r"))
+    cdef bint new_missing = updated and not updated.endswith(("\n", "\r"))
+    if not old_missing and not new_missing:
+        return missing
+    for orig_line, upd_line in raw_diff:
+        if orig_line is not None:
+            old_lines += 1
+        if upd_line is not None:
+            new_lines += 1
+    if old_missing:
+        missing["old"] = old_lines
+    if new_missing:
+        missing["new"] = new_lines
+    return missing
+
+
+cpdef dict diff_hunks(
+    str original,
+    str updated,
+    float threshold=0.4,
+    bint detect_moves=False,
+    int min_move_lines=3,
+    bint ignore_case=False,
+    bint ignore_all_space=False,
+    bint ignore_space_change=False,
+    bint ignore_blank_lines=False,
+    str tokenizer="word",
+    str granularity="token",
+    deadline=None,
+    timeout_ms=None,
+    max_memory=None,
+    stats=False,
+    cancel=None,
+):
+    cdef int flags = _comparison_flags(ignore_case, ignore_all_space, ignore_space_change, ignore_blank_lines)
+    cdef double end = _resolve_deadline(deadline, timeout_ms)
+    cdef list degraded = [] if end else None
+    cdef list raw_diff
+    cdef dict move_of = None
+    cdef dict result
+    cdef dict no_newline
+    cdef list moves
+    cdef object collector = None
+    cdef dict trace
+    cdef double start = 0.0, inline = 0.0
+
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity {granularity!r}, expected one of {', '.join(GRANULARITIES)}")
+
+    if stats:
+        # A DiffStats can be passed to add up several diffs
+        collector = stats if isinstance(stats, DiffStats) else DiffStats()
+        trace = trace_memory()
+    raw_diff = _compute_raw_diff(original, updated, flags, end, degraded, collector, cancel)
+    if detect_moves:
+        # Moved blocks become "move" lines tied to an entry of the "moves" list
+        if collector is not None:
+            start = perf_counter()
+        move_of = {}
+        moves = []
+        raw_diff = _detect_moves(raw_diff, min_move_lines, move_of, moves)
+        if collector is not None:
+            _lap(collector, "moves", start)
+    no_newline = _missing_newlines(original, updated, raw_diff)
+    if no_newline:
+        _split_last_lines(raw_diff, no_newline, move_of)
+    if collector is not None:
+        start = perf_counter()
+        inline = collector.timings.get("inline", 0.0)
+    result = {
+        "hunks": _collect_hunks(
+            raw_diff, 0, 0, threshold, None, move_of, flags, tokenizer, granularity, end, degraded, max_memory,
+            collector, cancel,
+        )
+    }
+    if collector is not None:
+        # Inline diffs were timed on their own while building hunks
+        collector.add_time("hunks", perf_counter() - start - (collector.timings.get("inline", 0.0) - inline))
+        collector.trace_allocations += trace_memory()["allocations"] - trace["allocations"]
+        collector.trace_bytes += trace_memory()["bytes"] - trace["bytes"]
+        result["stats"] = collector
+    if detect_moves:
+        result["moves"] = moves
+    if no_newline:
+        # Texts ending with a newline, the usual case, leave the result as it was
+        result["no_newline_at_end"] = no_newline
+    if degraded is not None:
+        # Under a time budget, report which precision was given up, mildest first
+        result["degraded"] = [stage for stage in DEGRADATIONS if stage in degraded]
+    return result
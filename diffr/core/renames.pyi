@@ -0,0 +1,9 @@
+def detect_renames(
+    old_files: dict[str, str],
+    new_files: dict[str, str],
+    threshold: float = 0.5,
+    copies: bool = False,
+    num_perm: int = 64,
+    bands: int = 32,
+    max_candidates: int = 5,
+) -> list[dict]: ...
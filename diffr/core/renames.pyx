@@ -0,0 +1,204 @@
+from libc.stdint cimport uint32_t, uint64_t
+from cpython cimport array
+from cpython.unicode cimport PyUnicode_DATA, PyUnicode_KIND, PyUnicode_READ
+
+import array
+
+from .patience import _compute_raw_diff
+
+# ---------------------------------------------------------------------
+# Rename and copy detection
+# ---------------------------------------------------------------------
+
+cdef uint64_t _FNV_OFFSET = 14695981039346656037ULL
+cdef uint64_t _FNV_PRIME = 1099511628211ULL
+
+
+cdef uint64_t _line_hash(str line):
+    """FNV-1a over the code points of a line, stable across processes unlike ``hash``."""
+    cdef uint64_t h = _FNV_OFFSET
+    cdef int kind = PyUnicode_KIND(line)
+    cdef void* data = PyUnicode_DATA(line)
+    cdef Py_ssize_t i
+    for i in range(len(line)):
+        h = (h ^ <uint64_t> PyUnicode_READ(kind, data, i)) * _FNV_PRIME
+    return h
+
+
+cdef uint64_t _splitmix64(uint64_t* state):
+    state[0] += 0x9E3779B97F4A7C15ULL
+    cdef uint64_t z = state[0]
+    z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9ULL
+    z = (z ^ (z >> 27)) * 0x94D049BB133111EBULL
+    return z ^ (z >> 31)
+
+
+cdef class _MinHasher:
+    """Multiply-shift hash family giving ``num_perm`` MinHash values per set of line hashes."""
+
+    cdef array.array coefficients
+    cdef Py_ssize_t num_perm
+
+    def __cinit__(self, Py_ssize_t num_perm):
+        cdef uint64_t state = 0x5DEECE66DULL
+        cdef Py_ssize_t i
+        self.num_perm = num_perm
+        self.coefficients = array.array("Q", [0]) * (2 * num_perm)
+        for i in range(num_perm):
+            # Odd multipliers keep every hash function a bijection on 64-bit values
+            self.coefficients.data.as_ulonglongs[2 * i] = _splitmix64(&state) | 1
+            self.coefficients.data.as_ulonglongs[2 * i + 1] = _splitmix64(&state)
+
+    cdef array.array signature(self, set hashes):
+        cdef array.array sig = array.array("I", [0xFFFFFFFF]) * self.num_perm
+        cdef uint32_t* values = sig.data.as_uints
+        cdef unsigned long long* coef = self.coefficients.data.as_ulonglongs
+        cdef uint64_t x
+        cdef uint32_t h
+        cdef Py_ssize_t i
+        for item in hashes:
+            x = item
+            for i in range(self.num_perm):
+                h = <uint32_t> ((coef[2 * i] * x + coef[2 * i + 1]) >> 32)
+                if h < values[i]:
+                    values[i] = h
+        return sig
+
+
+cdef list _lines(str text):
+    return [line.rstrip("\r\n") for line in text.splitlines(True)]
+
+
+cdef double _line_similarity(list old_lines, list new_lines, str old_text, str new_text):
+    """Share of lines kept from one file in the other, relative to the larger file, as ``git diff -M`` does."""
+    cdef Py_ssize_t common = 0
+    cdef Py_ssize_t largest = max(len(old_lines), len(new_lines))
+    if largest == 0:
+        return 1.0
+    for orig_line, upd_line in _compute_raw_diff(old_text, new_text):
+        if orig_line is not None and upd_line is not None and orig_line == upd_line:
+            common += 1
+    return common / <double> largest
+
+
+cdef double _estimate(array.array a, array.array b, Py_ssize_t num_perm):
+    cdef Py_ssize_t i, same = 0
+    for i in range(num_perm):
+        if a.data.as_uints[i] == b.data.as_uints[i]:
+            same += 1
+    return same / <double> num_perm
+
+
+cpdef list detect_renames(
+    dict old_files,
+    dict new_files,
+    double threshold=0.5,
+    bint copies=False,
+    int num_perm=64,
+    int bands=32,
+    int max_candidates=5,
+):
+    """
+    Find files of a new tree that were renamed or copied from files of an old tree.
+
+    Destinations are the paths only present in ``new_files``. Sources are the paths only present in
+    ``old_files`` and, with ``copies``, every old path. Files with identical content are paired
+    first. Every other file is reduced to a MinHash signature over the hashes of its distinct lines,
+    and the signatures are split into ``bands`` LSH buckets, so a destination is only compared with
+    sources that share at least one bucket. The ``max_candidates`` sources with the best estimated
+    Jaccard index are verified with the patience line diff, which scores the pair by the lines it
+    keeps relative to the larger file. Pairs are then assigned best score first: a source that no
+    longer exists is renamed once, and anything else matched to it is a copy.
+
+    Parameters:
+        old_files (dict): Path to text of every file in the old tree
+        new_files (dict): Path to text of every file in the new tree
+        threshold (float): Minimum similarity for a pair to be reported, like ``git diff -M50%``
+        copies (bool): Also look for copies, including copies of files that still exist
+        num_perm (int): Number of MinHash values per file
+        bands (int): Number of LSH bands; must divide ``num_perm``
+        max_candidates (int): Sources verified with the line diff per destination
+
+    Returns:
+        list[dict]: ``{"type": "rename" | "copy", "old_path", "new_path", "similarity"}`` for every
+        detected pair, ordered by new path, with the similarity as an integer percentage
+    """
+    if num_perm <= 0 or bands <= 0 or num_perm % bands:
+        raise ValueError(f"bands ({bands}) must divide num_perm ({num_perm})")
+
+    cdef list removed = sorted([path for path in old_files if path not in new_files])
+    cdef list added = sorted([path for path in new_files if path not in old_files])
+    cdef list sources = sorted(old_files) if copies else removed
+    cdef Py_ssize_t rows = num_perm // bands, band, s
+    cdef _MinHasher hasher = _MinHasher(num_perm)
+    cdef dict exact = {}
+    cdef dict buckets = {}
+    cdef dict source_lines = {}
+    cdef dict signatures = {}
+    cdef list pairs = []
+    cdef list new_lines, ranked
+    cdef set hits, assigned = set(), renamed = set()
+    cdef list results = []
+    cdef array.array sig
+    cdef bytes raw
+    cdef double score
+    cdef str path, new_path, text
+
+    if not added or not sources:
+        return []
+
+    # Empty files carry no content to recognize, so they are never paired
+    for s in range(len(sources)):
+        path = sources[s]
+        text = old_files[path]
+        if not text:
+            continue
+        exact.setdefault(text, []).append(s)
+        source_lines[path] = _lines(text)
+        sig = hasher.signature({_line_hash(line) for line in source_lines[path]})
+        signatures[path] = sig
+        raw = sig.tobytes()
+        for band in range(bands):
+            buckets.setdefault((band, raw[band * rows * 4:(band + 1) * rows * 4]), []).append(s)
+
+    for new_path in added:
+        text = new_files[new_path]
+        if not text:
+            continue
+        if text in exact:
+            for s in exact[text]:
+                pairs.append((-1.0, sources[s] in new_files, new_path, sources[s]))
+            continue
+        new_lines = _lines(text)
+        sig = hasher.signature({_line_hash(line) for line in new_lines})
+        raw = sig.tobytes()
+        hits = set()
+        for band in range(bands):
+            hits.update(buckets.get((band, raw[band * rows * 4:(band + 1) * rows * 4]), ()))
+        ranked = sorted([(-_estimate(signatures[sources[s]], sig, num_perm), s) for s in hits])
+        for _, s in ranked[:max_candidates]:
+            path = sources[s]
+            score = _line_similarity(source_lines[path], new_lines, old_files[path], text)
+            if score >= threshold:
+                pairs.append((-score, path in new_files, new_path, path))
+
+    # Best pairs first, preferring sources that no longer exist; a renamed source is consumed and
+    # anything else matched to it, or to a file that still exists, is a copy
+    pairs.sort()
+    for score, _, new_path, path in pairs:
+        if new_path in assigned:
+            continue
+        if path in new_files or path in renamed:
+            if not copies:
+                continue
+            kind = "copy"
+        else:
+            kind = "rename"
+            renamed.add(path)
+        assigned.add(new_path)
+        results.append(
+            (new_path, {"type": kind, "old_path": path, "new_path": new_path, "similarity": int(-score * 100 + 1e-9)})
+        )
+
+    results.sort()
+    return [result for _, result in results]
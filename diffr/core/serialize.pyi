@@ -0,0 +1,11 @@
+from typing import Any, Protocol
+
+DEFAULT_BUFFER_SIZE: int
+MAX_DEPTH: int
+
+class _BinaryWriter(Protocol):
+    def write(self, data: bytes, /) -> Any: ...
+
+def dump_json(
+    data: Any, stream: _BinaryWriter | bytearray | None = None, buffer_size: int = DEFAULT_BUFFER_SIZE
+) -> bytes | None: ...
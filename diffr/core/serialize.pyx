@@ -0,0 +1,298 @@
+from libc.math cimport isinf, isnan
+from libc.stdint cimport uint32_t
+from libc.stdlib cimport free, realloc
+from libc.string cimport memcpy
+from cpython.bytes cimport PyBytes_FromStringAndSize
+from cpython.unicode cimport PyUnicode_DATA, PyUnicode_KIND, PyUnicode_READ
+
+
+cdef extern from "Python.h":
+    Py_ssize_t PyUnicode_GET_LENGTH(object)
+    bint PyUnicode_IS_ASCII(object)
+    long long PyLong_AsLongLongAndOverflow(object, int*) except? -1
+
+# ---------------------------------------------------------------------
+# Streaming JSON
+# ---------------------------------------------------------------------
+# The output is byte for byte that of ``json.dumps(data).encode()`` with the default arguments: ", " and ": " as
+# separators, and every character outside of printable ASCII escaped.
+
+DEFAULT_BUFFER_SIZE = 1 << 16
+
+# Containers nested deeper than this are taken for a circular reference, where ``json`` would run out of recursion
+MAX_DEPTH = 1_000
+
+# Characters of a string escaped at a time, bounding the room reserved for its escapes
+cdef enum:
+    _BLOCK = 4_096
+
+cdef const char* _HEX = b"0123456789abcdef"
+
+# Printable ASCII characters copied as they are
+cdef bint _PLAIN[128]
+for _c in range(128):
+    _PLAIN[_c] = 0x20 <= _c <= 0x7E and _c != 0x22 and _c != 0x5C
+
+
+cdef inline Py_ssize_t _escape(char* out, uint32_t c) noexcept:
+    """Write the escape of a character that is not plain, returning its length."""
+    out[0] = b"\\"
+    if c == 0x22:
+        out[1] = b'"'
+        return 2
+    if c == 0x5C:
+        out[1] = b"\\"
+        return 2
+    if c == 0x0A:
+        out[1] = b"n"
+        return 2
+    if c == 0x0D:
+        out[1] = b"r"
+        return 2
+    if c == 0x09:
+        out[1] = b"t"
+        return 2
+    if c == 0x08:
+        out[1] = b"b"
+        return 2
+    if c == 0x0C:
+        out[1] = b"f"
+        return 2
+    if c >= 0x10000:
+        # Outside of the basic plane, as a surrogate pair
+        c -= 0x10000
+        _escape(out, 0xD800 | (c >> 10))
+        _escape(out + 6, 0xDC00 | (c & 0x3FF))
+        return 12
+    out[1] = b"u"
+    out[2] = _HEX[(c >> 12) & 0xF]
+    out[3] = _HEX[(c >> 8) & 0xF]
+    out[4] = _HEX[(c >> 4) & 0xF]
+    out[5] = _HEX[c & 0xF]
+    return 6
+
+
+cdef class _Writer:
+    """Bytes collected in one buffer, handed to ``write`` whenever it is full or grown into a whole result."""
+
+    cdef char* data
+    cdef Py_ssize_t size
+    cdef Py_ssize_t capacity
+    cdef object write
+    cdef int depth
+
+    def __cinit__(self, object write, Py_ssize_t buffer_size):
+        self.write = write
+        self.capacity = max(buffer_size, 64)
+        self.data = <char*> realloc(NULL, self.capacity)
+        if self.data == NULL:
+            raise MemoryError()
+
+    def __dealloc__(self):
+        free(self.data)
+
+    cdef int flush(self) except -1:
+        if self.size:
+            self.write(PyBytes_FromStringAndSize(self.data, self.size))
+            self.size = 0
+        return 0
+
+    cdef int reserve(self, Py_ssize_t n) except -1:
+        cdef Py_ssize_t capacity
+        cdef char* data
+        if self.size + n <= self.capacity:
+            return 0
+        if self.write is not None:
+            self.flush()
+            if n <= self.capacity:
+                return 0
+        capacity = max(2 * self.capacity, self.size + n)
+        data = <char*> realloc(self.data, capacity)
+        if data == NULL:
+            raise MemoryError()
+        self.data = data
+        self.capacity = capacity
+        return 0
+
+    cdef int raw(self, const char* text, Py_ssize_t n) except -1:
+        self.reserve(n)
+        memcpy(self.data + self.size, text, n)
+        self.size += n
+        return 0
+
+    cdef int ascii(self, str text) except -1:
+        """Text known to be plain ASCII, like the ``repr`` of a number."""
+        return self.raw(<const char*> PyUnicode_DATA(text), PyUnicode_GET_LENGTH(text))
+
+    cdef int string(self, str text) except -1:
+        cdef Py_ssize_t n = PyUnicode_GET_LENGTH(text)
+        cdef int kind = PyUnicode_KIND(text)
+        cdef void* data = PyUnicode_DATA(text)
+        cdef const unsigned char* chars
+        cdef Py_ssize_t i, start, end, run
+        cdef uint32_t c
+        cdef char* out
+
+        self.reserve(2)
+        self.data[self.size] = b'"'
+        self.size += 1
+        if PyUnicode_IS_ASCII(text):
+            # Most lines of code: copy runs of plain characters whole
+            chars = <const unsigned char*> data
+            i = 0
+            while i < n:
+                start = i
+                while i < n and _PLAIN[chars[i]]:
+                    i += 1
+                run = i - start
+                self.reserve(run + 7)
+                memcpy(self.data + self.size, chars + start, run)
+                self.size += run
+                if i < n:
+                    self.size += _escape(self.data + self.size, chars[i])
+                    i += 1
+        else:
+            for start in range(0, n, _BLOCK):
+                end = min(start + _BLOCK, n)
+                self.reserve(12 * (end - start) + 1)
+                out = self.data + self.size
+                for i in range(start, end):
+                    c = PyUnicode_READ(kind, data, i)
+                    if c < 128 and _PLAIN[c]:
+                        out[0] = <char> c
+                        out += 1
+                    else:
+                        out += _escape(out, c)
+                self.size = out - self.data
+        self.reserve(1)
+        self.data[self.size] = b'"'
+        self.size += 1
+        return 0
+
+    cdef int integer(self, object value) except -1:
+        cdef int overflow = 0
+        cdef long long number
+        cdef unsigned long long magnitude
+        cdef char digits[24]
+        cdef int i = 24
+        if type(value) is int:
+            number = PyLong_AsLongLongAndOverflow(value, &overflow)
+            if not overflow:
+                magnitude = 0 - <unsigned long long> number if number < 0 else <unsigned long long> number
+                while True:
+                    i -= 1
+                    digits[i] = <char> (48 + magnitude % 10)
+                    magnitude //= 10
+                    if magnitude == 0:
+                        break
+                if number < 0:
+                    i -= 1
+                    digits[i] = b"-"
+                return self.raw(digits + i, 24 - i)
+        # Subclasses like enums are written as the plain int, as ``json`` does
+        return self.ascii(int.__repr__(value))
+
+    cdef int number(self, double value) except -1:
+        if isnan(value):
+            return self.raw(b"NaN", 3)
+        if isinf(value):
+            return self.raw(b"Infinity", 8) if value > 0 else self.raw(b"-Infinity", 9)
+        return self.ascii(float.__repr__(value))
+
+    cdef int key(self, object key) except -1:
+        if isinstance(key, str):
+            return self.string(key if type(key) is str else str.__str__(key))
+        self.raw(b'"', 1)
+        if isinstance(key, float):
+            self.number(key)
+        elif key is True:
+            self.raw(b"true", 4)
+        elif key is False:
+            self.raw(b"false", 5)
+        elif key is None:
+            self.raw(b"null", 4)
+        elif isinstance(key, int):
+            self.integer(key)
+        else:
+            raise TypeError(f"keys must be str, int, float, bool or None, not {type(key).__name__}")
+        return self.raw(b'"', 1)
+
+    cdef int value(self, object value) except -1:
+        cdef bint first = True
+        if isinstance(value, str):
+            # Subclasses are written as the plain str, as ``json`` does
+            return self.string(value if type(value) is str else str.__str__(value))
+        if value is None:
+            return self.raw(b"null", 4)
+        if value is True:
+            return self.raw(b"true", 4)
+        if value is False:
+            return self.raw(b"false", 5)
+        if isinstance(value, int):
+            return self.integer(value)
+        if isinstance(value, float):
+            return self.number(value)
+
+        self.depth += 1
+        if self.depth > MAX_DEPTH:
+            raise ValueError(f"Circular reference detected, or data nested deeper than {MAX_DEPTH} levels")
+        if isinstance(value, (list, tuple)):
+            self.raw(b"[", 1)
+            for item in value:
+                if not first:
+                    self.raw(b", ", 2)
+                first = False
+                self.value(item)
+            self.raw(b"]", 1)
+        elif type(value) is dict:
+            self.raw(b"{", 1)
+            for name, item in (<dict> value).items():
+                if not first:
+                    self.raw(b", ", 2)
+                first = False
+                self.key(name)
+                self.raw(b": ", 2)
+                self.value(item)
+            self.raw(b"}", 1)
+        elif isinstance(value, dict):
+            self.raw(b"{", 1)
+            for name, item in value.items():
+                if not first:
+                    self.raw(b", ", 2)
+                first = False
+                self.key(name)
+                self.raw(b": ", 2)
+                self.value(item)
+            self.raw(b"}", 1)
+        else:
+            raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+        self.depth -= 1
+        return 0
+
+
+def dump_json(data, stream=None, Py_ssize_t buffer_size=DEFAULT_BUFFER_SIZE):
+    """
+    Encode the output of ``diff_hunks``, or any JSON data, to UTF-8 JSON without building it as a string.
+
+    The bytes are exactly those of ``json.dumps(data).encode()``. Written to a stream, they go out
+    in chunks of about ``buffer_size`` bytes as they are encoded, so even the JSON of a huge diff
+    never sits in memory whole; data that cannot be encoded raises after some chunks were written.
+
+    Parameters:
+        data: Dicts, lists, tuples, strings, numbers, booleans and None
+        stream: Binary stream to write to, or a bytearray to extend; None returns the bytes
+        buffer_size (int): Approximate size of the chunks written to ``stream``
+
+    Returns:
+        bytes: The JSON when ``stream`` is None, else None
+    """
+    cdef _Writer writer
+    if buffer_size <= 0:
+        raise ValueError(f"buffer_size must be positive, got {buffer_size}")
+    if stream is None:
+        writer = _Writer(None, buffer_size)
+        writer.value(data)
+        return PyBytes_FromStringAndSize(writer.data, writer.size)
+    writer = _Writer(stream.extend if isinstance(stream, bytearray) else stream.write, buffer_size)
+    writer.value(data)
+    writer.flush()
@@ -0,0 +1,7 @@
+class DiffSession:
+    threshold: float
+    def __init__(self, original: str, updated: str | None = None, threshold: float = 0.4) -> None: ...
+    @property
+    def updated(self) -> str: ...
+    def diff_hunks(self) -> dict: ...
+    def apply_edit(self, start_line: int, end_line: int, new_text: str) -> list: ...
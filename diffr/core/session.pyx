@@ -0,0 +1,273 @@
+from cpython cimport array
+
+import array
+
+from .patience import _collect_hunks, _diff_region
+
+# ---------------------------------------------------------------------
+# Incremental line diff
+# ---------------------------------------------------------------------
+
+cdef class DiffSession:
+    """
+    Stateful diff of an original document against an updated document that changes over time.
+
+    The session keeps the split lines of both documents together with the current hunks and
+    their extents. Between two hunks every line is equal on both sides, so those runs act as
+    stable anchors: an edit only re-runs the patience recursion on the region delimited by the
+    nearest stable lines around it, plus any hunk it touches. Untouched hunks, including their
+    inline diffs, are reused as they are.
+
+    Hunks are located by their original-side lines, which never move. The lines every hunk adds
+    or removes are kept in a Fenwick tree indexed by its first original line, so the updated-side
+    position of a hunk is a prefix sum and an edit costs time in its own size, not in the number
+    of hunks after it. Hunks moved by earlier edits are renumbered, as new dicts, when read.
+
+    Whether each document ends with a newline is tracked apart from its lines, and applied when the
+    diff is read, so a last line without newline is reported as :func:`diffr.diff_hunks` does.
+    """
+
+    cdef readonly float threshold
+    cdef list _orig
+    cdef list _upd
+    cdef list _hunks
+    # ``(old_start, old_end, new_length)`` of every hunk, 0-based and half-open on the original side
+    cdef list _spans
+    # Fenwick tree of ``new_length - old_length`` per hunk, by the first original line of the hunk
+    cdef array.array _deltas
+    # Whether the last line of each document ends with a newline
+    cdef bint _orig_newline
+    cdef bint _upd_newline
+
+    def __init__(self, str original, str updated=None, float threshold=0.4):
+        self.threshold = threshold
+        self._orig = [line.rstrip("\r\n") for line in original.splitlines(True)]
+        self._orig_newline = not original or original.endswith(("\n", "\r"))
+        if updated is None:
+            self._upd = list(self._orig)
+            self._upd_newline = self._orig_newline
+        else:
+            self._upd = [line.rstrip("\r\n") for line in updated.splitlines(True)]
+            self._upd_newline = not updated or updated.endswith(("\n", "\r"))
+        cdef list spans = []
+        self._hunks = _collect_hunks(
+            _diff_region(self._orig, self._upd, 0, len(self._orig), 0, len(self._upd)),
+            0,
+            0,
+            threshold,
+            spans,
+        )
+        self._deltas = array.array("q", [0]) * (len(self._orig) + 2)
+        self._spans = self._record(spans)
+
+    cdef void _add_delta(self, Py_ssize_t position, long long delta):
+        cdef long long* tree = self._deltas.data.as_longlongs
+        cdef Py_ssize_t size = len(self._deltas)
+        position += 1
+        while position < size:
+            tree[position] += delta
+            position += position & -position
+
+    cdef Py_ssize_t _new_start(self, Py_ssize_t h):
+        """First updated-side line of hunk ``h``: its original start plus what the hunks before it added."""
+        cdef long long* tree = self._deltas.data.as_longlongs
+        cdef Py_ssize_t position = self._spans[h][0]
+        cdef long long start = position
+        while position > 0:
+            start += tree[position]
+            position -= position & -position
+        return start
+
+    cdef list _record(self, list spans):
+        """Add the ``(old_start, old_end, new_start, new_end)`` extents of new hunks to the tree, as spans."""
+        cdef list recorded = []
+        for old_start, old_end, new_start, new_end in spans:
+            recorded.append((old_start, old_end, new_end - new_start))
+            self._add_delta(old_start, (new_end - new_start) - (old_end - old_start))
+        return recorded
+
+    @property
+    def updated(self):
+        """Return the current updated document, joined with newlines and ending with one if it did."""
+        if self._upd and self._upd_newline:
+            return "\n".join(self._upd) + "\n"
+        return "\n".join(self._upd)
+
+    def diff_hunks(self):
+        """
+        Return the current diff, in the same shape as :func:`diffr.diff_hunks`.
+
+        Later edits never change the returned hunks: hunks they move are replaced by renumbered copies.
+        """
+        cdef Py_ssize_t h, shift
+        cdef dict hunk
+        cdef dict result
+        cdef dict no_newline = {}
+        for h in range(len(self._hunks)):
+            hunk = self._hunks[h]
+            shift = self._new_start(h) - (hunk["new_range"]["start"] - 1)
+            if shift:
+                self._hunks[h] = _shifted_hunk(hunk, shift)
+        result = {"hunks": list(self._hunks)}
+        if self._orig and not self._orig_newline:
+            no_newline["old"] = len(self._orig)
+        if self._upd and not self._upd_newline:
+            no_newline["new"] = len(self._upd)
+        if no_newline:
+            self._split_last_line(result["hunks"], no_newline)
+            result["no_newline_at_end"] = no_newline
+        return result
+
+    cdef void _split_last_line(self, list hunks, dict no_newline) except *:
+        """
+        Put the last line of a side without a final newline into a hunk, as ``diff_hunks`` does.
+
+        The line is only left equal when it is the last line of both sides and neither ends with a
+        newline. Otherwise, when it is equal, it becomes a deletion and an insertion, merged with
+        the hunks right before and after it. ``hunks`` is changed in place; the stored hunks are not.
+        """
+        cdef Py_ssize_t n_old = len(self._orig), n_new = len(self._upd)
+        cdef Py_ssize_t side, line, k, before, p, q, o_lo, o_hi, n_lo, n_hi
+        cdef tuple extent
+        cdef list lines
+        # 0-based, half-open ``(old_start, old_end, new_start, new_end)`` of every hunk
+        cdef list extents = [
+            (h["old_range"]["start"] - 1, h["old_range"]["end"], h["new_range"]["start"] - 1, h["new_range"]["end"])
+            for h in hunks
+        ]
+        for side, name in ((0, "old"), (2, "new")):
+            if name not in no_newline:
+                continue
+            line = (n_old if side == 0 else n_new) - 1
+            # Hunks after the line add lines on the other side only; the one before sets the offset
+            before = -1
+            for k in range(len(extents) - 1, -1, -1):
+                extent = extents[k]
+                if extent[side] <= line < extent[side + 1]:
+                    break
+                if extent[side + 1] <= line:
+                    before = k
+                    break
+            else:
+                k = -1
+            if k >= 0 and before < 0:
+                continue  # Already in a hunk
+            if before < 0:
+                p = q = line
+            elif side == 0:
+                p, q = line, line - extents[before][1] + extents[before][3]
+            else:
+                p, q = line - extents[before][3] + extents[before][1], line
+            if "old" in no_newline and "new" in no_newline and p == n_old - 1 and q == n_new - 1:
+                return
+            lines = [
+                {"type": "delete", "line_number_old": p + 1, "content_old": self._orig[p]},
+                {"type": "insert", "line_number_new": q + 1, "content_new": self._upd[q]},
+            ]
+            o_lo, o_hi, n_lo, n_hi = p, p + 1, q, q + 1
+            k = before + 1
+            if before >= 0 and extents[before][1] == p and extents[before][3] == q:
+                lines = hunks[before]["lines"] + lines
+                o_lo, n_lo = extents[before][0], extents[before][2]
+                before -= 1
+            if k < len(hunks) and extents[k][0] == o_hi and extents[k][2] == n_hi:
+                lines = lines + hunks[k]["lines"]
+                o_hi, n_hi = extents[k][1], extents[k][3]
+                k += 1
+            hunks[before + 1:k] = [{
+                "old_range": {"start": o_lo + 1, "end": o_hi},
+                "new_range": {"start": n_lo + 1, "end": n_hi},
+                "lines": lines,
+            }]
+            return
+
+    def apply_edit(self, int start_line, int end_line, str new_text):
+        """
+        Replace lines ``start_line:end_line`` of the updated document with ``new_text``.
+
+        Line indices are 0-based and half-open, as in a slice of the updated document's lines, so
+        ``start_line == end_line`` inserts ``new_text`` before that line and an empty ``new_text``
+        deletes the range.
+
+        Parameters:
+            start_line (int): First line of the updated document to replace
+            end_line (int): Line after the last one to replace
+            new_text (str): Replacement text, split into lines like the documents themselves
+
+        Returns:
+            list[dict]: The hunks that now cover the edited region. Hunks outside of it are
+            unchanged apart from their new-side line numbers.
+        """
+        cdef list new_lines = [line.rstrip("\r\n") for line in new_text.splitlines(True)]
+        cdef Py_ssize_t n_upd = len(self._upd)
+        cdef Py_ssize_t first, last, h, lo, hi
+        cdef int delta, offset, o_lo, o_hi, u_lo, u_hi
+
+        if start_line < 0 or end_line < start_line or end_line > n_upd:
+            raise IndexError(f"edit range {start_line}:{end_line} is out of bounds for {n_upd} lines")
+
+        # Hunks touching the edit are folded into the region; the others stay as they are. The first
+        # one is the first hunk to end at or after the edit
+        lo, hi = 0, len(self._spans)
+        while lo < hi:
+            h = (lo + hi) // 2
+            if self._new_start(h) + self._spans[h][2] < start_line:
+                lo = h + 1
+            else:
+                hi = h
+        first = last = lo
+        while last < len(self._spans) and self._new_start(last) <= end_line:
+            last += 1
+
+        # Outside of hunks both documents are aligned by a constant offset
+        if first > 0:
+            offset = self._spans[first - 1][1] - (self._new_start(first - 1) + self._spans[first - 1][2])
+        else:
+            offset = 0
+        u_lo, u_hi = start_line, end_line
+        o_lo = u_lo + offset
+        if first < last:
+            if self._new_start(first) <= u_lo:
+                u_lo = self._new_start(first)
+                o_lo = self._spans[first][0]
+            offset = self._spans[last - 1][1] - (self._new_start(last - 1) + self._spans[last - 1][2])
+            if self._new_start(last - 1) + self._spans[last - 1][2] >= u_hi:
+                u_hi = self._new_start(last - 1) + self._spans[last - 1][2]
+        o_hi = u_hi + offset
+
+        delta = len(new_lines) - (end_line - start_line)
+        self._upd[start_line:end_line] = new_lines
+        if end_line == n_upd and (new_text or start_line < end_line):
+            # The edit ends the document: its last line has a newline unless ``new_text`` left it out
+            self._upd_newline = not new_text or new_text.endswith(("\n", "\r"))
+
+        cdef list spans = []
+        cdef list hunks = _collect_hunks(
+            _diff_region(self._orig, self._upd, o_lo, o_hi, u_lo, u_hi + delta),
+            o_lo,
+            u_lo,
+            self.threshold,
+            spans,
+        )
+
+        # The hunks after the region move by ``delta`` through the deltas of the region alone
+        for h in range(first, last):
+            old_start, old_end, new_length = self._spans[h]
+            self._add_delta(old_start, (old_end - old_start) - new_length)
+        self._spans[first:last] = self._record(spans)
+        self._hunks[first:last] = hunks
+        return hunks
+
+
+cdef dict _shifted_hunk(dict hunk, Py_ssize_t shift):
+    """Copy of a hunk with its new-side line numbers moved by ``shift`` lines."""
+    cdef list lines = []
+    for entry in hunk["lines"]:
+        if "line_number_new" in entry:
+            entry = {**entry, "line_number_new": entry["line_number_new"] + shift}
+        lines.append(entry)
+    return {
+        **hunk,
+        "new_range": {"start": hunk["new_range"]["start"] + shift, "end": hunk["new_range"]["end"] + shift},
+        "lines": lines,
+    }
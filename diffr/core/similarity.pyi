@@ -0,0 +1,15 @@
+from collections.abc import Hashable, Iterable
+
+def similarity(a: str, b: str, tokenizer: str = "word") -> float: ...
+
+class SimilarityIndex:
+    tokenizer: str
+    q: int
+
+    def __init__(self, tokenizer: str = "word", q: int = 3) -> None: ...
+    def __len__(self) -> int: ...
+    def add(self, text: str, key: Hashable | None = None) -> int: ...
+    def extend(self, texts: Iterable[str]) -> None: ...
+    def query(
+        self, text: str, k: int = 5, threshold: float = 0.0, shortlist: int | None = None
+    ) -> list[tuple[Hashable, float]]: ...
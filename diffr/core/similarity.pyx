@@ -0,0 +1,215 @@
+from cpython cimport array
+
+import array
+from heapq import nsmallest
+
+from .myers import tokenize
+
+# ---------------------------------------------------------------------
+# Token similarity
+# ---------------------------------------------------------------------
+
+cdef dict _match_masks(object ids):
+    """Bit mask of the positions of every token id in ``ids``."""
+    cdef dict masks = {}
+    cdef object bit = 1
+    for token in ids:
+        masks[token] = masks.get(token, 0) | bit
+        bit <<= 1
+    return masks
+
+
+cdef Py_ssize_t _lcs_length(dict masks, Py_ssize_t n, object ids):
+    """
+    Length of the longest common subsequence of a sequence of ``n`` tokens, given by its match
+    masks, and ``ids``, with the bit-parallel recurrence of Allison-Dix and Hyyrö. Python integers
+    act as arbitrarily wide bit vectors, so each token of ``ids`` costs O(n / 64) word operations.
+    """
+    cdef object mask = (<object> 1 << n) - 1
+    cdef object v = mask
+    cdef object u
+    for token in ids:
+        u = v & masks.get(token, 0)
+        if u:
+            v = ((v + u) | (v - u)) & mask
+    return n - v.bit_count()
+
+
+cdef double _score(Py_ssize_t common, Py_ssize_t n, Py_ssize_t m):
+    # Equal tokens over all tokens of the edit script, as in the ``threshold`` of ``diff_hunks``
+    if n + m == 0:
+        return 0.0
+    return common / <double> (n + m - common)
+
+
+cpdef double similarity(str a, str b, str tokenizer="word"):
+    """
+    Token similarity of two texts, on the same scale as the ``threshold`` of ``diff_hunks``.
+
+    The score is the number of equal tokens of a minimal edit script divided by the length of the
+    script, ``lcs / (len(a) + len(b) - lcs)`` in tokens, where the longest common subsequence is
+    found bit-parallel instead of by running the Myers diff.
+
+    Parameters:
+        a (str): The first text
+        b (str): The second text
+        tokenizer (str): Tokenizer used to split both texts, see ``tokenize``
+
+    Returns:
+        float: A score between 0.0 and 1.0, 1.0 meaning the texts are equal
+    """
+    cdef list tokens_a = tokenize(a, tokenizer)
+    cdef list tokens_b = tokenize(b, tokenizer)
+    cdef Py_ssize_t common = _lcs_length(_match_masks(tokens_a), len(tokens_a), tokens_b)
+    return _score(common, len(tokens_a), len(tokens_b))
+
+
+# ---------------------------------------------------------------------
+# Similarity search
+# ---------------------------------------------------------------------
+
+cdef class SimilarityIndex:
+    """
+    Index of candidate texts for finding the ones most similar to a query.
+
+    Every candidate is tokenized once and stored as an array of interned token ids, and each of its
+    distinct token q-grams is added to an inverted index. A query counts the q-grams it shares with
+    each candidate through the index, keeps a short list of the candidates with the highest
+    estimated overlap, and verifies only those with the bit-parallel LCS ``similarity``. Candidates
+    that share no q-gram with the query are never considered.
+
+    Parameters:
+        tokenizer (str): Tokenizer used for candidates and queries, see ``tokenize``
+        q (int): Number of consecutive tokens per q-gram; texts shorter than that form a single gram
+    """
+
+    cdef readonly str tokenizer
+    cdef readonly int q
+    cdef list _keys
+    cdef list _ids
+    cdef list _n_grams
+    cdef dict _vocab
+    cdef dict _postings
+
+    def __init__(self, str tokenizer="word", int q=3):
+        if q < 1:
+            raise ValueError(f"q must be at least 1, got {q}")
+        tokenize("", tokenizer)  # Validate the tokenizer name
+        self.tokenizer = tokenizer
+        self.q = q
+        self._keys = []
+        self._ids = []
+        self._n_grams = []
+        self._vocab = {}
+        self._postings = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    cdef array.array _token_ids(self, str text, bint grow):
+        """Intern the tokens of ``text``; unknown tokens get -1 unless ``grow`` adds them."""
+        cdef array.array ids = array.array("i")
+        cdef dict vocab = self._vocab
+        for token in tokenize(text, self.tokenizer):
+            token_id = vocab.get(token)
+            if token_id is None:
+                if grow:
+                    token_id = len(vocab)
+                    vocab[token] = token_id
+                else:
+                    token_id = -1
+            ids.append(token_id)
+        return ids
+
+    cdef set _grams(self, array.array ids):
+        cdef Py_ssize_t n = len(ids), i
+        if n == 0:
+            return set()
+        if n <= self.q:
+            return {tuple(ids)}
+        return {tuple(ids[i:i + self.q]) for i in range(n - self.q + 1)}
+
+    def add(self, str text, key=None):
+        """
+        Add a candidate to the index.
+
+        Parameters:
+            text (str): The candidate text
+            key: Value reported for this candidate by ``query``; defaults to its insertion position
+
+        Returns:
+            int: The insertion position of the candidate
+        """
+        cdef Py_ssize_t position = len(self._keys)
+        cdef array.array ids = self._token_ids(text, True)
+        cdef set grams = self._grams(ids)
+        cdef dict postings = self._postings
+        for gram in grams:
+            posting = postings.get(gram)
+            if posting is None:
+                postings[gram] = array.array("i", [position])
+            else:
+                posting.append(position)
+        self._keys.append(position if key is None else key)
+        self._ids.append(ids)
+        self._n_grams.append(len(grams))
+        return position
+
+    def extend(self, texts):
+        """Add every text of ``texts``, keyed by insertion position; see ``add``."""
+        for text in texts:
+            self.add(text)
+
+    def query(self, str text, int k=5, double threshold=0.0, shortlist=None):
+        """
+        Find the ``k`` candidates most similar to ``text``.
+
+        Parameters:
+            text (str): The query text
+            k (int): Maximum number of results
+            threshold (float): Minimum ``similarity`` of a result
+            shortlist (int): Number of candidates verified exactly, ``max(4 * k, 32)`` by default
+
+        Returns:
+            list[tuple]: ``(key, score)`` pairs, most similar first
+        """
+        cdef array.array ids = self._token_ids(text, False)
+        cdef set grams = self._grams(ids)
+        cdef Py_ssize_t n_query = len(grams), n = len(ids), limit, i, position
+        cdef array.array counts, touched, posting
+        cdef int* shared
+        cdef list ranked, results = []
+        cdef dict masks
+        cdef double score
+
+        if k <= 0:
+            return []
+        limit = max(4 * k, 32) if shortlist is None else shortlist
+
+        # Count shared q-grams per candidate in a flat array, remembering which ones were hit
+        counts = array.clone(array.array("i"), len(self._keys), zero=True)
+        touched = array.array("i")
+        shared = counts.data.as_ints
+        for gram in grams:
+            posting = self._postings.get(gram)
+            if posting is None:
+                continue
+            for i in range(len(posting)):
+                position = posting.data.as_ints[i]
+                if shared[position] == 0:
+                    touched.append(position)
+                shared[position] += 1
+        if not touched:
+            return []
+
+        # Rank by the Jaccard index of the q-gram sets, then verify the best ones exactly
+        n_grams = self._n_grams
+        ranked = nsmallest(limit, touched, key=lambda p: (-counts[p] / (n_query + n_grams[p] - counts[p]), p))
+        masks = _match_masks(ids)
+        for position in ranked:
+            candidate = self._ids[position]
+            score = _score(_lcs_length(masks, n, candidate), n, len(candidate))
+            if score >= threshold:
+                results.append((score, position))
+        results.sort(key=lambda item: (-item[0], item[1]))
+        return [(self._keys[position], score) for score, position in results[:k]]
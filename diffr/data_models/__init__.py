@@ -1,3 +1,3 @@
-from .diff_model import Diff, DiffLine, Hunk
+from .diff_model import Diff, DiffLine, Hunk, Move
 
-__all__ = ["Diff", "Hunk", "DiffLine"]
+__all__ = ["Diff", "Hunk", "DiffLine", "Move"]
@@ -3,12 +3,13 @@ from enum import Enum
 
 
 class DiffLineType(str, Enum):
-    """Type of difference line: equal, insert, delete, or replace."""
+    """Type of difference line: equal, insert, delete, replace, or move."""
 
     EQUAL = "equal"
     INSERT = "insert"
     DELETE = "delete"
     REPLACE = "replace"
+    MOVE = "move"
 
 
 class InlineDiffType(str, Enum):
@@ -23,6 +24,7 @@ class InlineDiffType(str, Enum):
 class Colors:
     RED = "\033[91m"
     GREEN = "\033[92m"
+    MAGENTA = "\033[95m"
     BRIGHT_RED = "\033[1;91m"
     BRIGHT_GREEN = "\033[1;92m"
     STRIKE = "\033[9m"  # Strike-through formatting
@@ -71,6 +73,7 @@ class DiffLine:
     content_old: str | None = None
     content_new: str | None = None
     inline_diff: list[InlineDiff] = field(default_factory=list)
+    move: int | None = None
 
     def __str__(self) -> str:
         """Return a clear, colorized string representation of the line."""
@@ -104,6 +107,12 @@ class DiffLine:
                 new_line = format_line("+", new_line_num, self.content_new or "", Colors.GREEN)
                 return f"{old_line}\n{new_line}"
 
+        elif self.type == DiffLineType.MOVE:
+            # A moved line is either the source (old side) or the target (new side) of a move
+            if self.content_old is not None:
+                return format_line("<", self.line_number_old or 0, self.content_old, Colors.MAGENTA)
+            return format_line(">", self.line_number_new or 0, self.content_new or "", Colors.MAGENTA)
+
         return ""
 
 
@@ -122,11 +131,20 @@ class Hunk:
         return f"{header}\n{lines}"
 
 
+@dataclass
+class Move:
+    """Represents a block of lines moved from ``old_range`` to ``new_range``."""
+
+    old_range: Range
+    new_range: Range
+
+
 @dataclass
 class Diff:
     """Represents a complete diff, containing multiple hunks."""
 
     hunks: list[Hunk] = field(default_factory=list)
+    moves: list[Move] = field(default_factory=list)
 
     def __str__(self) -> str:
         """Return a string representation of the complete diff with all hunks."""
@@ -168,9 +186,15 @@ class Diff:
                         content_old=line_data.get("content_old"),
                         content_new=line_data.get("content_new"),
                         inline_diff=inline_diffs,
+                        move=line_data.get("move"),
                     )
                 )
 
             hunks.append(Hunk(old_range=old_range, new_range=new_range, lines=lines))
 
-        return cls(hunks=hunks)
+        moves = [
+            Move(old_range=Range(**move_data["old_range"]), new_range=Range(**move_data["new_range"]))
+            for move_data in data.get("moves", [])
+        ]
+
+        return cls(hunks=hunks, moves=moves)
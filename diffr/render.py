@@ -0,0 +1,184 @@
+"""Streaming renderers that write diff hunks straight to a text stream."""
+
+import sys
+from collections.abc import Iterable
+from typing import TextIO
+
+from .data_models.diff_model import Colors
+
+FORMATS = ("color", "plain", "unified", "word")
+
+DEFAULT_BUFFER_SIZE = 1 << 16
+
+# Follows the last line of a side without a final newline in the unified format, as in GNU diff
+NO_NEWLINE = "\\ No newline at end of file\n"
+
+
+class _ChunkWriter:
+    """Collect small writes and hand them to the stream in chunks of roughly ``buffer_size`` characters."""
+
+    def __init__(self, stream: TextIO, buffer_size: int):
+        self._stream = stream
+        self._buffer_size = buffer_size
+        self._parts: list[str] = []
+        self._pending = 0
+
+    def write(self, text: str) -> None:
+        self._parts.append(text)
+        self._pending += len(text)
+        if self._pending >= self._buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._parts:
+            self._stream.write("".join(self._parts))
+            self._parts.clear()
+            self._pending = 0
+
+
+def _range(data: dict) -> str:
+    """Format a range the way :class:`~diffr.data_models.diff_model.Range` does."""
+    if data["start"] == data["end"]:
+        return f"{data['start']}"
+    return f"{data['start']},{data['end']}"
+
+
+def _unified_range(data: dict) -> str:
+    """Format a range as GNU ``start,count``, where an empty side points at the line before the change."""
+    count = data["end"] - data["start"] + 1
+    if count == 1:
+        return f"{data['start']}"
+    if count == 0:
+        return f"{data['start'] - 1},0"
+    return f"{data['start']},{count}"
+
+
+def _write_line(out: _ChunkWriter, prefix: str, line_num: int, content: str, color: str, strike: bool = False):
+    if not color:
+        out.write(f"{prefix}{line_num:>4} {content}")
+    elif strike:
+        out.write(f"{prefix}{line_num:>4} {color}{Colors.STRIKE}{content}{Colors.RESET}")
+    else:
+        out.write(f"{prefix}{line_num:>4} {color}{content}{Colors.RESET}")
+
+
+def _write_inline(out: _ChunkWriter, inline_diff: list[dict], color: bool) -> None:
+    for chunk in inline_diff:
+        value = chunk["value"]
+        if chunk["type"] == "delete":
+            if color:
+                out.write(f"{Colors.STRIKE}{Colors.BRIGHT_RED}{value}{Colors.RESET}")
+            else:
+                out.write(f"[-{value}-]")
+        elif chunk["type"] == "insert":
+            if color:
+                out.write(f"{Colors.UNDERLINE}{Colors.BRIGHT_GREEN}{value}{Colors.RESET}")
+            else:
+                out.write(f"{{+{value}+}}")
+        else:
+            out.write(value)
+
+
+def _write_entry(out: _ChunkWriter, entry: dict, word: bool, color: bool) -> None:
+    line_type = entry["type"]
+    red = Colors.RED if color else ""
+    green = Colors.GREEN if color else ""
+
+    if line_type == "delete":
+        _write_line(out, "-", entry.get("line_number_old", 0), entry.get("content_old", ""), red, strike=True)
+    elif line_type == "insert":
+        _write_line(out, "+", entry.get("line_number_new", 0), entry.get("content_new", ""), green)
+    elif line_type == "replace":
+        inline_diff = entry.get("inline_diff")
+        if inline_diff and (word or color):
+            # Inline chunks are only readable with colors or word markers
+            out.write(f"{'~' if word else '+'}{entry.get('line_number_new', 0):>4} {green}")
+            _write_inline(out, inline_diff, color)
+            if color:
+                out.write(Colors.RESET)
+        else:
+            _write_line(out, "-", entry.get("line_number_old", 0), entry.get("content_old", ""), red, strike=True)
+            out.write("\n")
+            _write_line(out, "+", entry.get("line_number_new", 0), entry.get("content_new", ""), green)
+    elif line_type == "move":
+        magenta = Colors.MAGENTA if color else ""
+        if "content_old" in entry:
+            _write_line(out, "<", entry.get("line_number_old", 0), entry["content_old"], magenta)
+        else:
+            _write_line(out, ">", entry.get("line_number_new", 0), entry.get("content_new", ""), magenta)
+    else:
+        content = entry.get("content", "")
+        _write_line(out, " ", entry.get("line_number_old") or entry.get("line_number_new") or 0, content, "")
+
+
+def _write_readable(out: _ChunkWriter, hunks: Iterable[dict], word: bool, color: bool) -> None:
+    first = True
+    for hunk in hunks:
+        if not first:
+            out.write("\n\n")
+        first = False
+        out.write(f"@@ -{_range(hunk['old_range'])} +{_range(hunk['new_range'])} @@")
+        for entry in hunk["lines"]:
+            out.write("\n")
+            _write_entry(out, entry, word, color)
+
+    if first:
+        out.write("No differences found.")
+    out.write("\n")
+
+
+def _write_unified(out: _ChunkWriter, hunks: Iterable[dict], old_label: str, new_label: str, no_newline: dict) -> None:
+    old_last, new_last = no_newline.get("old"), no_newline.get("new")
+    header_written = False
+    for hunk in hunks:
+        if not header_written:
+            out.write(f"--- {old_label}\n+++ {new_label}\n")
+            header_written = True
+        out.write(f"@@ -{_unified_range(hunk['old_range'])} +{_unified_range(hunk['new_range'])} @@\n")
+        # Hunks carry no context, so all removals of a hunk come before its additions
+        for entry in hunk["lines"]:
+            if "content_old" in entry and entry["type"] != "equal":
+                out.write(f"-{entry['content_old']}\n")
+                if entry.get("line_number_old") == old_last:
+                    out.write(NO_NEWLINE)
+        for entry in hunk["lines"]:
+            if "content_new" in entry and entry["type"] != "equal":
+                out.write(f"+{entry['content_new']}\n")
+                if entry.get("line_number_new") == new_last:
+                    out.write(NO_NEWLINE)
+
+
+def render(
+    data: dict | Iterable[dict],
+    stream: TextIO | None = None,
+    format: str = "color",
+    color: bool = True,
+    old_label: str = "original",
+    new_label: str = "updated",
+    buffer_size: int = DEFAULT_BUFFER_SIZE,
+) -> None:
+    """
+    Write a diff to ``stream`` hunk by hunk, without building the whole text in memory.
+
+    Args:
+        data: Output of :func:`diffr.diff_hunks`, or any iterable of hunk dictionaries
+        stream: Text stream to write to, ``sys.stdout`` by default
+        format: One of ``color``, ``plain``, ``unified`` or ``word``
+        color: Whether ANSI colors may be used; ``color`` falls back to ``plain`` without it
+        old_label: Name of the original file in the ``---`` header of the unified format
+        new_label: Name of the updated file in the ``+++`` header of the unified format
+        buffer_size: Approximate number of characters collected before each write to the stream
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format {format!r}, expected one of {', '.join(FORMATS)}")
+
+    hunks = data.get("hunks", []) if isinstance(data, dict) else data
+    out = _ChunkWriter(stream if stream is not None else sys.stdout, buffer_size)
+
+    if format == "unified":
+        no_newline = data.get("no_newline_at_end", {}) if isinstance(data, dict) else {}
+        _write_unified(out, hunks, old_label, new_label, no_newline)
+    else:
+        _write_readable(out, hunks, word=format == "word", color=color and format != "plain")
+
+    out.flush()
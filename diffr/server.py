@@ -0,0 +1,401 @@
+"""Long-running diff server: a warm pool of workers and a shared result cache behind HTTP on a local socket."""
+
+import asyncio
+import errno
+import hashlib
+import io
+import json
+import os
+import signal
+import socket
+import stat
+from collections import OrderedDict
+
+from .aio import DiffExecutor
+from .client import DEFAULT_ADDRESS, parse_address
+from .core import DiffCancelledError, MemoryBudgetError, diff_hunks, dump_json
+from .render import FORMATS, render
+
+# Formats of the responses: the result of ``diff_hunks`` as JSON, or text rendered like the command line does
+RESPONSE_FORMATS = ("json", *FORMATS)
+
+# Options of ``diff_hunks`` a request can set; the others cannot travel as JSON
+OPTIONS = (
+    "threshold",
+    "detect_moves",
+    "min_move_lines",
+    "ignore_case",
+    "ignore_all_space",
+    "ignore_space_change",
+    "ignore_blank_lines",
+    "tokenizer",
+    "granularity",
+    "timeout_ms",
+    "max_memory",
+)
+
+CACHE_BYTES = 64 << 20
+
+# Largest request body accepted, inline texts included
+MAX_BODY = 256 << 20
+
+# Names of this machine accepted in the Host header, besides the address the server listens on. Others are refused,
+# so a web page whose name resolves to 127.0.0.1 cannot have a browser read diffs, and the files they name, from it.
+LOCAL_HOSTS = frozenset(("localhost", "127.0.0.1", "::1"))
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Content Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class RequestError(Exception):
+    """A request the server cannot answer, with the HTTP status to answer it with."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class ResultCache:
+    """Responses by request, least recently used first out once their total size passes ``max_bytes``."""
+
+    def __init__(self, max_bytes: int = CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[bytes, bytes] = OrderedDict()
+
+    def get(self, key: bytes) -> bytes | None:
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: bytes, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous)
+        self._entries[key] = value
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "bytes": self.size, "hits": self.hits, "misses": self.misses}
+
+
+def _cache_key(original: str, updated: str, settings: dict) -> bytes:
+    """Digest of both texts and every setting that changes the response; file paths only matter as labels."""
+    digest = hashlib.blake2b(json.dumps(settings, sort_keys=True).encode(), digest_size=20)
+    for text in (original, updated):
+        data = text.encode("utf-8", "surrogatepass")
+        digest.update(len(data).to_bytes(8, "little"))
+        digest.update(data)
+    return digest.digest()
+
+
+def _respond(
+    original: str,
+    updated: str,
+    cancel=None,
+    format: str = "json",
+    color: bool = False,
+    old_label: str = "original",
+    new_label: str = "updated",
+    **options,
+) -> bytes:
+    """Diff and serialize in the same worker, so only the encoded response travels back."""
+    result = diff_hunks(original, updated, cancel=cancel, **options)
+    if format == "json":
+        return dump_json(result)
+    out = io.StringIO()
+    render(result, out, format=format, color=color, old_label=old_label, new_label=new_label)
+    return out.getvalue().encode("utf-8", "surrogateescape")
+
+
+def _read(path: str) -> str:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        raise RequestError(f"No such file: {path}", 404) from None
+    except IsADirectoryError:
+        raise RequestError(f"Not a file: {path}") from None
+    except UnicodeDecodeError:
+        raise RequestError(f"Not a UTF-8 text file: {path}") from None
+
+
+def _host_name(host: str) -> str:
+    """Return the name in a Host header, without its port."""
+    if host.startswith("["):
+        return host[1:].partition("]")[0]
+    return host.partition(":")[0] if host.count(":") == 1 else host
+
+
+def _resolve(path: str, root: str | None) -> str:
+    """Return the real path of a file named by a request, refused unless it lies under ``root``."""
+    if root is None:
+        raise RequestError("This server does not read files, send the texts as 'old' and 'new'", 403)
+    root = os.path.realpath(root)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath((root, resolved)) != root:
+        raise RequestError(f"Not under the root of the server: {path}", 403)
+    return resolved
+
+
+def _parse_request(request: dict, root: str | None = "/") -> tuple[str, str, dict, dict]:
+    """
+    Check a request and read the files it names, see ``DiffServer``.
+
+    Args:
+        request: The decoded request object
+        root: Directory the files must lie in, relative paths being resolved under it; None refuses paths
+
+    Returns:
+        The original and updated texts, the settings of ``_respond`` and the options of ``diff_hunks``
+    """
+    if not isinstance(request, dict):
+        raise RequestError("The request must be a JSON object")
+    format = request.get("format", "json")
+    if format not in RESPONSE_FORMATS:
+        raise RequestError(f"Unknown format {format!r}, expected one of {', '.join(RESPONSE_FORMATS)}")
+    options = request.get("options") or {}
+    if not isinstance(options, dict):
+        raise RequestError("The options must be a JSON object")
+    unknown = [name for name in options if name not in OPTIONS]
+    if unknown:
+        raise RequestError(f"Unknown options {unknown}, expected some of {', '.join(OPTIONS)}")
+
+    texts = []
+    for side in ("old", "new"):
+        if isinstance(request.get(side), str):
+            texts.append(request[side])
+        elif isinstance(request.get(f"{side}_path"), str):
+            texts.append(_read(_resolve(request[f"{side}_path"], root)))
+        else:
+            raise RequestError(f"Give the {side} text as {side!r} or its path as '{side}_path'")
+    settings = {
+        "format": format,
+        "color": bool(request.get("color", False)),
+        "old_label": str(request.get("old_label") or request.get("old_path") or "original"),
+        "new_label": str(request.get("new_label") or request.get("new_path") or "updated"),
+    }
+    if format != "unified":
+        # Labels only appear in unified headers, so other responses are shared between paths
+        del settings["old_label"], settings["new_label"]
+    return texts[0], texts[1], settings, options
+
+
+def _remove_stale_socket(path: str) -> None:
+    """
+    Remove the Unix socket at ``path`` if no server listens on it any more.
+
+    Args:
+        path: Where the server is about to listen
+
+    Raises:
+        FileExistsError: When ``path`` is not a socket, which is never removed
+        OSError: When a server still listens on the socket
+    """
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(errno.EEXIST, "Not a Unix socket, refusing to replace it", path)
+    with socket.socket(socket.AF_UNIX) as probe:
+        try:
+            probe.connect(path)
+        except ConnectionRefusedError:
+            os.unlink(path)
+            return
+    raise OSError(errno.EADDRINUSE, "A server already listens on this socket", path)
+
+
+class DiffServer:
+    """
+    Answers diff requests from a warm ``DiffExecutor``, remembering responses in a ``ResultCache``.
+
+    A request is a JSON object with the texts to diff, as ``old`` and ``new`` or as paths readable
+    under ``root`` in ``old_path`` and ``new_path``. ``format`` is one of ``RESPONSE_FORMATS``,
+    "json" by default, ``color`` allows ANSI colors in rendered text, ``old_label`` and
+    ``new_label`` name the files in unified headers, and ``options`` holds keyword arguments of
+    ``diff_hunks``, see ``OPTIONS``.
+
+    Paths let any client read the files the server can, so they are refused unless a ``root``
+    is given; "/" allows every file, which suits a Unix socket only its owner can connect to.
+    Requests with a Host header other than a name of this machine are refused, see ``LOCAL_HOSTS``.
+    """
+
+    def __init__(self, executor: DiffExecutor | None = None, cache: ResultCache | None = None, root: str | None = None):
+        self.executor = executor if executor is not None else DiffExecutor()
+        self.cache = cache if cache is not None else ResultCache()
+        self.root = root
+        self.hosts = set(LOCAL_HOSTS)
+        self.requests = 0
+
+    async def diff(self, request: dict) -> tuple[str, bytes]:
+        """
+        Answer one diff request.
+
+        Args:
+            request: The decoded request object
+
+        Returns:
+            The content type and body of the response
+        """
+        original, updated, settings, options = _parse_request(request, self.root)
+        key = _cache_key(original, updated, {**settings, "options": options})
+        body = self.cache.get(key)
+        if body is None:
+            try:
+                body = await self.executor.run(_respond, original, updated, **settings, **options)
+            except asyncio.QueueFull as error:
+                raise RequestError(str(error), 503) from None
+            except (TypeError, ValueError) as error:
+                raise RequestError(str(error)) from None
+            self.cache.put(key, body)
+        return ("application/json" if settings["format"] == "json" else "text/plain; charset=utf-8"), body
+
+    def health(self) -> dict:
+        """Counters of the server, answered to ``GET /health``."""
+        return {
+            "status": "ok",
+            "pid": os.getpid(),
+            "requests": self.requests,
+            "executor": {
+                "kind": self.executor.kind,
+                "workers": self.executor.max_workers,
+                "running": self.executor.running,
+                "waiting": self.executor.waiting,
+            },
+            "cache": self.cache.stats(),
+        }
+
+    async def _dispatch(self, method: str, target: str, body: bytes) -> tuple[int, str, bytes]:
+        if target == "/health":
+            if method != "GET":
+                return 405, "application/json", b'{"error": "Use GET"}'
+            return 200, "application/json", json.dumps(self.health()).encode()
+        if target != "/diff":
+            return 404, "application/json", b'{"error": "Not found, use POST /diff or GET /health"}'
+        if method != "POST":
+            return 405, "application/json", b'{"error": "Use POST"}'
+        self.requests += 1
+        try:
+            try:
+                request = json.loads(body)
+            except ValueError as error:
+                raise RequestError(f"Invalid JSON: {error}") from None
+            content_type, payload = await self.diff(request)
+            return 200, content_type, payload
+        except RequestError as error:
+            return error.status, "application/json", json.dumps({"error": str(error)}).encode()
+        except (MemoryBudgetError, DiffCancelledError) as error:
+            return 500, "application/json", json.dumps({"error": str(error)}).encode()
+        except Exception as error:
+            # Anything else, like a worker that died with the diff, still gets an answer
+            return 500, "application/json", json.dumps({"error": f"{type(error).__name__}: {error}"}).encode()
+
+    async def _connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve the HTTP/1.1 requests of one connection, keeping it open between them."""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                try:
+                    method, target, version = line.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers = {}
+                while (header := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = header.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                if length > MAX_BODY:
+                    status, content_type, payload = 413, "application/json", b'{"error": "Request too large"}'
+                    keep_alive = False
+                elif "host" in headers and _host_name(headers["host"]).lower() not in self.hosts:
+                    status, content_type, payload = 403, "application/json", b'{"error": "Unknown host"}'
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, content_type, payload = await self._dispatch(method, target.partition("?")[0], body)
+                head = f"HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Type: {content_type}\r\n"
+                head += f"Content-Length: {len(payload)}\r\n" + ("" if keep_alive else "Connection: close\r\n")
+                writer.write(head.encode("latin-1") + b"\r\n" + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, address: str = DEFAULT_ADDRESS, ready=None) -> None:
+        """
+        Listen on ``address`` until cancelled, or until the process gets SIGTERM.
+
+        A Unix socket is created readable and writable by its owner only, and removed on the way out if it is still
+        the one this server created.
+
+        Args:
+            address: See ``parse_address``; a Unix socket left at the path by a server that is gone is replaced
+            ready: Called without arguments once the server accepts connections
+
+        Raises:
+            OSError: When something other than a stale socket is at the path of a Unix socket
+        """
+        where = parse_address(address)
+        if isinstance(where, str):
+            _remove_stale_socket(where)
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        except (AttributeError, NotImplementedError, RuntimeError):
+            pass  # Windows, or an event loop outside of the main thread
+        created = None
+        try:
+            # Warm the pool before accepting anything, so no request pays for starting it
+            await loop.run_in_executor(None, self.executor.start)
+            if isinstance(where, str):
+                # Created with its permissions rather than changed after, so no other user connects in between
+                umask = os.umask(0o177)
+                try:
+                    server = await asyncio.start_unix_server(self._connection, where)
+                finally:
+                    os.umask(umask)
+                created = os.lstat(where)
+            else:
+                self.hosts.add(where[0].lower())
+                server = await asyncio.start_server(self._connection, *where)
+            async with server:
+                if ready is not None:
+                    ready()
+                await server.serve_forever()
+        finally:
+            if created is not None:
+                try:
+                    current = os.lstat(where)
+                except FileNotFoundError:
+                    pass
+                else:
+                    if (current.st_dev, current.st_ino) == (created.st_dev, created.st_ino):
+                        os.unlink(where)
+            await loop.run_in_executor(None, self.executor.shutdown)
@@ -26,6 +26,36 @@ def get_extensions():  # noqa: D103
                 sources=["diffr/core/patience.pyx"],
                 extra_compile_args=["-O3"],  # Optimize for speed
             ),
+            Extension(
+                "diffr.core.session",
+                sources=["diffr/core/session.pyx"],
+                extra_compile_args=["-O3"],  # Optimize for speed
+            ),
+            Extension(
+                "diffr.core.patch",
+                sources=["diffr/core/patch.pyx"],
+                extra_compile_args=["-O3"],  # Optimize for speed
+            ),
+            Extension(
+                "diffr.core.merge",
+                sources=["diffr/core/merge.pyx"],
+                extra_compile_args=["-O3"],  # Optimize for speed
+            ),
+            Extension(
+                "diffr.core.renames",
+                sources=["diffr/core/renames.pyx"],
+                extra_compile_args=["-O3"],  # Optimize for speed
+            ),
+            Extension(
+                "diffr.core.similarity",
+                sources=["diffr/core/similarity.pyx"],
+                extra_compile_args=["-O3"],  # Optimize for speed
+            ),
+            Extension(
+                "diffr.core.serialize",
+                sources=["diffr/core/serialize.pyx"],
+                extra_compile_args=["-O3"],  # Optimize for speed
+            ),
         ]
 
         return cythonize(
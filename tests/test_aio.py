@@ -0,0 +1,82 @@
+import asyncio
+import threading
+
+import pytest
+
+import diffr
+from diffr import DiffCancelledError, DiffStats, aio
+from diffr.bench.workloads import Workload, generate
+
+OLD, NEW = generate(Workload(lines=500, seed=47))
+
+
+@pytest.mark.parametrize("kind", ["thread", "process"])
+def test_results_match_the_engine(kind):
+    async def run(executor):
+        stats = DiffStats()
+        hunks = await executor.diff_hunks(OLD, NEW, stats=stats)
+        line = await executor.diff_line("a b c d", "a x c y", output="runs")
+        return hunks, stats, line
+
+    executor = aio.DiffExecutor(1, kind=kind, inline_below=0)
+    try:
+        hunks, stats, line = asyncio.run(run(executor))
+    finally:
+        executor.shutdown()
+    assert hunks["stats"] is stats
+    assert stats.recursions > 0
+    del hunks["stats"]
+    assert hunks == diffr.diff_hunks(OLD, NEW)
+    assert line == diffr.diff_line("a b c d", "a x c y", output="runs")
+
+
+def test_engine_checks_for_cancellation():
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(DiffCancelledError):
+        diffr.diff_hunks(OLD, NEW, cancel=cancel)
+
+
+def test_cancelled_caller_frees_its_turn():
+    big = generate(Workload(lines=200_000, seed=47))
+
+    async def run(executor):
+        task = asyncio.create_task(executor.diff_hunks(*big))
+        while not executor.running:
+            await asyncio.sleep(0.001)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The diff stops at its next checkpoint and the next one gets the worker
+        return await asyncio.wait_for(executor.diff_hunks(OLD, NEW), 30)
+
+    executor = aio.DiffExecutor(1, kind="thread", inline_below=0)
+    try:
+        assert asyncio.run(run(executor)) == diffr.diff_hunks(OLD, NEW)
+    finally:
+        executor.shutdown()
+
+
+def test_callers_beyond_max_waiting_are_refused():
+    async def run(executor):
+        return await asyncio.gather(*(executor.diff_hunks(OLD, NEW) for _ in range(4)), return_exceptions=True)
+
+    executor = aio.DiffExecutor(1, kind="thread", inline_below=0, max_waiting=1)
+    try:
+        results = asyncio.run(run(executor))
+    finally:
+        executor.shutdown()
+    assert [isinstance(result, asyncio.QueueFull) for result in results] == [False, False, True, True]
+    assert results[0] == results[1] == diffr.diff_hunks(OLD, NEW)
+
+
+def test_shared_executor():
+    executor = aio.DiffExecutor(1, kind="thread")
+    previous = aio.set_executor(executor)
+    try:
+        assert aio.get_executor() is executor
+        assert asyncio.run(aio.diff_hunks("a\n", "b\n")) == diffr.diff_hunks("a\n", "b\n")
+        assert asyncio.run(aio.diff_line("a b", "a c")) == diffr.diff_line("a b", "a c")
+    finally:
+        aio.set_executor(previous)
+        executor.shutdown()
@@ -0,0 +1,57 @@
+import json
+import os
+
+import pytest
+
+from diffr import batch
+from diffr.batch import run_batch
+
+_run_chunk = batch._run_chunk
+
+
+def _manifest(count: int) -> list[str]:
+    return [json.dumps({"id": f"pair-{i}", "old": f"{i}\nsame\n", "new": f"{i + 1}\nsame\n"}) for i in range(count)]
+
+
+def _kill_worker_at_pair_20(chunk, defaults):
+    if any(index == 20 for index, _ in chunk):
+        os._exit(1)
+    return _run_chunk(chunk, defaults)
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+@pytest.mark.parametrize("ordered", [False, True])
+def test_every_pair_gets_a_result(jobs, ordered):
+    lines = []
+    counts = run_batch(_manifest(40), lines.append, jobs=jobs, ordered=ordered)
+    assert counts == {"pairs": 40, "failed": 0}
+    results = [json.loads(line) for line in lines]
+    assert sorted(result["index"] for result in results) == list(range(40))
+    if ordered:
+        assert [result["index"] for result in results] == list(range(40))
+    first = next(result for result in results if result["index"] == 0)
+    assert first["id"] == "pair-0"
+    assert first["result"]["hunks"][0]["lines"][0]["content_new"] == "1"
+
+
+def test_bad_pairs_fail_alone():
+    lines = []
+    manifest = ["not json", json.dumps({"old": "a"}), *_manifest(2), "", json.dumps({"old_path": "/nonexistent"})]
+    counts = run_batch(manifest, lines.append, jobs=1, defaults={"new": "b\n"})
+    assert counts == {"pairs": 5, "failed": 2}
+    errors = {json.loads(line)["index"]: "error" in json.loads(line) for line in lines}
+    assert errors == {0: True, 1: False, 2: False, 3: False, 5: True}
+
+
+@pytest.mark.parametrize("ordered", [False, True])
+def test_dead_worker_fails_only_its_chunk(monkeypatch, ordered):
+    monkeypatch.setattr(batch, "_run_chunk", _kill_worker_at_pair_20)
+    lines = []
+    counts = run_batch(_manifest(40), lines.append, jobs=2, ordered=ordered)
+    results = [json.loads(line) for line in lines]
+    assert sorted(result["index"] for result in results) == list(range(40))
+    failed = sorted(result["index"] for result in results if "error" in result)
+    # Pair 20 is in the second chunk of CHUNK_ENTRIES pairs
+    assert failed == list(range(16, 32))
+    assert counts == {"pairs": 40, "failed": 16}
+    assert "BrokenProcessPool" in next(result for result in results if "error" in result)["error"]
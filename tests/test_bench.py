@@ -0,0 +1,124 @@
+import json
+import shutil
+
+import pytest
+
+from diffr import diff_hunks, diff_line
+from diffr.bench.__main__ import main as bench
+from diffr.bench.alternatives import Pair, available_engines, load_corpus, run_alternatives
+from diffr.bench.harness import Scenario, compare, percentile, run_scenario, run_scenarios, summarize
+from diffr.bench.memory import measure, measure_scenario, run_memory
+from diffr.bench.scenarios import SCENARIOS
+from diffr.bench.workloads import Workload, generate
+
+
+def test_percentile_and_summary():
+    assert percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.5
+    assert percentile([1.0, 2.0, 3.0, 4.0], 100) == 4.0
+    summary = summarize([3.0, 1.0, 2.0])
+    assert (summary["min"], summary["median"], summary["max"], summary["mean"]) == (1.0, 2.0, 3.0, 2.0)
+
+
+def test_run_scenarios():
+    calls = []
+    scenario = Scenario("append", "Append to a list", lambda: lambda: calls.append(1), inner=2)
+    result = run_scenario(scenario, repeat=3, warmup=1)
+    assert len(calls) == 1 + 3 * 2
+    assert 0 <= result["min"] <= result["median"] <= result["max"]
+
+    report = run_scenarios([SCENARIOS["tokenize"]], repeat=2, warmup=0)
+    assert set(report["scenarios"]) == {"tokenize"}
+    json.dumps(report)
+
+
+def _report(**medians) -> dict:
+    return {"scenarios": {name: {"median": median} for name, median in medians.items()}}
+
+
+def test_compare():
+    rows = compare(_report(a=1.0, b=1.0, c=1.0, gone=1.0), _report(a=1.05, b=1.5, c=0.5, added=1.0))
+    assert {row["name"]: row["status"] for row in rows} == {
+        "a": "ok",
+        "b": "regressed",
+        "c": "improved",
+        "gone": "missing",
+        "added": "new",
+    }
+    with pytest.raises(ValueError):
+        compare(_report(), _report(), metric="fastest")
+
+
+def test_compare_command(tmp_path):
+    for name, report in (("base", _report(a=1.0)), ("same", _report(a=1.0)), ("slow", _report(a=2.0))):
+        (tmp_path / f"{name}.json").write_text(json.dumps(report))
+    assert bench(["compare", str(tmp_path / "base.json"), str(tmp_path / "same.json")]) == 0
+    assert bench(["compare", str(tmp_path / "base.json"), str(tmp_path / "slow.json")]) != 0
+
+
+def test_workloads():
+    old, new = generate(Workload(lines=200, seed=3))
+    assert old.count("\n") == 200
+    assert generate(Workload(lines=200, seed=3)) == (old, new)
+    assert generate(Workload(lines=200, seed=4)) != (old, new)
+
+    old, new = generate(Workload(lines=100, edit_types=("insert",), edit_density=0.1))
+    assert (old.count("\n"), new.count("\n")) == (100, 110)
+    old, new = generate(Workload(lines=100, edit_types=("delete",), edit_density=0.1))
+    assert (old.count("\n"), new.count("\n")) == (100, 90)
+    old, new = generate(Workload(lines=500, edit_density=0.02, edit_types=("move",), move_size=10))
+    assert sorted(old.splitlines()) == sorted(new.splitlines())
+    assert diff_hunks(old, new, detect_moves=True)["moves"]
+
+    old, _ = generate(Workload(lines=1_000, length_distribution="fixed", line_length=30, duplicate_ratio=0.5))
+    assert {len(line) for line in old.splitlines()} == {30}
+    assert len(set(old.splitlines())) < 700
+
+
+@pytest.mark.parametrize(
+    "settings", [{"length_distribution": "normal"}, {"edit_types": ("swap",)}, {"edit_types": ()}, {"edit_density": 2}]
+)
+def test_invalid_workloads(settings):
+    with pytest.raises(ValueError):
+        Workload(**settings)
+
+
+def test_memory_measures():
+    result = measure(lambda: [0] * 100_000)
+    assert result["peak"] >= result["retained"] >= 800_000
+    assert result["trace_peak"] == 0
+    # The malloc'd trace of the line diff is counted apart from Python allocations
+    assert measure(lambda: diff_line("a b c " * 300, "a x c " * 300))["trace_peak"] > 0
+
+    # Measured in a fresh interpreter, or here
+    for isolate in (True, False):
+        result = measure_scenario(SCENARIOS["tokenize"], isolate=isolate)
+        assert result["description"] == SCENARIOS["tokenize"].description
+        assert result["peak"] > 0
+    # Scenarios run outside of the process are skipped
+    assert set(run_memory([SCENARIOS["cli"], SCENARIOS["tokenize"]], isolate=False)) == {"tokenize"}
+
+
+def test_alternatives(tmp_path):
+    for side, text in (("old", "a\nb\nc\nd\n"), ("new", "a\nB\nc\nd\ne\n")):
+        (tmp_path / side / "sub").mkdir(parents=True)
+        (tmp_path / side / "sub" / "f.txt").write_text(text)
+    (tmp_path / "old" / "only_old.txt").write_text("x\n")
+    corpus = load_corpus(str(tmp_path / "old"), str(tmp_path / "new"))
+    assert [pair.name for pair in corpus] == ["sub/f.txt"]
+
+    engines = [name for name in available_engines() if name != "git"]
+    report = run_alternatives(corpus, engines, repeat=2, memory=False)
+    [pair] = report["pairs"]
+    # Every engine finds the replaced line and the added one
+    assert {name: result["changes"] for name, result in pair["results"].items()} == dict.fromkeys(engines, 3)
+    assert report["engines"]["difflib"]["changes_agreement"] == 1.0
+    json.dumps(report)
+    with pytest.raises(ValueError):
+        run_alternatives(corpus, ["svn"])
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="needs git")
+def test_git_alternative():
+    pair = Pair("f", "a\nb\nc\n", "a\nB\nc\n")
+    report = run_alternatives([pair], ["diffr", "git"], repeat=1)
+    assert report["pairs"][0]["results"]["git"]["hunks"] == report["pairs"][0]["results"]["diffr"]["hunks"] == 1
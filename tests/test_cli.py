@@ -0,0 +1,81 @@
+import asyncio
+import json
+import pstats
+import threading
+
+import pytest
+
+from diffr import cli
+from diffr.aio import DiffExecutor
+from diffr.cli import main
+from diffr.server import DiffServer, ResultCache
+
+
+def test_merge_subcommand(tmp_path, capsys):
+    for name, text in (("base", "a\nb\nc\n"), ("ours", "A\nb\nc\n"), ("theirs", "a\nb\nC\n")):
+        (tmp_path / name).write_text(text)
+    assert main(["merge", str(tmp_path / "base"), str(tmp_path / "ours"), str(tmp_path / "theirs")]) == 0
+    assert capsys.readouterr().out == "A\nb\nC\n"
+
+
+def test_file_named_like_a_subcommand(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "merge").write_text("a\n")
+    (tmp_path / "other.txt").write_text("b\n")
+    for argv in (["--format", "unified", "merge", "other.txt"], ["--format", "unified", "--", "merge", "other.txt"]):
+        assert main(argv) == 0
+        assert capsys.readouterr().out.splitlines()[:4] == ["--- merge", "+++ other.txt", "@@ -1 +1 @@", "-a"]
+    assert main(["--", "merge", "other.txt"]) == 0
+    assert "Lines in file 1: 1" in capsys.readouterr().err
+
+
+def test_profile_and_stats(tmp_path, capsys):
+    (tmp_path / "a.txt").write_text("a\nb\n")
+    (tmp_path / "b.txt").write_text("a\nc\n")
+    files = [str(tmp_path / "a.txt"), str(tmp_path / "b.txt")]
+    stats_file, profile = tmp_path / "stats.json", tmp_path / "run.pstats"
+    assert main([*files, "--profile", "--stats-json", str(stats_file), "--pstats", str(profile)]) == 0
+    err = capsys.readouterr().err
+    for phase in ("read", "diff", "  anchors", "render", "total"):
+        assert f"\n{phase} " in err
+
+    stats = json.loads(stats_file.read_text())
+    assert (stats["lines"], stats["hunks"]) == ({"old": 2, "new": 2}, 1)
+    assert {"read", "diff", "render"} <= stats["phases"].keys()
+    assert stats["engine"]["line_diffs"] == 1
+    assert pstats.Stats(str(profile)).total_calls > 0
+
+
+def test_remote_cannot_be_profiled(tmp_path):
+    (tmp_path / "a.txt").write_text("a\n")
+    with pytest.raises(SystemExit):
+        main([str(tmp_path / "a.txt"), str(tmp_path / "a.txt"), "--remote", "--profile"])
+
+
+def test_remote_before_the_files(tmp_path, monkeypatch, capsys):
+    (tmp_path / "a.txt").write_text("a\n")
+    (tmp_path / "b.txt").write_text("b\n")
+    files = [str(tmp_path / "a.txt"), str(tmp_path / "b.txt")]
+    address = str(tmp_path / "diffr.sock")
+    monkeypatch.setattr(cli, "DEFAULT_ADDRESS", address)
+    server = DiffServer(DiffExecutor(kind="thread"), ResultCache(), "/")
+    ready = threading.Event()
+    running = {}
+
+    async def serve():
+        running["loop"], running["task"] = asyncio.get_running_loop(), asyncio.current_task()
+        try:
+            await server.serve(address, ready=ready.set)
+        except asyncio.CancelledError:
+            pass
+
+    thread = threading.Thread(target=asyncio.run, args=(serve(),))
+    thread.start()
+    try:
+        assert ready.wait(10)
+        for options in (["--remote"], ["--remote-address", address], ["--remote", "--remote-address", address]):
+            assert main([*options, *files, "--format", "unified"]) == 0
+            assert capsys.readouterr().out.splitlines()[2:] == ["@@ -1 +1 @@", "-a", "+b"]
+    finally:
+        running["loop"].call_soon_threadsafe(running["task"].cancel)
+        thread.join(10)
@@ -0,0 +1,128 @@
+import random
+import subprocess
+import sys
+import time
+
+import pytest
+
+from diffr import DiffStats, apply, diff_hunks, diff_line, get_numpy_threshold, set_numpy_threshold
+
+OLD = "".join(f"line {i}\n" for i in range(10))
+LINES = OLD.splitlines(keepends=True)
+
+
+def _types(result: dict) -> list[str]:
+    return [line["type"] for hunk in result["hunks"] for line in hunk["lines"]]
+
+
+def test_moved_block():
+    new = "".join(LINES[:2] + LINES[6:9] + LINES[2:6] + LINES[9:])
+    result = diff_hunks(OLD, new, detect_moves=True)
+    assert result["moves"] == [{"old_range": {"start": 7, "end": 9}, "new_range": {"start": 3, "end": 5}}]
+    assert set(_types(result)) == {"move"}
+    assert apply(OLD, result) == new
+    assert apply(new, result, reverse=True) == OLD
+    assert "move" not in _types(diff_hunks(OLD, new))
+    # Shorter blocks than min_move_lines stay insertions and deletions
+    assert "move" not in _types(diff_hunks(OLD, new, detect_moves=True, min_move_lines=4))
+
+
+CODE = "def f(x):\n    return x\n\nprint(1)\n"
+IGNORE_MODES = ("ignore_case", "ignore_all_space", "ignore_space_change", "ignore_blank_lines")
+
+
+@pytest.mark.parametrize(
+    ("updated", "ignored_by"),
+    [
+        ("DEF F(x):\n    return x\n\nprint(1)\n", {"ignore_case"}),
+        ("def f(x):\n        return   x\n\nprint(1)\n", {"ignore_all_space", "ignore_space_change"}),
+        ("def f( x ):\n    return x\n\nprint(1)\n", {"ignore_all_space"}),
+        ("def f(x):\n    return x\nprint(1)\n", {"ignore_blank_lines"}),
+    ],
+)
+def test_ignore_modes(updated, ignored_by):
+    assert diff_hunks(CODE, updated)["hunks"]
+    for mode in IGNORE_MODES:
+        assert (diff_hunks(CODE, updated, **{mode: True})["hunks"] == []) == (mode in ignored_by), mode
+
+
+def test_ignore_modes_in_diff_line():
+    ops = diff_line("Hello World", "hello   world", ignore_case=True, ignore_space_change=True)
+    assert {op for op, _ in ops} == {"equal"}
+    assert {op for op, _ in diff_line("Hello World", "hello world")} != {"equal"}
+
+
+def _edited_file(seed: int) -> tuple[str, str]:
+    rng = random.Random(seed)
+    old = "".join(f"line {rng.randrange(50)} {i % 7}\n" for i in range(2_000))
+    new = "".join(line if rng.random() > 0.1 else f"changed {line}" for line in old.splitlines(keepends=True))
+    return old, new
+
+
+def test_expired_budget_degrades_to_a_valid_diff():
+    old, new = _edited_file(38)
+    for budget in ({"deadline": time.monotonic() - 1}, {"timeout_ms": 0}):
+        result = diff_hunks(old, new, **budget)
+        assert result["degraded"] == ["region"]
+        assert apply(old, result) == new
+        assert apply(new, result, reverse=True) == old
+    result = diff_hunks(old, new, timeout_ms=60_000)
+    assert result["degraded"] == []
+    assert result["hunks"] == diff_hunks(old, new)["hunks"]
+
+
+def test_expired_budget_in_diff_line():
+    degraded = []
+    ops = diff_line("a b c d", "a x c y", deadline=time.monotonic() - 1, degraded=degraded)
+    assert degraded == ["region"]
+    assert "".join(token for op, token in ops if op != "insert") == "a b c d"
+    assert "".join(token for op, token in ops if op != "delete") == "a x c y"
+
+
+def test_stats():
+    new = OLD.replace("line 5\n", "line five\n").replace("line 8\n", "")
+    result = diff_hunks(OLD, new, stats=True)
+    stats = result["stats"]
+    assert isinstance(stats, DiffStats)
+    assert {"split", "anchors", "hunks"} <= stats.timings.keys()
+    assert all(seconds >= 0 for seconds in stats.timings.values())
+    assert (stats.anchors, stats.line_diffs) == (8, 1)
+    assert stats.as_dict()["anchors"] == 8
+    assert "stats" not in diff_hunks(OLD, new)
+    assert {key: value for key, value in result.items() if key != "stats"} == diff_hunks(OLD, new)
+
+
+def test_stats_add_up():
+    stats = DiffStats()
+    diff_line("a b c", "a x c", stats=stats)
+    diff_line("a b c", "a y c", stats=stats)
+    assert (stats.line_diffs, stats.edit_distance) == (2, 4)
+    stats.add_time("render", 0.5)
+    stats.add_time("render", 0.25)
+    assert stats.timings["render"] == 0.75
+    # An instance passed to diff_hunks is filled in place
+    assert diff_hunks("a b\n", "a c\n", stats=stats)["stats"] is stats
+    assert stats.line_diffs == 3
+
+
+def test_numpy_anchors_give_the_same_diff():
+    pytest.importorskip("numpy")
+    rng = random.Random(46)
+    pairs = [_edited_file(seed) for seed in range(3)]
+    # Few distinct lines, so most are not unique and anchors are rare
+    pairs.append(("".join(rng.choices("ab\n", k=3_000)) + "\n", "".join(rng.choices("ab\n", k=3_000)) + "\n"))
+    previous = set_numpy_threshold(None)
+    try:
+        assert get_numpy_threshold() is None
+        expected = [diff_hunks(old, new) for old, new in pairs]
+        set_numpy_threshold(1)
+        assert get_numpy_threshold() == 1
+        assert [diff_hunks(old, new) for old, new in pairs] == expected
+    finally:
+        set_numpy_threshold(previous)
+    assert get_numpy_threshold() == previous
+
+
+def test_numpy_is_imported_on_demand():
+    code = "import sys, diffr; diffr.diff_hunks('a\\n', 'b\\n'); print('numpy' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout == "False\n"
@@ -0,0 +1,168 @@
+import random
+
+import pytest
+
+from diffr import (
+    MemoryBudgetError,
+    diff_hunks,
+    diff_line,
+    diff_line_spans,
+    get_max_memory,
+    reset_trace_memory,
+    set_max_memory,
+    tokenize,
+    tokenize_spans,
+    trace_memory,
+)
+from diffr.core.myers import TOKENIZERS
+
+SAMPLES = ["x = y + 1;  // tail", "café данные 日本語", "𝔘𝔫𝔦 = naïve", "", "  "]
+
+
+@pytest.mark.parametrize("tokenizer", TOKENIZERS)
+@pytest.mark.parametrize("text", SAMPLES)
+def test_tokens_cover_the_text(tokenizer, text):
+    tokens = tokenize(text, tokenizer)
+    assert "".join(tokens) == text
+    assert all(tokens)
+
+
+def test_tokenizers():
+    assert tokenize("x == 2.0e-3;") == ["x", " ", "=", "=", " ", "2", ".", "0e", "-", "3", ";"]
+    assert tokenize("x == 2.0e-3;", "code") == ["x", " ", "==", " ", "2.0e-3", ";"]
+    assert tokenize("a+b  c", "whitespace") == ["a+b", "  ", "c"]
+    assert tokenize("ab c", "char") == ["a", "b", " ", "c"]
+    with pytest.raises(ValueError):
+        tokenize("a", "lines")
+
+
+def test_unicode_words():
+    # Strings stored one, two and four bytes per character
+    for word in ("café", "данные", "日本語", "𝔘𝔫𝔦"):
+        assert tokenize(f"{word}, x") == [word, ",", " ", "x"]
+    # A combining mark stays with the letter it follows
+    assert tokenize("nai\u0308ve!") == ["nai\u0308ve", "!"]
+
+
+@pytest.mark.parametrize("tokenizer", TOKENIZERS)
+@pytest.mark.parametrize("text", SAMPLES)
+def test_spans_match_tokens(tokenizer, text):
+    bounds = tokenize_spans(text, tokenizer)
+    assert bounds.typecode == "i"
+    assert [text[bounds[k] : bounds[k + 1]] for k in range(len(bounds) - 1)] == tokenize(text, tokenizer)
+
+
+def test_diff_line_spans():
+    old, new = "the quick brown fox", "the slow brown dog"
+    opcodes, old_bounds, new_bounds = diff_line_spans(old, new)
+    assert opcodes == [("equal", 0, 2, 0, 2), ("replace", 2, 3, 2, 3), ("equal", 3, 6, 3, 6), ("replace", 6, 7, 6, 7)]
+    assert (list(old_bounds), list(new_bounds)) == (list(tokenize_spans(old)), list(tokenize_spans(new)))
+    # The same changes as diff_line, as ranges of tokens
+    changes = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag != "equal":
+            changes += [
+                ("delete", old[old_bounds[i1] : old_bounds[i2]]),
+                ("insert", new[new_bounds[j1] : new_bounds[j2]]),
+            ]
+    assert changes == [(op, token) for op, token in diff_line(old, new) if op != "equal"]
+
+
+def test_output_modes():
+    old, new = "the quick brown fox", "the slow brown dog"
+    runs = diff_line(old, new, output="runs")
+    assert runs == [
+        ("equal", "the "),
+        ("delete", "quick"),
+        ("insert", "slow"),
+        ("equal", " brown "),
+        ("delete", "fox"),
+        ("insert", "dog"),
+    ]
+    assert "".join(text for op, text in runs if op != "insert") == old
+    assert "".join(text for op, text in runs if op != "delete") == new
+    # Runs join the tokens of one operation
+    assert "".join(token for _, token in diff_line(old, new)) == "".join(text for _, text in runs)
+
+    opcodes = diff_line(old, new, output="opcodes")
+    assert opcodes == [
+        ("equal", 0, 4, 0, 4),
+        ("replace", 4, 9, 4, 8),
+        ("equal", 9, 16, 8, 15),
+        ("replace", 16, 19, 15, 18),
+    ]
+    assert all(old[i1:i2] == new[j1:j2] for tag, i1, i2, j1, j2 in opcodes if tag == "equal")
+    with pytest.raises(ValueError):
+        diff_line(old, new, output="html")
+
+
+def test_inline_diff_of_replaced_lines_uses_runs():
+    [line] = diff_hunks("a b c\n", "a x c\n")["hunks"][0]["lines"]
+    assert [(part["type"], part["value"]) for part in line["inline_diff"]] == diff_line("a b c", "a x c", output="runs")
+
+
+def test_char_granularity():
+    runs = diff_line("The cat jumped", "The cow jumped", output="runs", granularity="char")
+    assert runs == [("equal", "The c"), ("delete", "at"), ("insert", "ow"), ("equal", " jumped")]
+    assert diff_line("naïve 日本", "naive 日本語", output="runs", granularity="char") == [
+        ("equal", "na"),
+        ("delete", "ï"),
+        ("insert", "i"),
+        ("equal", "ve 日本"),
+        ("insert", "語"),
+    ]
+    # The semantic cleanup folds the lone "b" into the changes around it
+    assert diff_line("abc", "xbz", output="runs", granularity="char") == [("delete", "abc"), ("insert", "xbz")]
+    [line] = diff_hunks("color\n", "colour\n", granularity="char")["hunks"][0]["lines"]
+    assert [part["value"] for part in line["inline_diff"]] == ["colo", "u", "r"]
+
+
+def test_char_granularity_rebuilds_both_texts():
+    rng = random.Random(35)
+    for _ in range(200):
+        old = "".join(rng.choices("abcé日 ", k=rng.randrange(30)))
+        new = "".join(rng.choices("abcé日 ", k=rng.randrange(30)))
+        runs = diff_line(old, new, output="runs", granularity="char")
+        assert "".join(text for op, text in runs if op != "insert") == old
+        assert "".join(text for op, text in runs if op != "delete") == new
+
+
+def _changes(ops: list) -> int:
+    return sum(op != "equal" for op, _ in ops)
+
+
+def test_memory_budget():
+    rng = random.Random(39)
+    old = " ".join(rng.choices("abcdefgh", k=3_000))
+    new = " ".join(rng.choices("abcdefgh", k=3_000))
+    reset_trace_memory()
+    full = diff_line(old, new)
+    assert trace_memory()["peak"] > 1 << 20
+
+    # Over the budget, the linear-space bisection finds as short an edit script
+    reset_trace_memory()
+    bounded = diff_line(old, new, max_memory=1 << 20)
+    assert trace_memory()["peak"] <= 1 << 20
+    assert _changes(bounded) == _changes(full)
+    assert "".join(token for op, token in bounded if op != "insert") == old
+    assert "".join(token for op, token in bounded if op != "delete") == new
+
+    with pytest.raises(MemoryBudgetError) as error:
+        diff_line(old, new, max_memory=4_096)
+    assert isinstance(error.value, MemoryError)
+    assert error.value.max_memory == 4_096
+    assert error.value.required > 4_096
+
+
+def test_process_memory_budget():
+    old, new = "a b c " * 500, "a x c " * 500
+    previous = set_max_memory(100)
+    try:
+        assert get_max_memory() == 100
+        with pytest.raises(MemoryBudgetError):
+            diff_line(old, new)
+        # A budget given to the call replaces that of the process
+        assert _changes(diff_line(old, new, max_memory=1 << 30)) == 1_000
+    finally:
+        set_max_memory(previous)
+    assert get_max_memory() == previous
@@ -0,0 +1,60 @@
+import random
+
+import pytest
+
+from diffr import merge3
+
+BASE = "a\nb\nc\nd\ne\n"
+
+
+def test_changes_on_both_sides_merge_cleanly():
+    result = merge3(BASE, "A\nb\nc\nd\ne\n", "a\nb\nc\nd\nE\n")
+    assert result == {"merged": "A\nb\nc\nd\nE\n", "conflicts": []}
+    assert merge3(BASE, "a\nX\nc\nd\ne\n", "a\nX\nc\nd\ne\n")["merged"] == "a\nX\nc\nd\ne\n"
+
+
+def test_conflict_regions():
+    result = merge3(BASE, "a\nb\nX\nd\ne\n", "a\nb\nY\nd\ne\n")
+    assert result["merged"] == "a\nb\n<<<<<<< ours\nX\n=======\nY\n>>>>>>> theirs\nd\ne\n"
+    [conflict] = result["conflicts"]
+    assert conflict["base_range"] == {"start": 3, "end": 3}
+    assert (conflict["base"], conflict["ours"], conflict["theirs"]) == (["c"], ["X"], ["Y"])
+    assert not conflict["resolved"]
+
+    with_base = merge3(BASE, "a\nb\nX\nd\ne\n", "a\nb\nY\nd\ne\n", show_base=True)["merged"]
+    assert "||||||| base\nc\n=======" in with_base
+
+
+@pytest.mark.parametrize(
+    ("strategy", "merged"),
+    [("ours", "a\nb\nX\nd\ne\n"), ("theirs", "a\nb\nY\nd\ne\n"), ("union", "a\nb\nX\nY\nd\ne\n")],
+)
+def test_strategies_resolve_conflicts(strategy, merged):
+    result = merge3(BASE, "a\nb\nX\nd\ne\n", "a\nb\nY\nd\ne\n", strategy=strategy)
+    assert result["merged"] == merged
+    assert all(conflict["resolved"] for conflict in result["conflicts"])
+
+
+def test_unknown_strategy():
+    with pytest.raises(ValueError):
+        merge3(BASE, BASE, BASE, strategy="mine")
+
+
+@pytest.mark.parametrize(
+    "other",
+    ["a\nb\nc\nd\ne", "a\r\nb\r\nc\r\nd\r\ne\r\n", "a\nb\r\nc\nd\ne\n", "a\nb\nX\nd\ne", "a\nb\nc\nd\ne\nf"],
+)
+def test_one_sided_changes_are_kept(other):
+    # Only the line endings or the final newline may differ from the base
+    assert merge3(BASE, other, BASE)["merged"] == other
+    assert merge3(BASE, BASE, other)["merged"] == other
+    assert merge3(other, BASE, other)["merged"] == BASE
+    assert merge3("a\n", "a", "a\n")["merged"] == "a"
+
+
+def test_one_sided_changes_are_kept_at_random():
+    rng = random.Random(29)
+    for _ in range(3_000):
+        base, other = ("".join(rng.choices(["a", "b", "c", "\n", "\n", "\r\n"], k=rng.randrange(12))) for _ in range(2))
+        assert merge3(base, other, base)["merged"] == other
+        assert merge3(base, base, other)["merged"] == other
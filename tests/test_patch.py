@@ -0,0 +1,44 @@
+import itertools
+
+import pytest
+
+from diffr import PatchError, apply, apply_unified, diff_hunks
+
+TEXTS = ["", "x", "x\n", "a\nb", "a\nb\n", "a\nc", "a\nc\n", "\n", "a\n\n", "b\na\nb"]
+
+
+@pytest.mark.parametrize(("original", "updated"), list(itertools.product(TEXTS, repeat=2)))
+def test_apply_round_trip_keeps_final_newline(original, updated):
+    diff = diff_hunks(original, updated)
+    assert apply(original, diff) == updated
+    assert apply(updated, diff, reverse=True) == original
+
+
+def test_final_newline_change_is_a_hunk():
+    diff = diff_hunks("a\nb", "a\nb\n")
+    assert diff["no_newline_at_end"] == {"old": 2}
+    assert [entry["type"] for entry in diff["hunks"][0]["lines"]] == ["delete", "insert"]
+
+
+def test_texts_ending_with_newlines_have_no_record():
+    assert "no_newline_at_end" not in diff_hunks("a\n", "b\n")
+    assert "no_newline_at_end" not in diff_hunks("", "b\n")
+
+
+def test_apply_keeps_line_endings_of_untouched_lines():
+    original = "a\r\nb\r\nc\r\n"
+    assert apply(original, diff_hunks(original, "a\r\nB\r\nc\r\n")) == "a\r\nB\r\nc\r\n"
+
+
+def test_apply_with_fuzz_and_offset():
+    diff = diff_hunks("a\nb\nc\n", "a\nB\nc\n")
+    assert apply("x\na\nb\nc\n", diff, max_offset=1) == "x\na\nB\nc\n"
+    with pytest.raises(PatchError) as error:
+        apply("x\na\nb\nc\n", diff)
+    assert error.value.hunk_index == 0
+
+
+def test_apply_unified():
+    patch = "--- a\n+++ b\n@@ -2 +2 @@\n-b\n+B\n"
+    assert apply_unified("a\nb\nc\n", patch) == "a\nB\nc\n"
+    assert apply_unified("a\nB\nc\n", patch, reverse=True) == "a\nb\nc\n"
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from diffr import detect_renames
+from diffr.cli import main
+
+BODY = "".join(f"def f{i}(x):\n    return x * {i}\n" for i in range(40))
+EDITED = BODY.replace("x * 7\n", "x * 70\n")
+
+
+def test_renames_and_copies():
+    old = {"sub/x.py": BODY, "kept.py": "kept\n", "gone.txt": "nothing alike\n"}
+    new = {"lib/y.py": EDITED, "kept.py": "kept\n", "copy.py": "kept\n"}
+    assert detect_renames(old, new) == [
+        {"type": "rename", "old_path": "sub/x.py", "new_path": "lib/y.py", "similarity": 98}
+    ]
+    assert detect_renames(old, new, copies=True) == [
+        {"type": "copy", "old_path": "kept.py", "new_path": "copy.py", "similarity": 100},
+        {"type": "rename", "old_path": "sub/x.py", "new_path": "lib/y.py", "similarity": 98},
+    ]
+    assert detect_renames(old, new, threshold=0.99) == []
+
+
+def test_one_rename_per_source():
+    renames = detect_renames({"a.py": BODY}, {"b.py": BODY, "c.py": EDITED}, copies=True)
+    assert [(item["type"], item["new_path"]) for item in renames] == [("rename", "b.py"), ("copy", "c.py")]
+
+
+def test_empty_files_are_never_paired():
+    assert detect_renames({"a": ""}, {"b": ""}) == []
+
+
+def test_bands_must_divide_num_perm():
+    with pytest.raises(ValueError):
+        detect_renames({"a": BODY}, {"b": BODY}, num_perm=64, bands=5)
+
+
+def test_directory_diff(tmp_path, capsys):
+    for side, path, text in (("a", "sub/x.py", BODY), ("b", "lib/y.py", EDITED)):
+        (tmp_path / side / path).parent.mkdir(parents=True)
+        (tmp_path / side / path).write_text(text)
+    assert main([str(tmp_path / "a"), str(tmp_path / "b"), "--format", "unified"]) == 0
+    out = capsys.readouterr().out
+    assert out.startswith(
+        "diff a/sub/x.py b/lib/y.py\nsimilarity index 98%\nrename from sub/x.py\nrename to lib/y.py\n"
+    )
+    assert "-    return x * 7\n+    return x * 70\n" in out
+
+    assert main([str(tmp_path / "a"), str(tmp_path / "b"), "--format", "jsonl", "--no-renames"]) == 0
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert sorted(record["status"] for record in records) == ["added", "deleted"]
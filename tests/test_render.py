@@ -0,0 +1,60 @@
+import io
+import itertools
+import shutil
+import subprocess
+
+import pytest
+
+from diffr import apply_unified, diff_hunks
+from diffr.render import FORMATS, render
+
+TEXTS = ["", "x", "x\n", "a\nb", "a\nb\n", "a\nc", "a\nc\n", "b\na\nb", "a\nb\nc\nd\n", "d\na", "c\na\nd\nc"]
+PAIRS = [(original, updated) for original, updated in itertools.product(TEXTS, repeat=2) if original != updated]
+
+
+def _unified(original: str, updated: str) -> str:
+    out = io.StringIO()
+    render(diff_hunks(original, updated), out, format="unified", old_label="a/file", new_label="b/file")
+    return out.getvalue()
+
+
+def test_no_newline_marker():
+    assert _unified("a\nb", "a\nc") == (
+        "--- a/file\n+++ b/file\n@@ -2 +2 @@\n-b\n\\ No newline at end of file\n+c\n\\ No newline at end of file\n"
+    )
+    assert _unified("a\nb", "a\nb\n") == "--- a/file\n+++ b/file\n@@ -2 +2 @@\n-b\n\\ No newline at end of file\n+b\n"
+
+
+@pytest.mark.parametrize(("original", "updated"), PAIRS)
+def test_unified_round_trip_through_apply_unified(original, updated):
+    patch = _unified(original, updated)
+    assert apply_unified(original, patch) == updated
+    assert apply_unified(updated, patch, reverse=True) == original
+
+
+@pytest.mark.skipif(shutil.which("patch") is None, reason="GNU patch is not installed")
+@pytest.mark.parametrize(("original", "updated"), [pair for pair in PAIRS if pair[0] and pair[1]])
+def test_unified_round_trip_through_gnu_patch(tmp_path, original, updated):
+    path = tmp_path / "file"
+    path.write_bytes(original.encode())
+    subprocess.run(["patch", "--quiet", "--force", str(path)], input=_unified(original, updated).encode(), check=True)
+    assert path.read_bytes() == updated.encode()
+
+
+@pytest.mark.parametrize("format", FORMATS)
+def test_render_formats(format):
+    out = io.StringIO()
+    render(diff_hunks("a\nb\n", "a\nc\n"), out, format=format, color=False, buffer_size=1)
+    assert out.getvalue().endswith("\n")
+    assert "c" in out.getvalue()
+
+
+def test_render_without_differences():
+    out = io.StringIO()
+    render(diff_hunks("a\n", "a\n"), out, format="plain")
+    assert out.getvalue() == "No differences found.\n"
+
+
+def test_render_rejects_unknown_format():
+    with pytest.raises(ValueError):
+        render({"hunks": []}, io.StringIO(), format="html")
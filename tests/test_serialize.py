@@ -0,0 +1,102 @@
+import enum
+import io
+import json
+import random
+
+import pytest
+
+from diffr import diff_hunks, dump_json
+
+
+class Level(enum.IntEnum):
+    HIGH = 3
+
+
+class Name(str):
+    def __str__(self) -> str:
+        """Differ from the data, which is what ``json`` writes."""
+        return "not the data"
+
+
+class Color(str, enum.Enum):
+    RED = "red"
+
+
+CASES = [
+    None,
+    True,
+    0,
+    -1,
+    2**63 - 1,
+    -(2**63),
+    2**64,
+    1.5,
+    -0.0,
+    1e300,
+    float("nan"),
+    float("-inf"),
+    "",
+    'q"b\\s\n\r\t\b\f\x00\x1f\x7f~ ',
+    "é漢字😀\udc80\ud800",
+    "x" * 100_000 + "é" * 9_000,
+    [],
+    {},
+    (),
+    [1, (2, 3)],
+    {"a": [1, {"b": None}]},
+    {2: 1, 1.5: 3, True: 4, False: 0, None: 5},
+    Level.HIGH,
+    {Level.HIGH: 1},
+    Name("x\né"),
+    {Name("k"): Name("v")},
+    Color.RED,
+    {Color.RED: [Color.RED]},
+]
+
+
+@pytest.mark.parametrize("data", CASES)
+@pytest.mark.parametrize("buffer_size", [1, 64, 1 << 16])
+def test_same_bytes_as_json(data, buffer_size):
+    expected = json.dumps(data).encode()
+    assert dump_json(data, buffer_size=buffer_size) == expected
+    stream = io.BytesIO()
+    assert dump_json(data, stream, buffer_size=buffer_size) is None
+    assert stream.getvalue() == expected
+    extended = bytearray()
+    dump_json(data, extended, buffer_size=buffer_size)
+    assert extended == expected
+
+
+def test_diff_results():
+    rng = random.Random(50)
+    alphabet = 'ab \t"\\é漢😀\x01{}'
+    for trial in range(100):
+        old, new = ("".join(rng.choice(alphabet + "\n\n") for _ in range(rng.randrange(60))) for _ in range(2))
+        result = diff_hunks(old, new, detect_moves=bool(trial % 2), min_move_lines=1)
+        assert dump_json(result) == json.dumps(result).encode()
+
+
+def test_streams_in_chunks():
+    chunks = []
+
+    class Stream:
+        def write(self, data: bytes) -> None:
+            chunks.append(data)
+
+    data = ["x" * 100] * 10_000
+    dump_json(data, Stream(), buffer_size=4_096)
+    assert len(chunks) > 100
+    assert max(len(chunk) for chunk in chunks) <= 4_096
+    assert b"".join(chunks) == json.dumps(data).encode()
+
+
+def test_errors():
+    for data in ({"a": object()}, {(1,): 2}):
+        with pytest.raises(TypeError):
+            dump_json(data)
+    cycle = []
+    cycle.append(cycle)
+    with pytest.raises(ValueError, match="Circular reference"):
+        dump_json(cycle)
+    with pytest.raises(ValueError):
+        dump_json([], buffer_size=0)
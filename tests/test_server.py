@@ -0,0 +1,146 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import stat
+import threading
+
+import pytest
+
+from diffr.aio import DiffExecutor
+from diffr.client import DiffClient
+from diffr.server import DiffServer, ResultCache
+
+
+def _request(server: DiffServer, request: dict) -> tuple[int, dict]:
+    async def send():
+        return await server._dispatch("POST", "/diff", json.dumps(request).encode())
+
+    status, _, body = asyncio.run(send())
+    return status, json.loads(body)
+
+
+def test_diff_request():
+    server = DiffServer(DiffExecutor(kind="thread"), ResultCache())
+    status, body = _request(server, {"old": "a\nb\n", "new": "a\nc\n"})
+    assert status == 200
+    assert body["hunks"][0]["lines"][0]["content_new"] == "c"
+    assert _request(server, {"old": "a\nb\n", "new": "a\nc\n"})[1] == body
+    assert server.cache.hits == 1
+    assert _request(server, {"old": "a"})[0] == 400
+    assert _request(server, {"old": "a", "new": "b", "format": "html"})[0] == 400
+
+
+def test_unexpected_errors_get_an_answer(monkeypatch):
+    server = DiffServer(DiffExecutor(kind="thread"), ResultCache())
+
+    async def fail(request):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(server, "diff", fail)
+    status, body = _request(server, {"old": "a", "new": "b"})
+    assert status == 500
+    assert body == {"error": "RuntimeError: boom"}
+
+
+def test_server_recovers_from_a_dead_worker():
+    executor = DiffExecutor(1, kind="process", inline_below=0)
+    server = DiffServer(executor, ResultCache())
+    try:
+        executor.start()
+        assert _request(server, {"old": "a\n", "new": "b\n"})[0] == 200
+        for child in multiprocessing.active_children():
+            os.kill(child.pid, signal.SIGKILL)
+            child.join()
+        # The diff that finds the pool broken may fail; the server answers it and starts a new pool
+        statuses = [_request(server, {"old": f"{i}\n", "new": "b\n"})[0] for i in range(3)]
+        assert set(statuses) <= {200, 500}
+        assert statuses[-1] == 200
+    finally:
+        executor.shutdown()
+
+
+def test_paths_stay_under_the_root(tmp_path):
+    (tmp_path / "old.txt").write_text("a\n")
+    (tmp_path / "new.txt").write_text("b\n")
+    outside = tmp_path.parent / f"{tmp_path.name}-outside.txt"
+    outside.write_text("secret\n")
+    (tmp_path / "link.txt").symlink_to(outside)
+    server = DiffServer(DiffExecutor(kind="thread"), ResultCache())
+    assert _request(server, {"old_path": str(tmp_path / "old.txt"), "new": "b\n"})[0] == 403
+
+    server = DiffServer(DiffExecutor(kind="thread"), ResultCache(), root=str(tmp_path))
+    assert _request(server, {"old_path": "old.txt", "new_path": str(tmp_path / "new.txt")})[0] == 200
+    for path in (str(outside), "../" + outside.name, "link.txt"):
+        status, body = _request(server, {"old_path": path, "new": "b\n"})
+        assert status == 403
+        assert "secret" not in json.dumps(body)
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix sockets")
+def test_unix_socket_for_its_owner_only(tmp_path):
+    path = str(tmp_path / "diffr.sock")
+    server = DiffServer(DiffExecutor(kind="thread"), ResultCache())
+    ready = threading.Event()
+    running = {}
+
+    async def serve():
+        running["loop"], running["task"] = asyncio.get_running_loop(), asyncio.current_task()
+        try:
+            await server.serve(path, ready=ready.set)
+        except asyncio.CancelledError:
+            pass
+
+    thread = threading.Thread(target=asyncio.run, args=(serve(),))
+    thread.start()
+    try:
+        assert ready.wait(10)
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+        with DiffClient(path, timeout=10) as client:
+            assert client.diff({"old": "a\n", "new": "b\n"})[0] == 200
+        with socket.socket(socket.AF_UNIX) as sock:
+            sock.settimeout(10)
+            sock.connect(path)
+            sock.sendall(b"GET /health HTTP/1.1\r\nHost: evil.example:8765\r\n\r\n")
+            assert sock.makefile("rb").readline().split()[1] == b"403"
+        # A second server leaves the socket of the running one alone
+        with pytest.raises(OSError, match="already listens"):
+            asyncio.run(DiffServer(DiffExecutor(kind="thread"), ResultCache()).serve(path))
+        assert stat.S_ISSOCK(os.lstat(path).st_mode)
+    finally:
+        running["loop"].call_soon_threadsafe(running["task"].cancel)
+        thread.join(10)
+    assert not os.path.exists(path)
+
+
+def test_only_stale_sockets_are_replaced(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("keep me\n")
+    with pytest.raises(FileExistsError):
+        asyncio.run(DiffServer(DiffExecutor(kind="thread"), ResultCache()).serve(str(path)))
+    assert path.read_text() == "keep me\n"
+
+    # A socket nobody listens on any more, as a killed server leaves it
+    stale = tmp_path / "stale.sock"
+    with socket.socket(socket.AF_UNIX) as sock:
+        sock.bind(str(stale))
+    server = DiffServer(DiffExecutor(kind="thread"), ResultCache())
+
+    def replace_and_stop():
+        # What is at the path by the time the server stops is not its socket any more
+        assert stat.S_ISSOCK(stale.lstat().st_mode)
+        stale.unlink()
+        stale.write_text("someone else's\n")
+        task.cancel()
+
+    async def serve():
+        nonlocal task
+        task = asyncio.current_task()
+        with pytest.raises(asyncio.CancelledError):
+            await server.serve(str(stale), ready=replace_and_stop)
+
+    task = None
+    asyncio.run(serve())
+    assert stale.read_text() == "someone else's\n"
@@ -0,0 +1,84 @@
+import copy
+import random
+
+import pytest
+
+from diffr import DiffSession, apply, diff_hunks
+
+
+def _text(lines: list[str]) -> str:
+    return "".join(line + "\n" for line in lines)
+
+
+@pytest.mark.parametrize(
+    ("original", "updated"),
+    [
+        ("a\nb\nc\n", "a\nB\nc\n"),
+        ("a\nb\nc", "a\nB\nc"),
+        ("a\nb\nc", "a\nb\nc\n"),
+        ("a\nb\nc\n", "a\nb\nc"),
+        ("a\nb", "a\nb\nc\n"),
+        ("a\nb\nc\n", "a\nb"),
+        ("a\nb", "x\na\nb\nc"),
+        ("", "a"),
+        ("a", ""),
+    ],
+)
+def test_session_matches_a_full_diff(original, updated):
+    session = DiffSession(original, updated)
+    assert session.diff_hunks() == diff_hunks(original, updated)
+    assert session.updated == updated
+
+
+def test_random_texts_match_a_full_diff():
+    rng = random.Random(26)
+    for _ in range(2_000):
+        original, updated = ("".join(rng.choices("ab\n\n", k=rng.randrange(12))) for _ in range(2))
+        assert DiffSession(original, updated).diff_hunks() == diff_hunks(original, updated)
+
+
+def test_results_do_not_change_after_later_edits():
+    original = _text(f"line {i}" for i in range(20))
+    session = DiffSession(original, original.replace("line 15", "changed"))
+    before = session.diff_hunks()
+    snapshot = copy.deepcopy(before)
+    session.apply_edit(2, 2, "inserted\ninserted\n")
+    assert before == snapshot
+    after = session.diff_hunks()
+    assert after["hunks"][-1]["new_range"]["start"] == before["hunks"][-1]["new_range"]["start"] + 2
+
+
+def test_random_edits_keep_the_diff_applicable():
+    rng = random.Random(1)
+    vocab = [f"line {i}" for i in range(20)] + ["", "x"]
+    for _ in range(50):
+        original = [rng.choice(vocab) for _ in range(rng.randint(0, 30))]
+        current = list(original)
+        session = DiffSession(_text(original))
+        for _ in range(10):
+            start = rng.randint(0, len(current))
+            end = rng.randint(start, min(len(current), start + 3))
+            new = [rng.choice(vocab) for _ in range(rng.randint(0, 3))]
+            session.apply_edit(start, end, _text(new))
+            current[start:end] = new
+            assert session.updated == _text(current)
+            assert apply(_text(original), session.diff_hunks()) == _text(current)
+
+
+def test_edits_at_the_end_set_the_final_newline():
+    session = DiffSession("a\nb\n")
+    session.apply_edit(2, 2, "c")
+    assert session.updated == "a\nb\nc"
+    assert session.diff_hunks() == diff_hunks("a\nb\n", "a\nb\nc")
+    session.apply_edit(0, 1, "A\n")
+    assert session.updated == "A\nb\nc"
+    assert apply("a\nb\n", session.diff_hunks()) == "A\nb\nc"
+    session.apply_edit(2, 3, "")
+    assert session.updated == "A\nb\n"
+    assert apply("a\nb\n", session.diff_hunks()) == "A\nb\n"
+
+
+def test_edit_out_of_bounds():
+    session = DiffSession("a\n")
+    with pytest.raises(IndexError):
+        session.apply_edit(0, 2, "")
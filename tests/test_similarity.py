@@ -0,0 +1,40 @@
+import random
+
+from diffr import SimilarityIndex, similarity
+
+WORDS = "alpha beta gamma delta epsilon zeta eta theta iota kappa".split()
+
+
+def test_similarity():
+    assert similarity("same text", "same text") == 1.0
+    assert similarity("abc", "xyz") == 0.0
+    assert 0.0 < similarity("the quick brown fox", "the quick brown dog") < 1.0
+    assert similarity("the quick brown fox", "the quick brown dog") == similarity(
+        "the quick brown dog", "the quick brown fox"
+    )
+
+
+def test_query_finds_the_closest_records():
+    rng = random.Random(36)
+    records = {f"r{i}": " ".join(rng.choices(WORDS, k=20)) for i in range(200)}
+    index = SimilarityIndex(q=3)
+    for key, record in records.items():
+        index.add(record, key=key)
+    assert len(index) == 200
+
+    for key in ("r0", "r57", "r199"):
+        words = records[key].split()
+        words[rng.randrange(len(words))] = "changed"
+        query = " ".join(words)
+        results = index.query(query, k=3, threshold=0.4)
+        assert results[0][0] == key
+        assert all(score == similarity(query, records[found]) for found, score in results)
+        assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+
+
+def test_keys_default_to_positions():
+    index = SimilarityIndex()
+    index.extend(["a b c", "d e f"])
+    assert index.add("x y z") == 2
+    assert index.query("d e f", k=1) == [(1, 1.0)]
+    assert index.query("nothing alike", threshold=0.5) == []